@@ -0,0 +1,22 @@
+import pytest
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('healthcheck benchmarks')
+    group.addoption('--benchmark', action='store_true', default=False, help="Run the view benchmarks.")
+    group.addoption('--benchmark-json', default='benchmark_results.json', help="Where to write the benchmark results.")
+    group.addoption('--benchmark-baseline', default=None, help="Results of an earlier run to compare against.")
+    group.addoption('--benchmark-threshold', type=float, default=0.25, help="Allowed regression over the baseline (0.25 = 25%%).")
+    group.addoption('--benchmark-min-delta-ms', type=float, default=10.0, help="Wall time increases below this are treated as noise.")
+    group.addoption('--benchmark-users', type=int, default=300, help="Number of users in the seeded benchmark dataset.")
+    group.addoption('--benchmark-rounds', type=int, default=5, help="Timed requests per view and role.")
+    group.addoption('--benchmark-report-users', type=int, default=28000, help="Users seeded for the report benchmarks (28000 gives about 1M responses); 0 skips them.")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark'):
+        return
+    skip = pytest.mark.skip(reason="view benchmarks only run with --benchmark")
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,185 @@
+from dataclasses import dataclass
+from functools import partial, wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib import messages
+from django.core.cache import cache
+from django.shortcuts import redirect
+from django.utils.functional import SimpleLazyObject
+
+from .models import Department, Team, UserProfile
+
+
+ACCESS_CACHE_TIMEOUT = 300
+ACCESS_GENERATION_KEY = 'healthcheck:access:generation'
+
+
+'''
+AccessContext holds the resolved role and memberships of a user.
+It is immutable so it can be cached and shared safely between requests.
+'''
+@dataclass(frozen=True)
+class AccessContext:
+    role: str = None
+    led_team_ids: frozenset = frozenset()
+    led_department_ids: frozenset = frozenset()
+    member_team_ids: frozenset = frozenset()
+
+    def has_role(self, *roles):
+        return self.role in roles
+
+
+ANONYMOUS_ACCESS = AccessContext()
+
+
+def _generation():
+    return cache.get_or_set(ACCESS_GENERATION_KEY, 1, None)
+
+
+def _cache_key(user_id):
+    return f'healthcheck:access:{_generation()}:{user_id}'
+
+
+async def _acache_key(user_id):
+    return f'healthcheck:access:{await cache.aget_or_set(ACCESS_GENERATION_KEY, 1, None)}:{user_id}'
+
+
+'''
+load_access_context is used to build the AccessContext of a user from the database.
+'''
+def load_access_context(user):
+    role = UserProfile.objects.filter(user=user).values_list('role', flat=True).first()
+    return AccessContext(
+        role=role,
+        led_team_ids=frozenset(Team.objects.filter(leader=user).values_list('id', flat=True)),
+        led_department_ids=frozenset(Department.objects.filter(leader=user).values_list('id', flat=True)),
+        member_team_ids=frozenset(Team.objects.filter(engineers=user).values_list('id', flat=True)),
+    )
+
+
+async def aload_access_context(user):
+    role = await UserProfile.objects.filter(user=user).values_list('role', flat=True).afirst()
+    return AccessContext(
+        role=role,
+        led_team_ids=frozenset([pk async for pk in Team.objects.filter(leader=user).values_list('id', flat=True)]),
+        led_department_ids=frozenset([pk async for pk in Department.objects.filter(leader=user).values_list('id', flat=True)]),
+        member_team_ids=frozenset([pk async for pk in Team.objects.filter(engineers=user).values_list('id', flat=True)]),
+    )
+
+
+'''
+get_access_context is used to get the AccessContext of a user, reading it from the cache when possible.
+aget_access_context is the same for async code, using the async cache and ORM methods.
+'''
+def get_access_context(user):
+    if not user.is_authenticated:
+        return ANONYMOUS_ACCESS
+
+    key = _cache_key(user.pk)
+    context = cache.get(key)
+    if context is None:
+        context = load_access_context(user)
+        cache.set(key, context, ACCESS_CACHE_TIMEOUT)
+    return context
+
+
+async def aget_access_context(user):
+    if not user.is_authenticated:
+        return ANONYMOUS_ACCESS
+
+    key = await _acache_key(user.pk)
+    context = await cache.aget(key)
+    if context is None:
+        context = await aload_access_context(user)
+        await cache.aset(key, context, ACCESS_CACHE_TIMEOUT)
+    return context
+
+
+'''
+invalidate_user_access is used to drop the cached context of a single user, e.g. when their role changes.
+invalidate_all_access is used when team or department membership changes, since those affect
+several users at once; it moves every cached context to a new generation.
+'''
+def invalidate_user_access(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def invalidate_all_access():
+    try:
+        cache.incr(ACCESS_GENERATION_KEY)
+    except ValueError:
+        cache.set(ACCESS_GENERATION_KEY, 2, None)
+
+
+'''
+AccessContextMiddleware attaches the AccessContext of the logged-in user to request.access.
+It must come after AuthenticationMiddleware. The context is resolved lazily, on first use.
+Like request.auser, request.aaccess() resolves it from async code; the middleware itself
+runs natively under ASGI, so async views are not pushed onto a thread by it.
+'''
+class AccessContextMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def attach(self, request):
+        request.access = SimpleLazyObject(lambda: get_access_context(request.user))
+        request.aaccess = partial(aaccess, request)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.attach(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.attach(request)
+        return await self.get_response(request)
+
+
+async def aaccess(request):
+    if not hasattr(request, '_acached_access'):
+        request._acached_access = await aget_access_context(await request.auser())
+    return request._acached_access
+
+
+'''
+aresolve_request is used by async views before rendering: it resolves request.user and
+request.access with async queries and pins them on the request, so templates can read
+them without touching the database from the event loop.
+'''
+async def aresolve_request(request):
+    request.user = await request.auser()
+    request.access = await request.aaccess()
+    return request.access
+
+
+'''
+role_required decorator is used to restrict a view to the given roles.
+Other users are redirected to the dashboard with an Access Denied message.
+Async views get an async wrapper, which resolves the context with aresolve_request.
+'''
+def role_required(*roles):
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                access = await aresolve_request(request)
+                if not access.has_role(*roles):
+                    messages.error(request, 'Access Denied.')
+                    return redirect('dashboard')
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.access.has_role(*roles):
+                messages.error(request, 'Access Denied.')
+                return redirect('dashboard')
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
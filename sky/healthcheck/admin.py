@@ -1,10 +1,18 @@
 from django.contrib import admin
-from .models import UserProfile, Team, Department, HealthCheckSession, Question, Response, Vote
+from .models import UserProfile, Team, Department, HealthCheckSession, Question, QuestionTag, Response, Vote, VoteRollup, VoteTrendBucket, ResponseTrendBucket, HealthRollup, AnalyticsTask, SessionSnapshot
 
 admin.site.register(UserProfile)
 admin.site.register(Team)
 admin.site.register(Department)
-admin.site.register(HealthCheckSession)
+## sessions are closed with close_session, which writes their snapshot
+admin.site.register(HealthCheckSession, readonly_fields=('status', 'closed_at'))
 admin.site.register(Question)
+admin.site.register(QuestionTag)
 admin.site.register(Response)
 admin.site.register(Vote)
+admin.site.register(VoteRollup)
+admin.site.register(HealthRollup)
+admin.site.register(VoteTrendBucket)
+admin.site.register(ResponseTrendBucket)
+admin.site.register(AnalyticsTask)
+admin.site.register(SessionSnapshot)
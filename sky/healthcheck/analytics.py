@@ -0,0 +1,83 @@
+import hashlib
+import math
+
+from django.db.models import Count, Exists, Max, OuterRef, Sum
+
+from .models import Response, VoteRollup
+
+
+ROLLUP_FIELDS = (
+    'id', 'team', 'team__name', 'session', 'session__name', 'session__created_at',
+    'vote_count', 'vote_sum', 'vote_min', 'vote_max', 'vote_sum_squares',
+)
+
+
+'''
+filter_vote_rollups is used to narrow the team x session rollups by team ids, department,
+question and session date range. Every argument is optional. visible_teams limits the rollups
+to the teams a user can see (see report_team_ids); None means every team.
+Votes are cast per session, not per question, so the question filter keeps the rollups of the
+teams that answered that question in the session, read from their responses.
+'''
+def filter_vote_rollups(teams=None, department=None, question=None, date_from=None, date_to=None, visible_teams=None):
+    rollups = VoteRollup.objects.filter(vote_count__gt=0)
+    if visible_teams is not None:
+        rollups = rollups.filter(team_id__in=visible_teams)
+    if teams:
+        rollups = rollups.filter(team_id__in=teams)
+    if department:
+        rollups = rollups.filter(team__department=department)
+    if question:
+        rollups = rollups.filter(Exists(Response.objects.filter(
+            session_id=OuterRef('session_id'), team_id=OuterRef('team_id'), question_id=question,
+        )))
+    if date_from:
+        rollups = rollups.filter(session__created_at__date__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(session__created_at__date__lte=date_to)
+    return rollups
+
+
+'''
+rollup_row is used to turn a values() row of VoteRollup into the public aggregate shape.
+'''
+def rollup_row(row):
+    count = row['vote_count']
+    average = row['vote_sum'] / count
+    variance = max(0.0, row['vote_sum_squares'] / count - average * average)
+    return {
+        'id': row['id'],
+        'team': row['team'],
+        'team_name': row['team__name'],
+        'session': row['session'],
+        'session_name': row['session__name'],
+        'session_created_at': row['session__created_at'].isoformat() if row['session__created_at'] else None,
+        'vote_count': count,
+        'avg_vote': round(average, 4),
+        'min_vote': row['vote_min'],
+        'max_vote': row['vote_max'],
+        'stddev_vote': round(math.sqrt(variance), 4),
+    }
+
+
+'''
+rollup_fingerprint is used to describe the current state of a filtered set of rollups in one query.
+It returns an ETag value and the time of the last change, for conditional requests.
+'''
+def rollup_fingerprint(rollups, salt=''):
+    state = rollups.order_by().aggregate(rows=Count('id'), votes=Sum('vote_count'), updated=Max('updated_at'))
+    raw = f"{salt}|{state['rows']}|{state['votes']}|{state['updated'].isoformat() if state['updated'] else ''}"
+    return hashlib.md5(raw.encode()).hexdigest(), state['updated']
+
+
+'''
+traffic_light_counts is used to count the answers per session, team and traffic light.
+It is a single GROUP BY served by the response_session_question_idx / response_team_session_idx indexes.
+'''
+def traffic_light_counts(sessions=None, teams=None):
+    responses = Response.objects.all()
+    if sessions:
+        responses = responses.filter(session_id__in=sessions)
+    if teams:
+        responses = responses.filter(team_id__in=teams)
+    return responses.values('session', 'team', 'answer').annotate(responses=Count('id')).order_by()
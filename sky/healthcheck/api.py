@@ -0,0 +1,196 @@
+import json
+
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import condition
+from rest_framework import serializers
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import BasePermission, IsAuthenticated
+from rest_framework.response import Response as APIResponse
+
+from .analytics import ROLLUP_FIELDS, filter_vote_rollups, rollup_fingerprint, rollup_row
+from .pagination import keyset_page
+from .questionbank import search_questions
+from .reports import report_team_ids
+from .routers import replica_alias, use_replica
+
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 2000
+REPORT_ROLES = ('Admin', 'Senior Manager', 'Department Leader', 'Team Leader')
+QUESTION_BANK_PAGE_SIZE = 25
+QUESTION_BANK_MAX_PAGE_SIZE = 100
+
+
+'''
+VoteAnalyticsQuerySerializer validates the query string of the vote analytics API.
+'''
+class VoteAnalyticsQuerySerializer(serializers.Serializer):
+    team = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    department = serializers.IntegerField(min_value=1, required=False)
+    question = serializers.IntegerField(min_value=1, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    after = serializers.IntegerField(min_value=0, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=API_MAX_PAGE_SIZE, default=API_PAGE_SIZE)
+    stream = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data.get('date_from') and data.get('date_to') and data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to.")
+        return data
+
+
+def parse_query(serializer_class, request, list_field):
+    params = {key: value for key, value in request.GET.items() if key != list_field}
+    if list_field in request.GET:
+        params[list_field] = request.GET.getlist(list_field)
+    query = serializer_class(data=params)
+    if not query.is_valid():
+        raise ValidationError(query.errors)
+    return query.validated_data
+
+
+def parse_vote_analytics_query(request):
+    return parse_query(VoteAnalyticsQuerySerializer, request, 'team')
+
+
+def vote_analytics_rollups(query, visible_teams):
+    return filter_vote_rollups(
+        teams=query.get('team'),
+        department=query.get('department'),
+        question=query.get('question'),
+        date_from=query.get('date_from'),
+        date_to=query.get('date_to'),
+        visible_teams=visible_teams,
+    )
+
+
+## the teams are read once per request, for the conditional request handling and the view
+def vote_analytics_teams(request):
+    if not hasattr(request, '_vote_analytics_teams'):
+        request._vote_analytics_teams = report_team_ids(request.access)
+    return request._vote_analytics_teams
+
+
+'''
+CanViewReports permission is used to restrict an API view to the roles of the report views.
+'''
+class CanViewReports(BasePermission):
+    def has_permission(self, request, view):
+        return request.access.has_role(*REPORT_ROLES)
+
+
+'''
+vote_analytics_state is used by the conditional request handling: it computes the ETag and
+Last-Modified of the filtered rollups once per request, so a polling client that already has
+the current data gets a 304 after a single aggregate query.
+'''
+def vote_analytics_state(request):
+    if not hasattr(request, '_vote_analytics_state'):
+        if not request.user.is_authenticated or not request.access.has_role(*REPORT_ROLES):
+            ## let the view reject the request instead of answering 304
+            return None, None
+        visible_teams = vote_analytics_teams(request)
+        try:
+            rollups = vote_analytics_rollups(parse_vote_analytics_query(request), visible_teams)
+        except ValidationError:
+            request._vote_analytics_state = (None, None)
+        else:
+            scope = 'all' if visible_teams is None else ','.join(map(str, sorted(visible_teams)))
+            request._vote_analytics_state = rollup_fingerprint(rollups, salt=f'{scope}|{request.GET.urlencode()}')
+    return request._vote_analytics_state
+
+
+def vote_analytics_etag(request):
+    return vote_analytics_state(request)[0]
+
+
+def vote_analytics_last_modified(request):
+    return vote_analytics_state(request)[1]
+
+
+def stream_rollups(rows):
+    yield '['
+    for index, row in enumerate(rows):
+        yield (',' if index else '') + json.dumps(rollup_row(row))
+    yield ']'
+
+
+'''
+vote_analytics API (v1) returns team x session vote aggregates read from the rollups.
+Like the report views it is open to team leaders and above, each seeing only their own teams.
+Filters: team (repeatable), department, question, date_from, date_to (session dates).
+Results are paged by rollup id with ?after=<id>&limit=<n>; ?stream=true returns every
+matching row as one JSON array written incrementally instead of being buffered.
+'''
+@use_replica
+@condition(etag_func=vote_analytics_etag, last_modified_func=vote_analytics_last_modified)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, CanViewReports])
+def vote_analytics(request):
+    query = parse_vote_analytics_query(request)
+    rollups = vote_analytics_rollups(query, vote_analytics_teams(request)).order_by('id').values(*ROLLUP_FIELDS)
+
+    if query['stream']:
+        ## the stream is read after the view returns, so the replica is pinned here
+        rows = rollups.using(replica_alias()).iterator(chunk_size=STREAM_CHUNK_SIZE)
+        return StreamingHttpResponse(stream_rollups(rows), content_type='application/json')
+
+    if 'after' in query:
+        rollups = rollups.filter(id__gt=query['after'])
+    rows = list(rollups[:query['limit'] + 1])
+    results = [rollup_row(row) for row in rows[:query['limit']]]
+
+    next_url = None
+    if len(rows) > query['limit']:
+        params = request.GET.copy()
+        params['after'] = results[-1]['id']
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+    return APIResponse({'results': results, 'next': next_url})
+
+
+'''
+QuestionBankQuerySerializer validates the query string of the question bank API.
+'''
+class QuestionBankQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    tag = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    after = serializers.IntegerField(min_value=0, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=QUESTION_BANK_MAX_PAGE_SIZE, default=QUESTION_BANK_PAGE_SIZE)
+
+
+'''
+IsTeamLeader permission is used to restrict an API view to team leaders, like role_required for views.
+'''
+class IsTeamLeader(BasePermission):
+    def has_permission(self, request, view):
+        return request.access.has_role('Team Leader')
+
+
+'''
+question_bank API (v1) is used by the question picker of the create session page.
+It searches the question bank with ?q= (full-text, every word as a prefix) and filters it
+by tag (repeatable, any of them). Results are paged by question id with ?after=<id>&limit=<n>,
+so the picker loads the bank a page at a time however large it grows.
+'''
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsTeamLeader])
+def question_bank(request):
+    query = parse_query(QuestionBankQuerySerializer, request, 'tag')
+    questions = search_questions(query.get('q', ''), query.get('tag')).prefetch_related('tags')
+    page = keyset_page(questions, 'id', query.get('after'), query['limit'])
+    results = [
+        {'id': question.id, 'text': question.text, 'tags': sorted(tag.name for tag in question.tags.all())}
+        for question in page
+    ]
+
+    next_url = None
+    if page.next_cursor is not None:
+        params = request.GET.copy()
+        params['after'] = page.next_cursor
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+    return APIResponse({'results': results, 'next': next_url})
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class HealthcheckConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "healthcheck"
+
+    def ready(self):
+        from . import signals  # noqa: F401
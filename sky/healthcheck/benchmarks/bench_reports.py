@@ -0,0 +1,70 @@
+'''
+Benchmarks of the traffic-light report engine on a production-sized dataset.
+
+    pytest healthcheck/benchmarks/bench_reports.py --benchmark
+
+seeds about 1M responses (--benchmark-report-users, rolled back afterwards) and times the
+report for the whole organisation and for a single team.
+'''
+from statistics import median
+from time import perf_counter
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from healthcheck.models import Response, Team
+from healthcheck.reports import traffic_light_report
+from healthcheck.seeding import seed_healthcheck
+
+
+REPORT_PREFIX = 'report'
+
+
+@pytest.fixture
+def report_data(request):
+    users = request.config.getoption('--benchmark-report-users')
+    if not users:
+        pytest.skip("report benchmarks disabled with --benchmark-report-users=0")
+    ## the dataset lives in the test's transaction and is rolled back with it
+    return seed_healthcheck(
+        users=users,
+        departments=max(1, users // 60),
+        teams=max(1, users // 15),
+        questions=40,
+        sessions_per_team=4,
+        questions_per_session=10,
+        prefix=REPORT_PREFIX,
+    )
+
+
+def measure(report, rounds):
+    samples = []
+    for round_number in range(rounds + 1):
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            rows = report()
+            elapsed = perf_counter() - start
+        ## the first run warms the page cache and is not recorded
+        if round_number:
+            samples.append(elapsed * 1000)
+    return {'wall_ms': round(median(samples), 3), 'queries': len(queries), 'rows': len(rows)}
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+def test_traffic_light_report_benchmark(request, report_data, benchmark_results, check_baseline):
+    rounds = max(1, request.config.getoption('--benchmark-rounds') // 2)
+    team = Team.objects.filter(name__startswith=f'{REPORT_PREFIX} ').order_by('id').values_list('id', flat=True).first()
+    cases = {
+        'traffic_light_report[organisation]': lambda: traffic_light_report(),
+        'traffic_light_report[team]': lambda: traffic_light_report(teams=[team]),
+    }
+
+    responses = Response.objects.count()
+    for key, report in cases.items():
+        result = measure(report, rounds)
+        result['responses'] = responses
+        benchmark_results[key] = result
+        assert result['rows'], f"{key} returned no rows"
+        check_baseline(key, result)
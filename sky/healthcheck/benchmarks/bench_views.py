@@ -0,0 +1,195 @@
+'''
+View benchmarks for every route in healthcheck/urls.py.
+
+Run them against a seeded database with:
+
+    pytest healthcheck/benchmarks --benchmark --benchmark-json=results.json
+
+and compare a later run with --benchmark-baseline=results.json; a view whose wall time
+or query count grows past --benchmark-threshold fails.
+'''
+from statistics import median
+from time import perf_counter
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from healthcheck import urls
+from healthcheck.models import Department, HealthCheckSession, Team
+
+from .conftest import BENCHMARK_PREFIX
+
+
+## usernames created by seed_healthcheck for each role
+ROLE_USERS = {
+    'Admin': f'{BENCHMARK_PREFIX}-admin',
+    'Senior Manager': f'{BENCHMARK_PREFIX}-manager-0',
+    'Department Leader': f'{BENCHMARK_PREFIX}-head-0',
+    'Team Leader': f'{BENCHMARK_PREFIX}-lead-0',
+    'Engineer': None,  # the first engineer that belongs to a team
+}
+ALL_ROLES = list(ROLE_USERS)
+
+
+def engineer():
+    return User.objects.filter(teams__isnull=False, userprofile__role='Engineer').order_by('id').first()
+
+
+def led_team():
+    return Team.objects.filter(leader__username=ROLE_USERS['Team Leader']).first()
+
+
+def led_department():
+    return Department.objects.filter(leader__username=ROLE_USERS['Department Leader']).first()
+
+
+def voting_session():
+    return HealthCheckSession.objects.filter(team_leader__led_teams__engineers=engineer()).order_by('id').first()
+
+
+def led_session():
+    return HealthCheckSession.objects.filter(team_leader__username=ROLE_USERS['Team Leader']).order_by('id').first()
+
+
+def voting_answers():
+    session = voting_session()
+    return {f'question_{question.id}': 'green' for question in session.questions.all()}
+
+
+## route name -> list of (role, method, url kwargs factory, POST data factory)
+CASES = {
+    'register': [(None, 'get', None, None)],
+    'login': [(None, 'get', None, None)],
+    'dashboard': [(role, 'get', None, None) for role in ALL_ROLES],
+    'admin_users_table': [('Admin', 'get', None, None)],
+    'admin_teams_table': [('Admin', 'get', None, None)],
+    'admin_departments_table': [('Admin', 'get', None, None)],
+    'fragment_cache_stats': [('Admin', 'get', None, None)],
+    'request_metrics': [('Admin', 'get', None, None)],
+    'analytics_queue_stats': [('Admin', 'get', None, None)],
+    'settings': [('Engineer', 'get', None, None)],
+    'change_password': [('Engineer', 'get', None, None)],
+    'logout': [('Engineer', 'get', None, None)],
+    'password_reset': [(None, 'get', None, None)],
+    'password_reset_done': [(None, 'get', None, None)],
+    'password_reset_confirm': [(None, 'get', lambda: {'uidb64': 'MQ', 'token': 'set-password'}, None)],
+    'password_reset_complete': [(None, 'get', None, None)],
+    'user_update': [('Admin', 'get', lambda: {'username': engineer().username}, None)],
+    'delete_user': [('Admin', 'get', lambda: {'username': engineer().username}, None)],
+    'manage_teams': [('Team Leader', 'get', None, None)],
+    'create_team': [('Team Leader', 'get', None, None), ('Admin', 'get', None, None)],
+    'edit_team': [('Team Leader', 'get', lambda: {'team_id': led_team().id}, None)],
+    'delete_team': [('Team Leader', 'get', lambda: {'team_id': led_team().id}, None)],
+    'manage_departments': [('Department Leader', 'get', None, None)],
+    'create_department': [('Department Leader', 'get', None, None), ('Admin', 'get', None, None)],
+    'edit_department': [('Department Leader', 'get', lambda: {'department_id': led_department().id}, None)],
+    'delete_department': [('Department Leader', 'get', lambda: {'department_id': led_department().id}, None)],
+    'uservoting': [
+        ('Engineer', 'get', lambda: {'session_id': voting_session().id}, None),
+        ('Engineer', 'post', lambda: {'session_id': voting_session().id}, voting_answers),
+    ],
+    'session_live': [('Team Leader', 'get', lambda: {'session_id': led_session().id}, None)],
+    'session_live_stream': [('Team Leader', 'get', lambda: {'session_id': led_session().id}, lambda: {'duration': '0'})],
+    'close_session': [('Team Leader', 'post', lambda: {'session_id': led_session().id}, dict)],
+    'create_session': [('Team Leader', 'get', None, None)],
+    'add_question': [('Team Leader', 'get', None, None)],
+    'vote_analysis': [('Team Leader', 'get', None, None)],
+    'team_progress': [('Team Leader', 'get', None, None)],
+    'traffic_light_report': [(role, 'get', None, None) for role in ('Team Leader', 'Department Leader', 'Senior Manager')],
+    'export_data': [
+        ('Admin', 'get', lambda: {'kind': 'votes'}, None),
+        ('Senior Manager', 'get', lambda: {'kind': 'responses'}, lambda: {'format': 'ndjson', 'gzip': '1'}),
+    ],
+    'import_data': [('Admin', 'get', None, None)],
+    'api_vote_analytics': [('Team Leader', 'get', None, None), ('Senior Manager', 'get', None, lambda: {'stream': 'true'})],
+    'api_question_bank': [('Team Leader', 'get', None, None), ('Team Leader', 'get', None, lambda: {'q': 'question'})],
+}
+
+## a GET case with a query string is told apart by its parameter names, e.g. api_question_bank[Team Leader:get?q]
+def case_id(name, role, method, data):
+    query = '?' + '&'.join(sorted(data())) if method == 'get' and data else ''
+    return f'{name}[{role or "anonymous"}:{method}{query}]'
+
+
+PARAMS = [
+    pytest.param(name, role, method, kwargs, data, id=case_id(name, role, method, data))
+    for name, cases in CASES.items()
+    for role, method, kwargs, data in cases
+]
+
+
+def test_every_route_is_benchmarked():
+    names = {pattern.name for pattern in urls.urlpatterns}
+    assert names - set(CASES) == set(), "add the new routes to CASES"
+
+
+def test_case_ids_are_unique():
+    ids = [param.id for param in PARAMS]
+    assert len(ids) == len(set(ids)), "give each case of a route its own role, method or query string"
+
+
+def login_as(client, role):
+    if role is None:
+        return
+    username = ROLE_USERS[role]
+    user = engineer() if username is None else User.objects.get(username=username)
+    client.force_login(user)
+
+
+## streamed bodies are only produced while they are read, async ones (SSE) on an event loop
+def read_content(response):
+    if not response.streaming:
+        return response.content
+    if response.is_async:
+        async def consume():
+            return b''.join([chunk async for chunk in response.streaming_content])
+        return async_to_sync(consume)()
+    return b''.join(response.streaming_content)
+
+
+def measure(client, method, url, data, rounds):
+    samples = []
+    for round_number in range(rounds + 1):
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                start = perf_counter()
+                response = getattr(client, method)(url, data or {})
+                content = read_content(response)
+                elapsed = perf_counter() - start
+            transaction.set_rollback(True)
+
+        ## the first request warms caches and is not recorded
+        if round_number:
+            samples.append({
+                'wall_ms': elapsed * 1000,
+                'queries': len(queries),
+                'sql_ms': sum(float(query['time']) for query in queries.captured_queries) * 1000,
+                'bytes': len(content),
+                'status': response.status_code,
+            })
+
+    return {
+        'wall_ms': round(median(sample['wall_ms'] for sample in samples), 3),
+        'queries': max(sample['queries'] for sample in samples),
+        'sql_ms': round(median(sample['sql_ms'] for sample in samples), 3),
+        'bytes': max(sample['bytes'] for sample in samples),
+        'status': samples[-1]['status'],
+    }
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db
+@pytest.mark.parametrize('name, role, method, kwargs, data', PARAMS)
+def test_view_benchmark(request, client, benchmark_data, benchmark_results, check_baseline, name, role, method, kwargs, data):
+    login_as(client, role)
+    url = reverse(name, kwargs=kwargs() if kwargs else None)
+    result = measure(client, method, url, data() if data else None, request.config.getoption('--benchmark-rounds'))
+
+    key = request.node.callspec.id
+    benchmark_results[key] = result
+    assert result['status'] < 500, f"{key} returned {result['status']}"
+    check_baseline(key, result)
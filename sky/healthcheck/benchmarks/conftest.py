@@ -0,0 +1,83 @@
+import json
+from pathlib import Path
+
+import pytest
+from django.core.management import call_command
+
+from healthcheck.seeding import seed_healthcheck
+
+
+BENCHMARK_PREFIX = 'bench'
+
+
+'''
+benchmark_run collects the dataset and the measurements of every benchmark module and writes
+them as JSON at the end of the run. benchmark_results is the measurements dict a benchmark
+records into.
+'''
+@pytest.fixture(scope='session')
+def benchmark_run(request):
+    run = {'dataset': None, 'views': {}}
+    yield run
+    output = Path(request.config.getoption('--benchmark-json'))
+    output.write_text(json.dumps(run, indent=2, sort_keys=True))
+
+
+@pytest.fixture
+def benchmark_results(benchmark_run):
+    return benchmark_run['views']
+
+
+'''
+benchmark_data seeds the test database for the module that uses it and flushes it when the
+module is done, so the regular tests, collected in the same run, never see the benchmark dataset.
+'''
+@pytest.fixture(scope='module')
+def benchmark_data(request, django_db_setup, django_db_blocker, benchmark_run):
+    users = request.config.getoption('--benchmark-users')
+    with django_db_blocker.unblock():
+        counts = seed_healthcheck(
+            users=users,
+            departments=max(1, users // 60),
+            teams=max(1, users // 15),
+            questions=40,
+            sessions_per_team=4,
+            questions_per_session=10,
+            prefix=BENCHMARK_PREFIX,
+        )
+    benchmark_run['dataset'] = counts
+    try:
+        yield counts
+    finally:
+        with django_db_blocker.unblock():
+            call_command('flush', interactive=False, verbosity=0)
+
+
+@pytest.fixture(scope='session')
+def benchmark_baseline(request):
+    path = request.config.getoption('--benchmark-baseline')
+    if not path:
+        return {}
+    return json.loads(Path(path).read_text()).get('views', {})
+
+
+'''
+check_baseline fails a benchmark whose query count or wall time grew past --benchmark-threshold
+compared with the same key in the baseline results.
+'''
+@pytest.fixture
+def check_baseline(request, benchmark_baseline):
+    threshold = request.config.getoption('--benchmark-threshold')
+    min_delta = request.config.getoption('--benchmark-min-delta-ms')
+
+    def check(key, result):
+        baseline = benchmark_baseline.get(key)
+        if not baseline:
+            return
+        assert result['queries'] <= baseline['queries'] * (1 + threshold), (
+            f"{key}: {result['queries']} queries, baseline {baseline['queries']}"
+        )
+        assert result['wall_ms'] <= max(baseline['wall_ms'] * (1 + threshold), baseline['wall_ms'] + min_delta), (
+            f"{key}: {result['wall_ms']}ms, baseline {baseline['wall_ms']}ms"
+        )
+    return check
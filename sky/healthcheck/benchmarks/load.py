@@ -0,0 +1,159 @@
+'''
+In-process load test of the WSGI and ASGI entry points (sky/wsgi.py and sky/asgi.py).
+
+Requests go through the real handlers and the full middleware stack, without a server or
+network in between, so the difference between the two runs is the handler model:
+a thread per in-flight request under WSGI, one event loop under ASGI.
+Used by the loadtest_healthcheck management command.
+'''
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.test import Client
+from django.utils.crypto import get_random_string
+
+from healthcheck.metrics import _percentile
+
+HOST = 'localhost'
+
+
+'''
+LoadTarget holds one request to replay: the user's session and CSRF cookies, the method,
+path and, for POST, the form body.
+'''
+class LoadTarget:
+    def __init__(self, user, method, path, data=None):
+        client = Client()
+        client.force_login(user)
+        self.csrf_token = get_random_string(32)
+        self.cookie = (
+            f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; '
+            f'{settings.CSRF_COOKIE_NAME}={self.csrf_token}'
+        )
+        self.method = method.upper()
+        self.path = path
+        self.body = urlencode(data or {}, doseq=True).encode()
+
+    def environ(self):
+        environ = {
+            'REQUEST_METHOD': self.method,
+            'PATH_INFO': self.path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': HOST,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': HOST,
+            'HTTP_COOKIE': self.cookie,
+            'HTTP_X_CSRFTOKEN': self.csrf_token,
+            'wsgi.input': BytesIO(self.body),
+            'wsgi.url_scheme': 'http',
+            'wsgi.errors': BytesIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            'wsgi.version': (1, 0),
+        }
+        if self.body:
+            environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+            environ['CONTENT_LENGTH'] = str(len(self.body))
+        return environ
+
+    def scope(self):
+        headers = [
+            (b'host', HOST.encode()),
+            (b'cookie', self.cookie.encode()),
+            (b'x-csrftoken', self.csrf_token.encode()),
+        ]
+        if self.body:
+            headers += [
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', str(len(self.body)).encode()),
+            ]
+        return {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': self.method,
+            'scheme': 'http',
+            'path': self.path,
+            'raw_path': self.path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': headers,
+            'server': (HOST, 80),
+            'client': ('127.0.0.1', 50000),
+        }
+
+
+def summarise(interface, concurrency, elapsed, samples):
+    latencies = [latency for latency, _ in samples]
+    errors = sum(status >= 500 for _, status in samples)
+    return {
+        'interface': interface,
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'errors': errors,
+        'requests_per_second': round(len(samples) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(_percentile(latencies, 50), 2),
+        'p95_ms': round(_percentile(latencies, 95), 2),
+        'p99_ms': round(_percentile(latencies, 99), 2),
+    }
+
+
+'''
+run_wsgi is used to send `requests` requests through the WSGI application from a pool of
+`concurrency` threads, the way a threaded WSGI server would.
+'''
+def run_wsgi(application, target, requests, concurrency):
+    def one(_):
+        statuses = []
+        start = time.perf_counter()
+        body = application(target.environ(), lambda status, headers, exc_info=None: statuses.append(status))
+        b''.join(body)
+        if hasattr(body, 'close'):
+            body.close()
+        return (time.perf_counter() - start) * 1000, int(statuses[0].split()[0])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(requests)))
+    return summarise('wsgi', concurrency, time.perf_counter() - start, samples)
+
+
+'''
+run_asgi is used to send `requests` requests through the ASGI application on one event loop,
+with at most `concurrency` in flight, the way an ASGI server would.
+'''
+def run_asgi(application, target, requests, concurrency):
+    async def one(gate):
+        async with gate:
+            sent = False
+            status = []
+
+            async def receive():
+                nonlocal sent
+                if sent:
+                    ## the request is complete; wait as a client that stays connected would
+                    await asyncio.Event().wait()
+                sent = True
+                return {'type': 'http.request', 'body': target.body, 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            start = time.perf_counter()
+            await application(target.scope(), receive, send)
+            return (time.perf_counter() - start) * 1000, status[0]
+
+    async def run_all():
+        gate = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(one(gate) for _ in range(requests)))
+
+    start = time.perf_counter()
+    samples = asyncio.run(run_all())
+    return summarise('asgi', concurrency, time.perf_counter() - start, samples)
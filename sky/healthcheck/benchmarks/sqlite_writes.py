@@ -0,0 +1,85 @@
+'''
+Concurrent write benchmark of the SQLite profiles.
+
+N writer threads submit answers through submit_responses (the uservoting write path) against
+a fresh copy of the SQLite database per profile, so both profiles start from the same data and
+the configured database is never written to. Used by the benchmark_sqlite_writes command.
+'''
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from healthcheck.benchmarks.load import summarise
+from healthcheck.voting import submit_responses
+
+ANSWERS = ('green', 'yellow', 'red')
+
+## the default profile: rollback journal, deferred transactions, sqlite3's 5 second timeout
+PROFILES = {
+    'default': {'journal_mode': 'DELETE', 'options': {}},
+    'concurrent': {'journal_mode': 'WAL', 'options': settings.SQLITE_CONCURRENT_OPTIONS},
+}
+
+
+def copy_database(source, target, journal_mode):
+    ## the backup API gives a consistent copy even while the source is in use
+    with sqlite3.connect(source) as origin, sqlite3.connect(target) as copy:
+        origin.backup(copy)
+        copy.execute(f'PRAGMA journal_mode={journal_mode}')
+    copy.close()
+    origin.close()
+
+
+'''
+use_database is used to point the default alias at `path` with the OPTIONS of a profile.
+Every connection is closed first, so the threads open new ones with the new settings.
+'''
+def use_database(path, options):
+    connections.close_all()
+    database = connections['default'].settings_dict
+    database['NAME'] = str(path)
+    database['OPTIONS'] = dict(options)
+
+
+'''
+run_vote_writers is used to send `submissions` submissions from `writers` threads.
+targets is a list of (user, session, questions, team_id); each submission answers every
+question of one target with an answer that differs from its previous one, so every
+submission writes. A submission that fails with a database error (e.g. "database is locked")
+counts as an error.
+'''
+def run_vote_writers(profile, targets, submissions, writers):
+    samples = []
+    lock = threading.Lock()
+
+    def writer(offset):
+        try:
+            for index in range(offset, submissions, writers):
+                user, session, questions, team_id = targets[index % len(targets)]
+                answer = ANSWERS[(index // len(targets)) % len(ANSWERS)]
+                data = {f'question_{question.id}': answer for question in questions}
+                start = time.perf_counter()
+                try:
+                    submit_responses(user, session, questions, data, team_id=team_id)
+                    status = 200
+                except DatabaseError:
+                    status = 500
+                with lock:
+                    samples.append(((time.perf_counter() - start) * 1000, status))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=writer, args=(offset,)) for offset in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    result = summarise(profile, writers, elapsed, samples)
+    ## failed submissions return fast, so only the committed ones count as throughput
+    result['committed_per_second'] = round((result['requests'] - result['errors']) / elapsed, 1) if elapsed else None
+    return result
@@ -0,0 +1,104 @@
+import csv
+import json
+import zlib
+from datetime import date, datetime
+
+from .models import Department, Response, Vote
+
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+EXPORT_COLUMNS = {
+    'responses': ('id', 'user_id', 'user__username', 'session_id', 'team_id', 'question_id', 'answer', 'timestamp'),
+    'votes': ('id', 'user_id', 'user__username', 'session_id', 'team_id', 'vote_value', 'created_at'),
+}
+
+
+'''
+export_rows is used to build the values_list queryset of an export, filtered by team,
+department, session and date range. Rows are ordered by id and read with .iterator(),
+so neither the result set nor any model instance is held in memory.
+`using` pins the database alias, since a streamed export is read after its view has returned.
+'''
+def export_rows(kind, team=None, department=None, session=None, date_from=None, date_to=None, chunk_size=EXPORT_CHUNK_SIZE, using=None):
+    if kind == 'votes':
+        rows, date_field = Vote.objects.all(), 'created_at'
+    elif kind == 'responses':
+        rows, date_field = Response.objects.all(), 'timestamp'
+    else:
+        raise ValueError(f"Unknown export kind: {kind}")
+
+    if team:
+        rows = rows.filter(team_id=team)
+    if department:
+        rows = rows.filter(team_id__in=Department.teams.through.objects.filter(department_id=department).values('team_id'))
+    if session:
+        rows = rows.filter(session_id=session)
+    if date_from:
+        rows = rows.filter(**{f'{date_field}__date__gte': date_from})
+    if date_to:
+        rows = rows.filter(**{f'{date_field}__date__lte': date_to})
+
+    if using:
+        rows = rows.using(using)
+    return rows.order_by('id').values_list(*EXPORT_COLUMNS[kind]).iterator(chunk_size=chunk_size)
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, header):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_plain(value) for value in row])
+
+
+def iter_ndjson(rows, header):
+    for row in rows:
+        yield json.dumps(dict(zip(header, (_plain(value) for value in row)))) + '\n'
+
+
+'''
+iter_gzip is used to compress a stream of text chunks into a gzip stream on the fly.
+Small chunks are buffered up to block_size bytes before being handed to zlib.
+'''
+def iter_gzip(chunks, block_size=64 * 1024):
+    compressor = zlib.compressobj(wbits=31)
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= block_size:
+            compressed = compressor.compress(b''.join(buffer))
+            buffer, size = [], 0
+            if compressed:
+                yield compressed
+    yield compressor.compress(b''.join(buffer)) + compressor.flush()
+
+
+'''
+export_stream is used to produce an export as a stream of chunks, in CSV or NDJSON,
+optionally gzip-compressed (then the chunks are bytes instead of text).
+'''
+def export_stream(kind, export_format='csv', compress=False, chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    if kind not in EXPORT_COLUMNS:
+        raise ValueError(f"Unknown export kind: {kind}")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    header = [column.replace('__', '_') for column in EXPORT_COLUMNS[kind]]
+    rows = export_rows(kind, chunk_size=chunk_size, **filters)
+    chunks = iter_csv(rows, header) if export_format == 'csv' else iter_ndjson(rows, header)
+    return iter_gzip(chunks) if compress else chunks
@@ -1,6 +1,6 @@
 from django import forms
 from django.contrib.auth.models import User
-from django.contrib.auth.forms import PasswordChangeForm
+from django.contrib.auth.forms import PasswordChangeForm, PasswordResetForm, SetPasswordForm
 from django.contrib.auth.password_validation import validate_password
 from .models import UserProfile, Question, Response, HealthCheckSession
 
@@ -67,6 +67,23 @@ class UserUpdateForm(forms.ModelForm):
             self.fields['role'].initial = role_initial
 
 
+'''
+BulkImportForm is used to upload the users, teams and departments CSV files of a bulk import, only by the app admin.
+It extends the built-in Form class.
+'''
+class BulkImportForm(forms.Form):
+    users = forms.FileField(required=False, label="Users CSV", help_text="username, first_name, last_name, email, role, password (leave empty so users set theirs with a password reset)")
+    teams = forms.FileField(required=False, label="Teams CSV", help_text="team, leader, engineer")
+    departments = forms.FileField(required=False, label="Departments CSV", help_text="department, leader, team")
+    dry_run = forms.BooleanField(required=False, initial=True, label="Dry run (validate only)")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not any(cleaned_data.get(name) for name in ('users', 'teams', 'departments')):
+            raise forms.ValidationError("Upload at least one CSV file.")
+        return cleaned_data
+
+
 '''
 ChangePasswordForm is used to change the user's password.
 It extends the built-in Form class.
@@ -87,6 +104,30 @@ class ChangePasswordForm(PasswordChangeForm):
         if new_password1 and new_password2 and new_password1 != new_password2:
             raise forms.ValidationError("Passwords do not match.")
         return new_password2
+
+
+'''
+ResetPasswordForm is used to email a link to set a new password.
+It extends the built-in PasswordResetForm class; unlike it, users without a usable password
+(bulk imported users) get the link too, since that is how they set their first password.
+'''
+class ResetPasswordForm(PasswordResetForm):
+    email = forms.EmailField(label="Email", max_length=254, widget=forms.EmailInput(attrs={"class": "form-control", "autocomplete": "email"}))
+
+    def get_users(self, email):
+        return (
+            user for user in User.objects.filter(email__iexact=email, is_active=True)
+            if user.email.casefold() == email.casefold()
+        )
+
+
+'''
+SetNewPasswordForm is used to set a new password from a password reset link.
+It extends the built-in SetPasswordForm class.
+'''
+class SetNewPasswordForm(SetPasswordForm):
+    new_password1 = forms.CharField(label="New Password", widget=forms.PasswordInput(attrs={"class": "form-control"}), help_text="Password must be at least 8 characters long, not common, and not entirely numeric.")
+    new_password2 = forms.CharField(label="Confirm New Password", widget=forms.PasswordInput(attrs={"class": "form-control"}), help_text="Enter the same password as before, for verification.")
     
 
 
@@ -102,14 +143,26 @@ class ResponseForm(forms.ModelForm):
         }
 
 class QuestionForm(forms.ModelForm):
+    tags = forms.CharField(required=False, label="Tags", help_text="Comma-separated, e.g. Delivery, Team.")
+
     class Meta:
         model = Question
         fields = ['text']
 
+    def clean_tags(self):
+        tags = self.cleaned_data.get('tags', '')
+        if any(len(name.strip()) > 50 for name in tags.split(',')):
+            raise forms.ValidationError("Tags must be at most 50 characters long.")
+        return tags
+
+'''
+HealthCheckSessionForm only submits the ids of the selected questions: they are picked from
+the question bank API on the page, so the form never renders the whole bank.
+'''
 class HealthCheckSessionForm(forms.ModelForm):
     class Meta:
         model = HealthCheckSession
         fields = ['name', 'questions']
         widgets = {
-            'questions': forms.CheckboxSelectMultiple()
-        }
\ No newline at end of file
+            'questions': forms.MultipleHiddenInput()
+        }
@@ -0,0 +1,75 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+FRAGMENT_GENERATION_KEY = 'healthcheck:fragments:generation'
+FRAGMENT_STATS_KEY = 'healthcheck:fragments:stats:{outcome}:{name}'
+FRAGMENT_NAMES_KEY = 'healthcheck:fragments:names'
+
+## roles whose tables only show the user's own teams or departments, so they are cached per user
+PER_USER_ROLES = ('Team Leader', 'Department Leader')
+
+
+def fragment_timeout():
+    return getattr(settings, 'DASHBOARD_FRAGMENT_TIMEOUT', 600)
+
+
+def _generation():
+    return cache.get_or_set(FRAGMENT_GENERATION_KEY, 1, None)
+
+
+'''
+fragment_key is used to build the cache key of a dashboard fragment.
+The key depends on the fragment name, the viewer's role, the viewer's id for
+leader roles, any extra vary values and the current roster generation.
+'''
+def fragment_key(name, role, user_id, vary=()):
+    owner = user_id if role in PER_USER_ROLES else 'all'
+    digest = hashlib.md5(repr((role, tuple(vary))).encode()).hexdigest()
+    return f'healthcheck:fragment:{_generation()}:{name}:{owner}:{digest}'
+
+
+'''
+invalidate_fragments is used when rosters change; it moves every fragment to a new generation.
+'''
+def invalidate_fragments():
+    try:
+        cache.incr(FRAGMENT_GENERATION_KEY)
+    except ValueError:
+        cache.set(FRAGMENT_GENERATION_KEY, 2, None)
+
+
+def _count(outcome, name):
+    key = FRAGMENT_STATS_KEY.format(outcome=outcome, name=name)
+    if not cache.add(key, 1, None):
+        cache.incr(key)
+    names = cache.get(FRAGMENT_NAMES_KEY, set())
+    if name not in names:
+        cache.set(FRAGMENT_NAMES_KEY, names | {name}, None)
+
+
+def record_hit(name):
+    _count('hit', name)
+
+
+def record_miss(name):
+    _count('miss', name)
+
+
+'''
+fragment_stats is used to read the hit and miss counters of every dashboard fragment.
+'''
+def fragment_stats():
+    stats = {}
+    for name in sorted(cache.get(FRAGMENT_NAMES_KEY, set())):
+        hits = cache.get(FRAGMENT_STATS_KEY.format(outcome='hit', name=name), 0)
+        misses = cache.get(FRAGMENT_STATS_KEY.format(outcome='miss', name=name), 0)
+        total = hits + misses
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 3) if total else None,
+        }
+    return stats
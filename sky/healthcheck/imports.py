@@ -0,0 +1,328 @@
+import csv
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from .access import invalidate_all_access
+from .fragments import invalidate_fragments
+from .models import Department, Team, UserProfile
+from .rollups import refresh_department_health
+
+
+IMPORT_BATCH_SIZE = 5000
+## every given password costs a full PBKDF2 hash, so an upload through the web page may only hash a few
+IMPORT_REQUEST_PASSWORD_LIMIT = 10
+ROLES = {value for value, _ in UserProfile.ROLE_CHOICES}
+
+## file -> (required columns, optional columns)
+IMPORT_COLUMNS = {
+    'users': (('username',), ('first_name', 'last_name', 'email', 'role', 'password')),
+    'teams': (('team',), ('leader', 'engineer')),
+    'departments': (('department',), ('leader', 'team')),
+}
+
+
+'''
+ImportReport collects what an import created or skipped, and every validation error
+with the file and line it came from.
+'''
+@dataclass
+class ImportReport:
+    dry_run: bool = False
+    created: Counter = field(default_factory=Counter)
+    skipped: Counter = field(default_factory=Counter)
+    errors: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def error(self, source, line, message):
+        self.errors.append((source, line, message))
+
+    def summary(self):
+        verb = 'would create' if self.dry_run else 'created'
+        lines = [
+            f"{name}: {verb} {self.created[name]}, skipped {self.skipped[name]}"
+            for name in ('users', 'teams', 'memberships', 'departments', 'department_teams')
+        ]
+        lines += [f"{source} line {line}: {message}" for source, line, message in self.errors]
+        return lines
+
+
+def _chunks(values, size):
+    values = iter(values)
+    while chunk := list(islice(values, size)):
+        yield chunk
+
+
+## __in lookups are chunked to stay below the database's parameter limit
+def _lookup(queryset, column, values, fields, size=IMPORT_BATCH_SIZE):
+    rows = []
+    for chunk in _chunks(values, size):
+        rows.extend(queryset.filter(**{f'{column}__in': chunk}).values_list(*fields))
+    return rows
+
+
+def read_rows(source, handle, report):
+    reader = csv.DictReader(handle)
+    required, optional = IMPORT_COLUMNS[source]
+    header = set(reader.fieldnames or ())
+    missing = [column for column in required if column not in header]
+    if missing:
+        report.error(source, 1, f"missing column(s): {', '.join(missing)}")
+        return []
+    columns = [column for column in required + optional if column in header]
+    return [
+        (line, {column: (row.get(column) or '').strip() for column in columns})
+        for line, row in enumerate(reader, start=2)
+    ]
+
+
+'''
+hash_passwords is used to hash the passwords of the imported users that have one, in order.
+Each user gets their own salt, so users sharing a password do not share a hash.
+PBKDF2 releases the GIL, so the hashes are computed on a thread pool.
+'''
+def hash_passwords(passwords):
+    passwords = list(passwords)
+    if not passwords:
+        return []
+    workers = min(len(passwords), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(make_password, passwords))
+
+
+def _check_users(rows, report, max_passwords=None):
+    usernames = [row['username'] for _, row in rows]
+    existing = {username for (username,) in _lookup(User.objects.all(), 'username', usernames, ('username',))}
+    seen = set()
+    checked_passwords = {}
+    password_count = 0
+    new_users = []
+
+    for line, row in rows:
+        username = row['username']
+        if len(username) < 5 or len(username) > 30:
+            report.error('users', line, "username must be 5 to 30 characters long")
+            continue
+        if username in seen:
+            report.error('users', line, f"duplicate username {username}")
+            continue
+        seen.add(username)
+        if username in existing:
+            report.skipped['users'] += 1
+            continue
+
+        role = row.get('role') or 'Engineer'
+        if role not in ROLES:
+            report.error('users', line, f"unknown role {role}")
+            continue
+        if row.get('email'):
+            try:
+                validate_email(row['email'])
+            except ValidationError:
+                report.error('users', line, f"invalid email {row['email']}")
+                continue
+
+        password = row.get('password') or None
+        if password:
+            password_count += 1
+            if max_passwords is not None and password_count == max_passwords + 1:
+                report.error('users', line, (
+                    f"more than {max_passwords} passwords to hash; leave the password column empty so users "
+                    "set theirs with a password reset, or import the file with manage.py import_healthcheck"
+                ))
+            if password not in checked_passwords:
+                try:
+                    validate_password(password)
+                    checked_passwords[password] = None
+                except ValidationError as error:
+                    checked_passwords[password] = ' '.join(error.messages)
+            if checked_passwords[password]:
+                report.error('users', line, checked_passwords[password])
+                continue
+
+        new_users.append({**row, 'role': role, 'password': password})
+
+    report.created['users'] = len(new_users)
+    return new_users, existing
+
+
+def _check_groups(source, model, name_column, member_column, rows, known_leaders, known_members, report):
+    names = {row[name_column] for _, row in rows}
+    existing = {
+        name: (pk, leader)
+        for name, pk, leader in _lookup(model.objects.all(), 'name', names, ('name', 'id', 'leader__username'))
+    }
+    first_lines = {}
+    leaders = {}
+    links = {}
+
+    for line, row in rows:
+        name = row[name_column]
+        if not name or len(name) > 100:
+            report.error(source, line, "name must be 1 to 100 characters long")
+            continue
+        first_lines.setdefault(name, line)
+        leader = row.get('leader')
+        if leader:
+            if leader not in known_leaders:
+                report.error(source, line, f"unknown leader {leader}")
+                continue
+            current = existing[name][1] if name in existing else leaders.get(name)
+            if current and current != leader:
+                report.error(source, line, f"{name} is already led by {current}")
+                continue
+            leaders[name] = leader
+        members = links.setdefault(name, set())
+        member = row.get(member_column)
+        if member:
+            if member not in known_members:
+                report.error(source, line, f"unknown {member_column} {member}")
+                continue
+            members.add(member)
+
+    new_groups = {}
+    for name in links:
+        if name in existing:
+            report.skipped[source] += 1
+        elif name not in leaders:
+            report.error(source, first_lines[name], f"new {name_column} {name} needs a leader")
+        else:
+            new_groups[name] = leaders[name]
+    report.created[source] = len(new_groups)
+    return new_groups, {name: pk for name, (pk, _) in existing.items()}, links
+
+
+'''
+import_directory is used to onboard users, team memberships and department-team links from CSV.
+
+users:       username, first_name, last_name, email, role, password
+teams:       team, leader, engineer    (one row per membership; leader is only needed once)
+departments: department, leader, team  (one row per team link; leader is only needed once)
+
+Each argument is an open text file or None. Users, teams and departments that already exist are
+kept as they are and can be referenced by the other files, so an import can be re-run safely.
+Every row is validated first; nothing is written if any row fails or when dry_run is set.
+Otherwise everything is written in one transaction with bulk_create.
+Users without a password get an unusable one and set theirs with a password reset. Each given
+password costs a full PBKDF2 hash, so max_passwords bounds how many one import may hash.
+It returns an ImportReport.
+'''
+def import_directory(users=None, teams=None, departments=None, max_passwords=None, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    report = ImportReport(dry_run=dry_run)
+    user_rows = read_rows('users', users, report) if users else []
+    team_rows = read_rows('teams', teams, report) if teams else []
+    department_rows = read_rows('departments', departments, report) if departments else []
+
+    new_users, existing_users = _check_users(user_rows, report, max_passwords)
+    referenced = {
+        row[column] for _, row in team_rows + department_rows
+        for column in ('leader', 'engineer') if row.get(column)
+    }
+    known_users = existing_users | {user['username'] for user in new_users}
+    known_users |= {username for (username,) in _lookup(User.objects.all(), 'username', referenced - known_users, ('username',))}
+
+    new_teams, existing_teams, memberships = _check_groups('teams', Team, 'team', 'engineer', team_rows, known_users, known_users, report)
+    known_teams = set(existing_teams) | set(new_teams)
+    known_teams |= {name for (name,) in _lookup(Team.objects.all(), 'name', {row['team'] for _, row in department_rows if row.get('team')} - known_teams, ('name',))}
+    new_departments, existing_departments, department_teams = _check_groups('departments', Department, 'department', 'team', department_rows, known_users, known_teams, report)
+
+    if not report.ok:
+        report.created.clear()
+        return report
+
+    ## links that already exist are skipped
+    existing_memberships = set(_lookup(
+        Team.engineers.through.objects.all(), 'team_id', existing_teams.values(), ('team__name', 'user__username'),
+    ))
+    existing_department_teams = set(_lookup(
+        Department.teams.through.objects.all(), 'department_id', existing_departments.values(), ('department__name', 'team__name'),
+    ))
+    memberships = [(team, user) for team, users in memberships.items() for user in sorted(users)]
+    department_teams = [(department, team) for department, teams in department_teams.items() for team in sorted(teams)]
+    new_memberships = [pair for pair in memberships if pair not in existing_memberships]
+    new_department_teams = [pair for pair in department_teams if pair not in existing_department_teams]
+    report.created['memberships'] = len(new_memberships)
+    report.skipped['memberships'] = len(memberships) - len(new_memberships)
+    report.created['department_teams'] = len(new_department_teams)
+    report.skipped['department_teams'] = len(department_teams) - len(new_department_teams)
+
+    if dry_run:
+        return report
+
+    accounts = [
+        User(
+            username=user['username'],
+            first_name=user.get('first_name', ''),
+            last_name=user.get('last_name', ''),
+            email=user.get('email', ''),
+        )
+        for user in new_users
+    ]
+    ## hashing happens before the transaction so it does not hold the write lock
+    hashes = iter(hash_passwords(user['password'] for user in new_users if user['password']))
+    for account, user in zip(accounts, new_users):
+        if user['password']:
+            account.password = next(hashes)
+        else:
+            account.set_unusable_password()
+
+    with transaction.atomic():
+        created_users = User.objects.bulk_create(accounts, batch_size=batch_size)
+        UserProfile.objects.bulk_create(
+            (UserProfile(user=created, role=user['role']) for created, user in zip(created_users, new_users)),
+            batch_size=batch_size,
+        )
+
+        referenced = {user for _, user in new_memberships} | set(new_teams.values()) | set(new_departments.values())
+        user_ids = dict(_lookup(User.objects.all(), 'username', referenced, ('username', 'id')))
+
+        team_ids = dict(existing_teams)
+        team_ids.update(
+            (team.name, team.id)
+            for team in Team.objects.bulk_create(
+                (Team(name=name, leader_id=user_ids[leader]) for name, leader in new_teams.items()),
+                batch_size=batch_size,
+            )
+        )
+        Team.engineers.through.objects.bulk_create(
+            (Team.engineers.through(team_id=team_ids[team], user_id=user_ids[user]) for team, user in new_memberships),
+            batch_size=batch_size,
+        )
+
+        linked_teams = {team for _, team in new_department_teams} - set(team_ids)
+        team_ids.update(_lookup(Team.objects.all(), 'name', linked_teams, ('name', 'id')))
+        department_ids = dict(existing_departments)
+        department_ids.update(
+            (department.name, department.id)
+            for department in Department.objects.bulk_create(
+                (Department(name=name, leader_id=user_ids[leader]) for name, leader in new_departments.items()),
+                batch_size=batch_size,
+            )
+        )
+        Department.teams.through.objects.bulk_create(
+            (
+                Department.teams.through(department_id=department_ids[department], team_id=team_ids[team])
+                for department, team in new_department_teams
+            ),
+            batch_size=batch_size,
+        )
+
+        ## bulk_create skips the model signals, so refresh the cached access and fragments
+        transaction.on_commit(invalidate_all_access)
+        transaction.on_commit(invalidate_fragments)
+        linked_departments = {department_ids[department] for department, _ in new_department_teams}
+        transaction.on_commit(lambda: refresh_department_health(linked_departments))
+
+    return report
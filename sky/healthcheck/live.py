@@ -0,0 +1,164 @@
+import asyncio
+import json
+import threading
+import time
+
+from django.db.models import Count
+
+from .models import Response
+
+LIVE_HEARTBEAT_SECONDS = 15
+LIVE_RESYNC_SECONDS = 15
+## streams end after this long and the browser reconnects, so connections are recycled
+LIVE_STREAM_SECONDS = 300
+LIVE_RETRY_MS = 2000
+TRAFFIC_LIGHTS = ('green', 'yellow', 'red')
+
+
+def sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def aload_tally(session_id):
+    tally = {}
+    rows = Response.objects.filter(session_id=session_id).values('question', 'answer').annotate(responses=Count('id')).order_by()
+    async for row in rows:
+        tally.setdefault(row['question'], dict.fromkeys(TRAFFIC_LIGHTS, 0))[row['answer']] = row['responses']
+    voters = {pk async for pk in Response.objects.filter(session_id=session_id).values_list('user_id', flat=True).distinct()}
+    return tally, voters
+
+
+'''
+SessionChannel is the in-process publisher of one session's live tally.
+It holds the current counts per question and traffic light, the set of voters and the
+queues of the connected facilitators. Changes are applied once and fanned out to every
+queue, so no client polls the database; each queue belongs to the event loop that reads it.
+'''
+class SessionChannel:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.tally = {}
+        self.voters = set()
+        self.loaded = False
+        self.synced_at = 0.0
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'session': self.session_id,
+                'questions': {str(question): dict(counts) for question, counts in self.tally.items()},
+                'voters': len(self.voters),
+            }
+
+    def broadcast(self, event):
+        for loop, queue in list(self.subscribers):
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def apply(self, user_id, changes):
+        with self.lock:
+            if not self.loaded:
+                return
+            deltas = []
+            for question_id, previous, answer in changes:
+                counts = self.tally.setdefault(question_id, dict.fromkeys(TRAFFIC_LIGHTS, 0))
+                if previous:
+                    counts[previous] -= 1
+                    deltas.append({'question': question_id, 'answer': previous, 'delta': -1})
+                counts[answer] += 1
+                deltas.append({'question': question_id, 'answer': answer, 'delta': 1})
+            self.voters.add(user_id)
+            event = ('tally', {'session': self.session_id, 'changes': deltas, 'voters': len(self.voters)})
+        self.broadcast(event)
+
+    '''
+    aresync is used to reconcile the counts with the database, at most once per
+    LIVE_RESYNC_SECONDS however many clients call it. This also picks up answers written
+    by other processes. A snapshot is broadcast when anything differs.
+    '''
+    async def aresync(self, force=False):
+        with self.lock:
+            if not force and time.monotonic() - self.synced_at < LIVE_RESYNC_SECONDS:
+                return False
+            self.synced_at = time.monotonic()
+        tally, voters = await aload_tally(self.session_id)
+        with self.lock:
+            changed = not self.loaded or tally != self.tally or voters != self.voters
+            self.tally, self.voters, self.loaded = tally, voters, True
+        if changed:
+            self.broadcast(('snapshot', self.snapshot()))
+        return changed
+
+
+'''
+TallyHub keeps one SessionChannel per session that has connected facilitators.
+Channels are created by the first subscriber and dropped with the last one, so publishing
+to a session nobody is watching costs a dictionary lookup.
+'''
+class TallyHub:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = {}
+
+    async def asubscribe(self, session_id):
+        queue = asyncio.Queue()
+        with self.lock:
+            channel = self.channels.setdefault(session_id, SessionChannel(session_id))
+            channel.subscribers.append((asyncio.get_running_loop(), queue))
+        if not channel.loaded:
+            await channel.aresync(force=True)
+        else:
+            queue.put_nowait(('snapshot', channel.snapshot()))
+        return channel, queue
+
+    def unsubscribe(self, session_id, queue):
+        with self.lock:
+            channel = self.channels.get(session_id)
+            if channel is None:
+                return
+            channel.subscribers = [(loop, q) for loop, q in channel.subscribers if q is not queue]
+            if not channel.subscribers:
+                del self.channels[session_id]
+
+    def publish(self, session_id, user_id, changes):
+        with self.lock:
+            channel = self.channels.get(session_id)
+        if channel is not None and changes:
+            channel.apply(user_id, changes)
+
+
+tally_hub = TallyHub()
+
+
+'''
+publish_responses is used by submit_responses, after its transaction commits, to push the
+answers of one user to the facilitators watching the session.
+changes is a list of (question_id, previous answer or None, answer).
+'''
+def publish_responses(session_id, user_id, changes):
+    tally_hub.publish(session_id, user_id, changes)
+
+
+'''
+tally_events is used to produce the Server-Sent Events stream of a session: a snapshot on
+connect, then one tally event per submission. When the session is quiet, the counts are
+reconciled with the database or a keepalive comment is sent every `heartbeat` seconds.
+The stream ends after `duration` seconds; EventSource reconnects after LIVE_RETRY_MS.
+'''
+async def tally_events(session_id, duration=LIVE_STREAM_SECONDS, heartbeat=LIVE_HEARTBEAT_SECONDS):
+    channel, queue = await tally_hub.asubscribe(session_id)
+    deadline = time.monotonic() + duration
+    try:
+        yield f'retry: {LIVE_RETRY_MS}\n\n'
+        yield sse(*await queue.get())
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                if time.monotonic() < deadline and not await channel.aresync():
+                    yield ': keepalive\n\n'
+                continue
+            yield sse(event, data)
+    finally:
+        tally_hub.unsubscribe(session_id, queue)
@@ -0,0 +1,72 @@
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from healthcheck.benchmarks.sqlite_writes import PROFILES, copy_database, run_vote_writers, use_database
+from healthcheck.models import HealthCheckSession, Team
+
+
+'''
+benchmark_sqlite_writes command is used to compare the throughput of concurrent vote
+submissions under the default SQLite settings and the DATABASE_SQLITE_CONCURRENT profile.
+Each profile and writer count runs on its own copy of the configured (seeded) database.
+
+    python manage.py seed_healthcheck
+    python manage.py benchmark_sqlite_writes --writers 1 4 16 --submissions 400
+'''
+class Command(BaseCommand):
+    help = "Benchmark concurrent uservoting submissions on SQLite, default profile against the concurrent one."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, nargs='+', default=[1, 4, 16])
+        parser.add_argument('--submissions', type=int, default=400, help="Submissions per profile and writer count.")
+        parser.add_argument('--profile', choices=sorted(PROFILES) + ['both'], default='both')
+
+    def handle(self, *args, **options):
+        database = connections['default'].settings_dict
+        if database['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("benchmark_sqlite_writes needs the default database to be SQLite.")
+        targets = self.load_targets()
+        if not targets:
+            raise CommandError("No engineer has a session to vote in; run seed_healthcheck first.")
+
+        source, original_options = str(database['NAME']), database.get('OPTIONS', {})
+        profiles = sorted(PROFILES) if options['profile'] == 'both' else [options['profile']]
+        self.stdout.write(f"{options['submissions']} submissions per run, {len(targets)} voters")
+        self.stdout.write(f"{'profile':<12}{'writers':>8}{'commits/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for writers in options['writers']:
+                    for profile in profiles:
+                        copy = Path(directory) / f'{profile}-{writers}.sqlite3'
+                        copy_database(source, copy, PROFILES[profile]['journal_mode'])
+                        use_database(copy, PROFILES[profile]['options'])
+                        result = run_vote_writers(profile, targets, options['submissions'], writers)
+                        self.stdout.write(
+                            f"{result['interface']:<12}{result['concurrency']:>8}{result['committed_per_second']:>10}"
+                            f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}{result['errors']:>8}"
+                        )
+                        connections.close_all()
+                        copy.unlink()
+        finally:
+            use_database(source, original_options)
+
+    def load_targets(self, limit=200):
+        ## one (engineer, session, questions, team) per engineer of a team whose leader has a session
+        targets = []
+        sessions = {}
+        teams = Team.objects.prefetch_related('engineers').order_by('id')
+        for team in teams:
+            if team.leader_id not in sessions:
+                session = HealthCheckSession.objects.filter(team_leader_id=team.leader_id).order_by('id').first()
+                sessions[team.leader_id] = (session, list(session.questions.all()) if session else [])
+            session, questions = sessions[team.leader_id]
+            if session is None or not questions:
+                continue
+            for engineer in team.engineers.all():
+                targets.append((engineer, session, questions, team.id))
+                if len(targets) == limit:
+                    return targets
+        return targets
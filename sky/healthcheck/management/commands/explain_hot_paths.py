@@ -0,0 +1,72 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from healthcheck.analytics import traffic_light_counts
+from healthcheck.models import HealthCheckSession, Question, Response, Team, Vote, VoteRollup
+from healthcheck.seeding import seed_healthcheck
+
+
+class RollbackSeed(Exception):
+    pass
+
+
+'''
+explain_hot_paths command is used to print the query plans (EXPLAIN) of the hot lookup paths.
+Run it once with the indexes removed (e.g. `migrate healthcheck 0002_vote_rollup`) and once
+after `migrate` to compare the plans before and after.
+With --seed it first inserts a synthetic dataset that is rolled back afterwards.
+'''
+class Command(BaseCommand):
+    help = "Print EXPLAIN output for the hot Response, Vote and HealthCheckSession lookups."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Number of synthetic users to insert before explaining (rolled back).")
+        parser.add_argument('--questions', type=int, default=10, help="Questions per synthetic session.")
+        parser.add_argument('--sessions', type=int, default=4, help="Synthetic sessions per team.")
+
+    def handle(self, *args, **options):
+        if not options['seed']:
+            self.explain_all()
+            return
+
+        try:
+            with transaction.atomic():
+                seed_healthcheck(
+                    users=options['seed'],
+                    teams=max(1, options['seed'] // 10),
+                    questions=options['questions'] * 3,
+                    sessions_per_team=options['sessions'],
+                    questions_per_session=options['questions'],
+                    prefix='explain',
+                )
+                if connection.vendor in ('sqlite', 'postgresql'):
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+                self.explain_all()
+                raise RollbackSeed()
+        except RollbackSeed:
+            self.stdout.write("Synthetic data rolled back.")
+
+    def explain_all(self):
+        user = User.objects.order_by('id').first()
+        teams = list(Team.objects.values_list('id', flat=True)[:5])
+        questions = list(Question.objects.values_list('id', flat=True)[:12])
+        leaders = list(Team.objects.values_list('leader', flat=True)[:5])
+        session = HealthCheckSession.objects.order_by('id').first()
+
+        queries = {
+            'uservoting: existing responses': Response.objects.filter(user=user, session=session, question_id__in=questions),
+            'rollup recompute: votes per team and session': Vote.objects.filter(team_id=teams[0] if teams else None, session=session),
+            'team_progress: rollups for teams': VoteRollup.objects.filter(team__in=teams).values('session'),
+            'dashboard: sessions of a leader': HealthCheckSession.objects.filter(team_leader=user).order_by('-created_at'),
+            'dashboard: sessions of many leaders': HealthCheckSession.objects.filter(team_leader__in=leaders),
+            'report: answers per question': Response.objects.filter(question_id__in=questions).values('question', 'answer'),
+            'report: traffic lights per session and team': traffic_light_counts(sessions=[session.id] if session else None),
+            'report: traffic lights of teams': traffic_light_counts(teams=teams),
+        }
+
+        for label, queryset in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(queryset.explain())
+            self.stdout.write('')
@@ -0,0 +1,55 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from healthcheck.exports import EXPORT_CHUNK_SIZE, EXPORT_COLUMNS, EXPORT_FORMATS, export_stream
+
+
+'''
+export_healthcheck command is used to stream responses or votes to a CSV or NDJSON file,
+optionally gzip-compressed. Memory use stays constant whatever the number of rows.
+'''
+class Command(BaseCommand):
+    help = "Export responses or votes as CSV or NDJSON, optionally gzip-compressed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORT_COLUMNS))
+        parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true', help="Compress the output with gzip.")
+        parser.add_argument('--output', '-o', default='-', help="Output file; '-' writes to stdout.")
+        parser.add_argument('--team', type=int)
+        parser.add_argument('--department', type=int)
+        parser.add_argument('--session', type=int)
+        parser.add_argument('--date-from', type=date.fromisoformat)
+        parser.add_argument('--date-to', type=date.fromisoformat)
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help="Rows fetched per database round trip.")
+        parser.add_argument('--database', default=None, help="Database alias to read from, e.g. replica.")
+
+    def handle(self, *args, **options):
+        filters = {
+            name: options[name]
+            for name in ('team', 'department', 'session', 'date_from', 'date_to')
+            if options[name] is not None
+        }
+        chunks = export_stream(
+            options['kind'], options['export_format'], options['gzip'],
+            chunk_size=options['chunk_size'], using=options['database'], **filters,
+        )
+
+        if options['output'] == '-':
+            self.write_chunks(sys.stdout.buffer if options['gzip'] else sys.stdout, chunks)
+            return
+
+        mode = 'wb' if options['gzip'] else 'w'
+        try:
+            with open(options['output'], mode, **({} if options['gzip'] else {'newline': '', 'encoding': 'utf-8'})) as output:
+                self.write_chunks(output, chunks)
+        except OSError as error:
+            raise CommandError(f"Could not write {options['output']}: {error}")
+        self.stderr.write(self.style.SUCCESS(f"Exported {options['kind']} to {options['output']}."))
+
+    def write_chunks(self, output, chunks):
+        for chunk in chunks:
+            output.write(chunk)
+        output.flush()
@@ -0,0 +1,49 @@
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from healthcheck.imports import IMPORT_BATCH_SIZE, import_directory
+
+
+'''
+import_healthcheck command is used to bulk import users, team memberships and department-team
+links from CSV files in one transaction. Use --dry-run to validate the files without writing.
+Users without a password column get an unusable password and set theirs with a password reset.
+'''
+class Command(BaseCommand):
+    help = "Bulk import users, team memberships and department-team links from CSV files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', help="CSV with username, first_name, last_name, email, role, password.")
+        parser.add_argument('--teams', help="CSV with team, leader, engineer (one row per membership).")
+        parser.add_argument('--departments', help="CSV with department, leader, team (one row per team link).")
+        parser.add_argument('--dry-run', action='store_true', help="Validate the files and report without writing.")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help="Rows per bulk_create batch.")
+
+    def handle(self, *args, **options):
+        sources = {name: options[name] for name in ('users', 'teams', 'departments') if options[name]}
+        if not sources:
+            raise CommandError("Pass at least one of --users, --teams or --departments.")
+
+        with ExitStack() as stack:
+            try:
+                files = {
+                    name: stack.enter_context(open(path, encoding='utf-8-sig', newline=''))
+                    for name, path in sources.items()
+                }
+            except OSError as error:
+                raise CommandError(error)
+            report = import_directory(
+                dry_run=options['dry_run'],
+                batch_size=options['batch_size'],
+                **files,
+            )
+
+        for line in report.summary():
+            self.stdout.write(line)
+        if not report.ok:
+            raise CommandError(f"{len(report.errors)} error(s) found; nothing was imported.")
+        if report.dry_run:
+            self.stdout.write(self.style.SUCCESS("Dry run: all rows are valid, nothing was written."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Import completed."))
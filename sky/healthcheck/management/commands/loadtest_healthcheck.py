@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+
+from healthcheck.benchmarks.load import LoadTarget, run_asgi, run_wsgi
+from healthcheck.models import HealthCheckSession
+
+
+'''
+loadtest_healthcheck command is used to compare WSGI and ASGI throughput and latency for the
+voting flow at increasing concurrency, against the configured (seeded) database.
+GET requests are read-only; --post submits answers, so only run it against a copy of the data.
+
+    python manage.py seed_healthcheck
+    python manage.py loadtest_healthcheck --concurrency 10 50 200 --requests 1000
+'''
+class Command(BaseCommand):
+    help = "Load-test the uservoting (or dashboard) view through the WSGI and ASGI handlers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', choices=('uservoting', 'dashboard'), default='uservoting')
+        parser.add_argument('--post', action='store_true', help="Submit answers instead of loading the form.")
+        parser.add_argument('--interface', choices=('wsgi', 'asgi', 'both'), default='both')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200])
+        parser.add_argument('--requests', type=int, default=500, help="Requests per interface and concurrency level.")
+        parser.add_argument('--username', help="Engineer to send the requests as; defaults to the first engineer in a team.")
+
+    def handle(self, *args, **options):
+        user = self.load_user(options['username'])
+        session = (
+            HealthCheckSession.objects.filter(team_leader__led_teams__engineers=user).order_by('id').first()
+        )
+        if options['view'] == 'uservoting' and session is None:
+            raise CommandError(f"{user.username} has no session to vote in; run seed_healthcheck first.")
+
+        if options['view'] == 'uservoting':
+            path = reverse('uservoting', args=[session.id])
+            data = {f'question_{pk}': 'green' for pk in session.questions.values_list('id', flat=True)}
+        else:
+            path, data = reverse('dashboard'), None
+        method = 'post' if options['post'] else 'get'
+        target = LoadTarget(user, method, path, data if options['post'] else None)
+
+        from sky.asgi import application as asgi_application
+        from sky.wsgi import application as wsgi_application
+
+        interfaces = ['wsgi', 'asgi'] if options['interface'] == 'both' else [options['interface']]
+        self.stdout.write(f"{method.upper()} {path} as {user.username}, {options['requests']} requests per run")
+        self.stdout.write(f"{'interface':<10}{'conc.':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for concurrency in options['concurrency']:
+            for interface in interfaces:
+                if interface == 'wsgi':
+                    result = run_wsgi(wsgi_application, target, options['requests'], concurrency)
+                else:
+                    result = run_asgi(asgi_application, target, options['requests'], concurrency)
+                connections.close_all()
+                self.stdout.write(
+                    f"{result['interface']:<10}{result['concurrency']:>6}{result['requests_per_second']:>10}"
+                    f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}{result['errors']:>8}"
+                )
+
+    def load_user(self, username):
+        users = User.objects.all()
+        if username:
+            user = users.filter(username=username).first()
+            if user is None:
+                raise CommandError(f"Unknown user {username}.")
+            return user
+        user = users.filter(teams__isnull=False, userprofile__role='Engineer').order_by('id').first()
+        if user is None:
+            raise CommandError("No engineer in a team; run seed_healthcheck first.")
+        return user
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from healthcheck.trends import rebuild_trends
+
+
+'''
+rebuild_trends command is used to backfill the daily, weekly and quarterly trend buckets
+from the raw votes and responses.
+'''
+class Command(BaseCommand):
+    help = "Rebuild the vote and traffic-light trend buckets from the Vote and Response tables."
+
+    def handle(self, *args, **options):
+        counts = rebuild_trends()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {counts['vote_buckets']} vote and {counts['response_buckets']} response trend buckets."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from healthcheck.rollups import rebuild_all_rollups, rebuild_health_rollups
+
+
+'''
+rebuild_vote_rollups command is used to regenerate the VoteRollup table from the raw votes,
+and the team, department and organisation HealthRollup rows from it.
+'''
+class Command(BaseCommand):
+    help = "Rebuild the per team and session vote rollups from the Vote table, then the health rollups."
+
+    def handle(self, *args, **options):
+        count = rebuild_all_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} vote rollups."))
+        levels = rebuild_health_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt health rollups for {levels['teams']} teams, {levels['departments']} departments "
+            f"and {levels['organisation']} organisation."
+        ))
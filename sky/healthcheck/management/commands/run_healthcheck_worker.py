@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from healthcheck.tasks import TASK_BATCH_SIZE, queue_stats, run_pending_tasks, worker_stats
+
+
+'''
+run_healthcheck_worker command is used to consume the AnalyticsTask queue: it runs due
+tasks in batches and polls the table when the queue is empty. Use --once to drain the
+queue and exit (e.g. from cron), and --stats to print the queue depth and lag.
+'''
+class Command(BaseCommand):
+    help = "Run the analytics worker that recomputes rollups queued by vote changes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the due tasks and exit.")
+        parser.add_argument('--stats', action='store_true', help="Print the queue depth and lag and exit.")
+        parser.add_argument('--batch-size', type=int, default=TASK_BATCH_SIZE)
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.HEALTHCHECK_WORKER_POLL_SECONDS,
+            help="Seconds to wait before polling an empty queue again.",
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.write_stats()
+            return
+
+        if options['once']:
+            handled = run_pending_tasks(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Ran {handled} analytics tasks."))
+            self.write_stats()
+            return
+
+        self.stdout.write(f"Analytics worker started, polling every {options['poll_interval']}s.")
+        try:
+            while True:
+                if not run_pending_tasks(batch_size=options['batch_size']):
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            self.stdout.write("Analytics worker stopped.")
+            self.write_stats()
+
+    def write_stats(self):
+        queue = queue_stats()
+        worker = worker_stats.snapshot()
+        self.stdout.write(
+            f"queue depth {queue['depth']} ({queue['events']} events, {queue['due']} due, {queue['failed']} failed), "
+            f"lag {queue['lag_seconds']}s; worker ran {worker['processed']} tasks for {worker['events']} events, "
+            f"{worker['failed']} failed, max lag {worker['max_lag_seconds']}s"
+        )
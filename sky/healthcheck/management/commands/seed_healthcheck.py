@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from healthcheck.seeding import SEED_PASSWORD, seed_healthcheck
+
+
+'''
+seed_healthcheck command is used to generate a synthetic dataset for local benchmarking.
+The same --seed always produces the same data.
+'''
+class Command(BaseCommand):
+    help = "Generate synthetic users, teams, departments, sessions, responses and votes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="Total number of users across all roles.")
+        parser.add_argument('--departments', type=int, default=5)
+        parser.add_argument('--teams', type=int, default=20)
+        parser.add_argument('--questions', type=int, default=30, help="Size of the question bank.")
+        parser.add_argument('--sessions-per-team', type=int, default=4)
+        parser.add_argument('--questions-per-session', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed produces the same data.")
+        parser.add_argument('--prefix', default='seed', help="Prefix for generated usernames and names.")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows per bulk_create batch.")
+
+    def handle(self, *args, **options):
+        counts = seed_healthcheck(
+            users=options['users'],
+            departments=options['departments'],
+            teams=options['teams'],
+            questions=options['questions'],
+            sessions_per_team=options['sessions_per_team'],
+            questions_per_session=options['questions_per_session'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            chunk_size=options['chunk_size'],
+        )
+        for model, count in counts.items():
+            self.stdout.write(f"{model}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Seeded data. Every generated user's password is '{SEED_PASSWORD}'."))
@@ -0,0 +1,238 @@
+import logging
+import threading
+from bisect import bisect_left
+from collections import Counter, deque
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connections
+
+logger = logging.getLogger('healthcheck.metrics')
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SAMPLE_WINDOW = 1000
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _histogram(buckets, counts):
+    labels = [f'<={bound}' for bound in buckets] + [f'>{buckets[-1]}']
+    return dict(zip(labels, counts))
+
+
+'''
+ViewMetrics holds the aggregated measurements of one URL name.
+Latency and query counts are kept as fixed-bucket histograms plus a bounded window
+of recent samples for the p50/p95/p99 figures.
+'''
+class ViewMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.budget_breaches = 0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.query_buckets = [0] * (len(QUERY_BUCKETS) + 1)
+        self.latencies = deque(maxlen=SAMPLE_WINDOW)
+        self.queries = deque(maxlen=SAMPLE_WINDOW)
+        self.duplicates = deque(maxlen=SAMPLE_WINDOW)
+        self.slowest_query = None
+
+    def record(self, sample):
+        self.requests += 1
+        self.budget_breaches += sample['over_budget']
+        self.latency_buckets[bisect_left(LATENCY_BUCKETS_MS, sample['latency_ms'])] += 1
+        self.query_buckets[bisect_left(QUERY_BUCKETS, sample['queries'])] += 1
+        self.latencies.append(sample['latency_ms'])
+        self.queries.append(sample['queries'])
+        self.duplicates.append(sample['duplicate_queries'])
+        slowest = sample['slowest_query']
+        if slowest and (self.slowest_query is None or slowest['ms'] > self.slowest_query['ms']):
+            self.slowest_query = slowest
+
+    def summary(self):
+        return {
+            'requests': self.requests,
+            'budget_breaches': self.budget_breaches,
+            'latency_ms': {
+                'p50': _percentile(self.latencies, 50),
+                'p95': _percentile(self.latencies, 95),
+                'p99': _percentile(self.latencies, 99),
+                'histogram': _histogram(LATENCY_BUCKETS_MS, self.latency_buckets),
+            },
+            'queries': {
+                'p50': _percentile(self.queries, 50),
+                'p95': _percentile(self.queries, 95),
+                'p99': _percentile(self.queries, 99),
+                'histogram': _histogram(QUERY_BUCKETS, self.query_buckets),
+            },
+            'duplicate_queries_p95': _percentile(self.duplicates, 95),
+            'slowest_query': self.slowest_query,
+        }
+
+
+'''
+MetricsRegistry is the in-process store of ViewMetrics, keyed by URL name.
+'''
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, url_name, sample):
+        with self._lock:
+            self._views.setdefault(url_name, ViewMetrics()).record(sample)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: metrics.summary() for name, metrics in sorted(self._views.items())}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = MetricsRegistry()
+
+
+'''
+QueryRecorder is a database execute wrapper that times every query of a request.
+'''
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.statements = Counter()
+        self.slowest = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (perf_counter() - start) * 1000
+            self.count += 1
+            self.statements[(sql, repr(params))] += 1
+            if self.slowest is None or elapsed > self.slowest['ms']:
+                self.slowest = {'sql': sql[:500], 'ms': round(elapsed, 3)}
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+
+'''
+record_query is the execute wrapper installed on every database connection: it hands each query
+to the QueryRecorder of the current request. The recorder is held in a context variable, which
+sync_to_async copies into the thread that runs the ORM calls of an async view.
+'''
+_current_recorder = ContextVar('request_metrics_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+'''
+install_query_recorder is used to add record_query to the connection of every database alias
+(the replica included) in the current thread. It runs on request_started, which is sent from
+the thread that runs the request's database queries, also under ASGI.
+'''
+def install_query_recorder(**kwargs):
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if record_query not in wrappers:
+            wrappers.append(record_query)
+
+
+'''
+RequestMetricsMiddleware records the latency, query count, duplicate queries and slowest
+query of every request, tagged with the resolved URL name.
+Queries are counted on every database alias, in sync and async views. A streaming response
+is measured until its body has been sent, so the queries that produce the body are counted too.
+It is opt-in: set HEALTHCHECK_REQUEST_METRICS = True to enable it. Requests over
+HEALTHCHECK_QUERY_BUDGET queries or HEALTHCHECK_TIME_BUDGET_MS milliseconds are logged.
+'''
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'HEALTHCHECK_REQUEST_METRICS', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.query_budget = getattr(settings, 'HEALTHCHECK_QUERY_BUDGET', 50)
+        self.time_budget_ms = getattr(settings, 'HEALTHCHECK_TIME_BUDGET_MS', 500)
+        request_started.connect(install_query_recorder, dispatch_uid='healthcheck.metrics.install_query_recorder')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = perf_counter()
+        _current_recorder.set(recorder)
+        return self.measure(request, self.get_response(request), recorder, start)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = perf_counter()
+        _current_recorder.set(recorder)
+        return self.measure(request, await self.get_response(request), recorder, start)
+
+    def measure(self, request, response, recorder, start):
+        if not response.streaming:
+            self.record(request, recorder, start)
+        elif response.is_async:
+            response.streaming_content = self.awatch_stream(request, response.streaming_content, recorder, start)
+        else:
+            response.streaming_content = self.watch_stream(request, response.streaming_content, recorder, start)
+        return response
+
+    ## the recorder stays current while the body is read, so only the total is taken here
+    def watch_stream(self, request, content, recorder, start):
+        try:
+            yield from content
+        finally:
+            self.record(request, recorder, start)
+
+    async def awatch_stream(self, request, content, recorder, start):
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            self.record(request, recorder, start)
+
+    def record(self, request, recorder, start):
+        _current_recorder.set(None)
+        latency_ms = (perf_counter() - start) * 1000
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match and match.url_name else 'unresolved'
+        over_budget = recorder.count > self.query_budget or latency_ms > self.time_budget_ms
+        registry.record(url_name, {
+            'latency_ms': round(latency_ms, 3),
+            'queries': recorder.count,
+            'duplicate_queries': recorder.duplicates,
+            'slowest_query': recorder.slowest,
+            'over_budget': over_budget,
+        })
+
+        if over_budget:
+            logger.warning(
+                "%s %s (%s) took %.1fms with %d queries (%d duplicates); slowest %.1fms: %s",
+                request.method, request.path, url_name, latency_ms, recorder.count, recorder.duplicates,
+                recorder.slowest['ms'] if recorder.slowest else 0,
+                recorder.slowest['sql'] if recorder.slowest else '',
+            )
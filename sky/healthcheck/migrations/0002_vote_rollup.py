@@ -0,0 +1,83 @@
+# Generated by Django 5.1 on 2026-10-18 00:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+
+
+def populate_vote_rollups(apps, schema_editor):
+    Vote = apps.get_model("healthcheck", "Vote")
+    VoteRollup = apps.get_model("healthcheck", "VoteRollup")
+    rows = (
+        Vote.objects.values("team", "session")
+        .annotate(
+            vote_count=Count("id"),
+            vote_sum=Sum("vote_value"),
+            vote_min=Min("vote_value"),
+            vote_max=Max("vote_value"),
+            vote_sum_squares=Sum(F("vote_value") * F("vote_value")),
+        )
+        .order_by()
+    )
+    VoteRollup.objects.bulk_create(
+        [
+            VoteRollup(team_id=row.pop("team"), session_id=row.pop("session"), **row)
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("healthcheck", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VoteRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("vote_count", models.PositiveIntegerField(default=0)),
+                ("vote_sum", models.BigIntegerField(default=0)),
+                ("vote_min", models.IntegerField(blank=True, null=True)),
+                ("vote_max", models.IntegerField(blank=True, null=True)),
+                ("vote_sum_squares", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "session",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="vote_rollups",
+                        to="healthcheck.healthchecksession",
+                    ),
+                ),
+                (
+                    "team",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="vote_rollups",
+                        to="healthcheck.team",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("team", "session"),
+                        name="unique_vote_rollup_team_session",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_vote_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.1 on 2026-10-18 00:29
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Sum
+
+
+def delete_duplicates(model, fields):
+    """Keep the newest row of every duplicate group and delete the rest.
+
+    Returns the groups that had duplicates.
+    """
+    groups = (
+        model.objects.values(*fields)
+        .annotate(rows=Count("id"), keep=Max("id"))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    duplicated = []
+    for group in groups:
+        keep = group.pop("keep")
+        group.pop("rows")
+        model.objects.filter(**group).exclude(id=keep).delete()
+        duplicated.append(group)
+    return duplicated
+
+
+def deduplicate_responses_and_votes(apps, schema_editor):
+    Response = apps.get_model("healthcheck", "Response")
+    Vote = apps.get_model("healthcheck", "Vote")
+    VoteRollup = apps.get_model("healthcheck", "VoteRollup")
+
+    delete_duplicates(Response, ["user", "question"])
+
+    # signals do not run in migrations, so refresh the rollups of the affected buckets
+    buckets = {
+        (group["team"], group["session"])
+        for group in delete_duplicates(Vote, ["user", "session", "team"])
+    }
+    for team_id, session_id in buckets:
+        totals = Vote.objects.filter(team_id=team_id, session_id=session_id).aggregate(
+            vote_count=Count("id"),
+            vote_sum=Sum("vote_value"),
+            vote_min=Min("vote_value"),
+            vote_max=Max("vote_value"),
+            vote_sum_squares=Sum(F("vote_value") * F("vote_value")),
+        )
+        VoteRollup.objects.update_or_create(
+            team_id=team_id, session_id=session_id, defaults=totals
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("healthcheck", "0002_vote_rollup"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="healthchecksession",
+            index=models.Index(
+                fields=["team_leader", "-created_at"], name="session_leader_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="response",
+            index=models.Index(
+                fields=["question", "answer"], name="response_question_answer_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vote",
+            index=models.Index(
+                fields=["team", "session"], name="vote_team_session_idx"
+            ),
+        ),
+        migrations.RunPython(
+            deduplicate_responses_and_votes, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="response",
+            constraint=models.UniqueConstraint(
+                fields=("user", "question"), name="unique_response_user_question"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="vote",
+            constraint=models.UniqueConstraint(
+                fields=("user", "session", "team"), name="unique_vote_user_session_team"
+            ),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.1 on 2026-10-18 00:40
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def backfill_response_sessions(apps, schema_editor):
+    """Attach existing responses to the session and team they were most likely given in.
+
+    A response belongs to a session that asks its question and is run by the leader of
+    one of the user's teams; when several match, the latest session created before the
+    answer wins. Responses to a question asked by a single session go to that session.
+    Anything else keeps a null session rather than a guessed one.
+    """
+    Response = apps.get_model("healthcheck", "Response")
+    HealthCheckSession = apps.get_model("healthcheck", "HealthCheckSession")
+    Team = apps.get_model("healthcheck", "Team")
+
+    sessions_by_question = {}
+    for (
+        question_id,
+        session_id,
+        leader_id,
+        created_at,
+    ) in HealthCheckSession.questions.through.objects.order_by(
+        "healthchecksession__created_at", "healthchecksession_id"
+    ).values_list(
+        "question_id",
+        "healthchecksession_id",
+        "healthchecksession__team_leader_id",
+        "healthchecksession__created_at",
+    ):
+        sessions_by_question.setdefault(question_id, []).append(
+            (session_id, leader_id, created_at)
+        )
+
+    teams_by_user = {}
+    for user_id, team_id, leader_id in Team.engineers.through.objects.order_by(
+        "team_id"
+    ).values_list("user_id", "team_id", "team__leader_id"):
+        teams_by_user.setdefault(user_id, {}).setdefault(leader_id, team_id)
+
+    def infer(response):
+        candidates = sessions_by_question.get(response.question_id, [])
+        led_by = teams_by_user.get(response.user_id, {})
+        matching = [session for session in candidates if session[1] in led_by]
+        if matching:
+            earlier = [
+                session for session in matching if session[2] <= response.timestamp
+            ]
+            session_id, leader_id, _ = (earlier or matching)[-1]
+            return session_id, led_by[leader_id]
+        if len(candidates) == 1:
+            return candidates[0][0], None
+        return None, None
+
+    batch = []
+    for response in Response.objects.filter(session__isnull=True).iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        response.session_id, response.team_id = infer(response)
+        if response.session_id:
+            batch.append(response)
+        if len(batch) >= BATCH_SIZE:
+            Response.objects.bulk_update(batch, ["session", "team"])
+            batch = []
+    if batch:
+        Response.objects.bulk_update(batch, ["session", "team"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("healthcheck", "0004_response_session_team"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_response_sessions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1 on 2026-10-18 00:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("healthcheck", "0005_backfill_response_sessions"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="response",
+            name="unique_response_user_question",
+        ),
+        migrations.AddIndex(
+            model_name="response",
+            index=models.Index(
+                fields=["session", "team", "answer"], name="response_session_team_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="response",
+            index=models.Index(
+                fields=["team", "session", "answer"], name="response_team_session_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="response",
+            constraint=models.UniqueConstraint(
+                fields=("user", "session", "question"),
+                name="unique_response_user_session_question",
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1 on 2026-10-18 00:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("healthcheck", "0006_response_session_constraints"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="response",
+            name="response_session_team_idx",
+        ),
+        migrations.AddIndex(
+            model_name="response",
+            index=models.Index(
+                fields=["session", "team", "question", "answer"],
+                name="response_session_question_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,202 @@
+# Generated by Django 5.1 on 2026-10-18 00:48
+
+from datetime import date, timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Trunc
+
+
+def roll_up(day_rows, key_fields, counters):
+    """Sum day buckets into day, week (Monday) and quarter buckets."""
+    buckets = {}
+    for row in day_rows:
+        day = row["period_start"]
+        starts = {
+            "day": day,
+            "week": day - timedelta(days=day.weekday()),
+            "quarter": date(day.year, 3 * ((day.month - 1) // 3) + 1, 1),
+        }
+        for period, start in starts.items():
+            key = tuple(row[field] for field in key_fields) + (period, start)
+            totals = buckets.setdefault(key, dict.fromkeys(counters, 0))
+            for counter in counters:
+                totals[counter] += row[counter]
+    return buckets
+
+
+def populate_trend_buckets(apps, schema_editor):
+    Vote = apps.get_model("healthcheck", "Vote")
+    Response = apps.get_model("healthcheck", "Response")
+    VoteTrendBucket = apps.get_model("healthcheck", "VoteTrendBucket")
+    ResponseTrendBucket = apps.get_model("healthcheck", "ResponseTrendBucket")
+
+    vote_days = (
+        Vote.objects.annotate(
+            period_start=Trunc("created_at", "day", output_field=DateField())
+        )
+        .values("team", "period_start")
+        .annotate(
+            vote_count=Count("id"),
+            vote_sum=Sum("vote_value"),
+            vote_sum_squares=Sum(F("vote_value") * F("vote_value")),
+        )
+        .order_by()
+    )
+    VoteTrendBucket.objects.bulk_create(
+        [
+            VoteTrendBucket(
+                team_id=team_id, period=period, period_start=start, **totals
+            )
+            for (team_id, period, start), totals in roll_up(
+                vote_days, ("team",), ("vote_count", "vote_sum", "vote_sum_squares")
+            ).items()
+        ],
+        batch_size=1000,
+    )
+
+    response_days = (
+        Response.objects.filter(team__isnull=False)
+        .annotate(period_start=Trunc("timestamp", "day", output_field=DateField()))
+        .values("team", "question", "period_start")
+        .annotate(
+            **{
+                light: Count("id", filter=Q(answer=light))
+                for light in ("green", "yellow", "red")
+            }
+        )
+        .order_by()
+    )
+    ResponseTrendBucket.objects.bulk_create(
+        [
+            ResponseTrendBucket(
+                team_id=team_id,
+                question_id=question_id,
+                period=period,
+                period_start=start,
+                **totals,
+            )
+            for (team_id, question_id, period, start), totals in roll_up(
+                response_days, ("team", "question"), ("green", "yellow", "red")
+            ).items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("healthcheck", "0007_response_report_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResponseTrendBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[
+                            ("day", "Day"),
+                            ("week", "Week"),
+                            ("quarter", "Quarter"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("period_start", models.DateField()),
+                ("green", models.IntegerField(default=0)),
+                ("yellow", models.IntegerField(default=0)),
+                ("red", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "question",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="trend_buckets",
+                        to="healthcheck.question",
+                    ),
+                ),
+                (
+                    "team",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="response_trend_buckets",
+                        to="healthcheck.team",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["team", "period", "period_start"],
+                        name="response_trend_team_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("team", "question", "period", "period_start"),
+                        name="unique_response_trend_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="VoteTrendBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[
+                            ("day", "Day"),
+                            ("week", "Week"),
+                            ("quarter", "Quarter"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("period_start", models.DateField()),
+                ("vote_count", models.IntegerField(default=0)),
+                ("vote_sum", models.BigIntegerField(default=0)),
+                ("vote_sum_squares", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "team",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="vote_trend_buckets",
+                        to="healthcheck.team",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("team", "period", "period_start"),
+                        name="unique_vote_trend_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_trend_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,149 @@
+# Generated by Django 5.1 on 2026-10-18 00:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max, Min, Sum
+
+
+def add_totals(totals, row):
+    totals["team_count"] += 1
+    for field in ("vote_count", "vote_sum", "vote_sum_squares"):
+        totals[field] += row[field]
+    for field, pick in (("vote_min", min), ("vote_max", max)):
+        totals[field] = (
+            row[field] if totals[field] is None else pick(totals[field], row[field])
+        )
+
+
+def populate_health_rollups(apps, schema_editor):
+    """Sum the vote rollups into team rows, and the team rows into departments and the organisation."""
+    VoteRollup = apps.get_model("healthcheck", "VoteRollup")
+    Department = apps.get_model("healthcheck", "Department")
+    HealthRollup = apps.get_model("healthcheck", "HealthRollup")
+
+    teams = {
+        row.pop("team"): row
+        for row in VoteRollup.objects.filter(vote_count__gt=0)
+        .values("team")
+        .annotate(
+            vote_count=Sum("vote_count"),
+            vote_sum=Sum("vote_sum"),
+            vote_min=Min("vote_min"),
+            vote_max=Max("vote_max"),
+            vote_sum_squares=Sum("vote_sum_squares"),
+        )
+        .order_by()
+    }
+    empty = dict(
+        team_count=0,
+        vote_count=0,
+        vote_sum=0,
+        vote_sum_squares=0,
+        vote_min=None,
+        vote_max=None,
+    )
+    departments = {}
+    for department_id, team_id in Department.teams.through.objects.values_list(
+        "department_id", "team_id"
+    ):
+        if team_id in teams:
+            add_totals(
+                departments.setdefault(department_id, dict(empty)), teams[team_id]
+            )
+    organisation = dict(empty)
+    for totals in teams.values():
+        add_totals(organisation, totals)
+
+    rollups = [
+        HealthRollup(level="team", team_id=team_id, team_count=1, **totals)
+        for team_id, totals in teams.items()
+    ]
+    rollups += [
+        HealthRollup(level="department", department_id=department_id, **totals)
+        for department_id, totals in departments.items()
+    ]
+    if organisation["vote_count"]:
+        rollups.append(HealthRollup(level="organisation", **organisation))
+    HealthRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("healthcheck", "0008_trend_buckets"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HealthRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "level",
+                    models.CharField(
+                        choices=[
+                            ("team", "Team"),
+                            ("department", "Department"),
+                            ("organisation", "Organisation"),
+                        ],
+                        max_length=12,
+                    ),
+                ),
+                ("team_count", models.PositiveIntegerField(default=0)),
+                ("vote_count", models.PositiveIntegerField(default=0)),
+                ("vote_sum", models.BigIntegerField(default=0)),
+                ("vote_min", models.IntegerField(blank=True, null=True)),
+                ("vote_max", models.IntegerField(blank=True, null=True)),
+                ("vote_sum_squares", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "department",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="health_rollups",
+                        to="healthcheck.department",
+                    ),
+                ),
+                (
+                    "team",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="health_rollups",
+                        to="healthcheck.team",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("level", "team")),
+                        fields=("team",),
+                        name="unique_team_health_rollup",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("level", "department")),
+                        fields=("department",),
+                        name="unique_department_health_rollup",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("level", "organisation")),
+                        fields=("level",),
+                        name="unique_organisation_health_rollup",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_health_rollups, migrations.RunPython.noop),
+    ]
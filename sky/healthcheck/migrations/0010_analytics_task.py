@@ -0,0 +1,59 @@
+# Generated by Django 5.1 on 2026-10-18 01:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("healthcheck", "0009_health_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnalyticsTask",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("vote_changed", "Vote changed"),
+                            ("session_closed", "Session closed"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, unique=True)),
+                ("team_id", models.BigIntegerField(blank=True, null=True)),
+                ("session_id", models.BigIntegerField(blank=True, null=True)),
+                ("events", models.PositiveIntegerField(default=1)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "available_at",
+                    models.DateTimeField(
+                        blank=True, default=django.utils.timezone.now, null=True
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["available_at", "id"],
+                        name="analytics_task_available_idx",
+                    )
+                ],
+            },
+        ),
+    ]
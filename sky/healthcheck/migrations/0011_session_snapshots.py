@@ -0,0 +1,54 @@
+# Generated by Django 5.1 on 2026-10-18 01:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("healthcheck", "0010_analytics_task"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="healthchecksession",
+            name="closed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="healthchecksession",
+            name="status",
+            field=models.CharField(
+                choices=[("open", "Open"), ("closed", "Closed")],
+                default="open",
+                max_length=10,
+            ),
+        ),
+        migrations.CreateModel(
+            name="SessionSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("response_count", models.PositiveIntegerField(default=0)),
+                ("vote_count", models.PositiveIntegerField(default=0)),
+                ("data", models.JSONField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "session",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshot",
+                        to="healthcheck.healthchecksession",
+                    ),
+                ),
+            ],
+        ),
+    ]
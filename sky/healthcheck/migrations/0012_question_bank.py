@@ -0,0 +1,88 @@
+# Generated by Django 5.1 on 2026-10-18 01:30
+
+from django.db import OperationalError, migrations, models
+
+QUESTION_TABLE = "healthcheck_question"
+FTS_TABLE = "healthcheck_question_fts"
+
+## an external-content FTS5 table over healthcheck_question.text, kept current by triggers
+SQLITE_FTS = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        text, content='{QUESTION_TABLE}', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {QUESTION_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {QUESTION_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF text ON {QUESTION_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+POSTGRESQL_FTS = [
+    f"CREATE INDEX {QUESTION_TABLE}_text_fts ON {QUESTION_TABLE} "
+    "USING GIN (to_tsvector('english', text))",
+]
+
+
+def create_question_search(apps, schema_editor):
+    """Index the question text for full-text search, where the database supports it."""
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        for statement in POSTGRESQL_FTS:
+            schema_editor.execute(statement)
+    elif vendor == "sqlite":
+        try:
+            schema_editor.execute(SQLITE_FTS[0])
+        except OperationalError:
+            ## SQLite built without FTS5: the question bank falls back to LIKE
+            return
+        for statement in SQLITE_FTS[1:]:
+            schema_editor.execute(statement)
+
+
+def drop_question_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {QUESTION_TABLE}_text_fts")
+    elif vendor == "sqlite":
+        for trigger in ("insert", "delete", "update"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("healthcheck", "0011_session_snapshots"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuestionTag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="tags",
+            field=models.ManyToManyField(
+                blank=True, related_name="questions", to="healthcheck.questiontag"
+            ),
+        ),
+        migrations.RunPython(create_question_search, drop_question_search),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 '''
 UserProfile model is used to store the role of the user.
@@ -45,12 +46,25 @@ class Department(models.Model):
         return self.name
     
 
+'''
+QuestionTag model is used to group the questions of the question bank, e.g. "Delivery" or "Team".
+'''
+class QuestionTag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
 '''
 Question model is used to store the questions for the health check.
 It has a text field to store the question.
+It has a many-to-many field to store the tags the question bank is filtered by.
+The text is indexed for full-text search (see questionbank.py).
 '''
 class Question(models.Model):
     text = models.TextField()
+    tags = models.ManyToManyField(QuestionTag, blank=True, related_name='questions')
 
     def __str__(self):
         return self.text
@@ -60,8 +74,11 @@ class Question(models.Model):
 Response model is used to store the responses for an user to a specific question for the health check.
 It has a foreign key to the User model to store the user.
 It has a foreign key to the Question model to store the question.
+It has a foreign key to the HealthCheckSession model to store the session the answer was given in.
+It has a foreign key to the Team model to store the team the user answered for.
 It has a char field to store the answer.
 It has a timestamp field to store the timestamp of when the response was created.
+A user answers a question once per session, so earlier sessions keep their answers.
 '''
 class Response(models.Model):
     TRAFFIC_LIGHT_CHOICES = [
@@ -77,9 +94,21 @@ class Response(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    session = models.ForeignKey('HealthCheckSession', on_delete=models.CASCADE, null=True, blank=True, related_name='responses')
+    team = models.ForeignKey('Team', on_delete=models.SET_NULL, null=True, blank=True, related_name='responses')
     answer = models.CharField(max_length=10, choices=TRAFFIC_LIGHT_CHOICES)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'session', 'question'], name='unique_response_user_session_question'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'answer'], name='response_question_answer_idx'),
+            models.Index(fields=['session', 'team', 'question', 'answer'], name='response_session_question_idx'),
+            models.Index(fields=['team', 'session', 'answer'], name='response_team_session_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.question.text[:30]} - {self.answer}"
 
@@ -90,12 +119,30 @@ It has a name field to store the name of the session.
 It has a many-to-many relationship with the Question model.
 It has a foreign key to the User model to store the team leader.
 It has a created_at field to store the timestamp of when the session was created.
+A session is open until its team leader closes it; closing freezes its results into a
+SessionSnapshot and no answers or votes are accepted afterwards.
 '''
 class HealthCheckSession(models.Model):
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('closed', 'Closed'),
+    ]
+
     name = models.CharField(max_length=100)
     team_leader = models.ForeignKey(User, on_delete=models.CASCADE)
     questions = models.ManyToManyField(Question)
     created_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['team_leader', '-created_at'], name='session_leader_created_idx'),
+        ]
+
+    @property
+    def is_closed(self):
+        return self.status == 'closed'
 
     def __str__(self):
         return self.name
@@ -108,5 +155,194 @@ class Vote(models.Model):
     vote_value = models.IntegerField()  # The actual vote (e.g. 1–10 scale)
     created_at = models.DateTimeField(auto_now_add=True)  # Timestamp
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'session', 'team'], name='unique_vote_user_session_team'),
+        ]
+        indexes = [
+            models.Index(fields=['team', 'session'], name='vote_team_session_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} voted {self.vote_value} for {self.team.name} in {self.session.name}"
+
+
+'''
+VoteRollup model is used to store pre-aggregated vote statistics per team and session.
+It is kept current by the Vote signals in signals.py and can be rebuilt with
+the rebuild_vote_rollups management command.
+'''
+class VoteRollup(models.Model):
+    team = models.ForeignKey('Team', on_delete=models.CASCADE, related_name='vote_rollups')
+    session = models.ForeignKey('HealthCheckSession', on_delete=models.CASCADE, related_name='vote_rollups')
+    vote_count = models.PositiveIntegerField(default=0)
+    vote_sum = models.BigIntegerField(default=0)
+    vote_min = models.IntegerField(null=True, blank=True)
+    vote_max = models.IntegerField(null=True, blank=True)
+    vote_sum_squares = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['team', 'session'], name='unique_vote_rollup_team_session'),
+        ]
+
+    @property
+    def avg_vote(self):
+        if not self.vote_count:
+            return None
+        return self.vote_sum / self.vote_count
+
+    def __str__(self):
+        return f"{self.team_id}/{self.session_id}: {self.vote_count} votes"
+
+
+'''
+VoteTrendBucket model is used to store vote totals per team and period (a day, a week or a quarter).
+Trend charts read one row per period instead of the raw votes.
+Sums are kept instead of averages so buckets can be updated incrementally in both directions.
+'''
+class VoteTrendBucket(models.Model):
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('quarter', 'Quarter'),
+    ]
+
+    team = models.ForeignKey('Team', on_delete=models.CASCADE, related_name='vote_trend_buckets')
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    vote_count = models.IntegerField(default=0)
+    vote_sum = models.BigIntegerField(default=0)
+    vote_sum_squares = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['team', 'period', 'period_start'], name='unique_vote_trend_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.team_id} {self.period} {self.period_start}: {self.vote_count} votes"
+
+
+'''
+ResponseTrendBucket model is used to store the traffic-light counts per team, question and period.
+'''
+class ResponseTrendBucket(models.Model):
+    team = models.ForeignKey('Team', on_delete=models.CASCADE, related_name='response_trend_buckets')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='trend_buckets')
+    period = models.CharField(max_length=10, choices=VoteTrendBucket.PERIOD_CHOICES)
+    period_start = models.DateField()
+    green = models.IntegerField(default=0)
+    yellow = models.IntegerField(default=0)
+    red = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['team', 'question', 'period', 'period_start'], name='unique_response_trend_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['team', 'period', 'period_start'], name='response_trend_team_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.team_id}/{self.question_id} {self.period} {self.period_start}"
+
+
+'''
+HealthRollup model is used to store vote aggregates at each level of the organisation:
+one row per team (from its VoteRollup rows), one per department (from the team rows of its teams)
+and a single organisation row (from every team row).
+It is kept current by the signals in signals.py and rebuilt with the rebuild_vote_rollups command.
+'''
+class HealthRollup(models.Model):
+    LEVEL_CHOICES = [
+        ('team', 'Team'),
+        ('department', 'Department'),
+        ('organisation', 'Organisation'),
+    ]
+
+    level = models.CharField(max_length=12, choices=LEVEL_CHOICES)
+    team = models.ForeignKey('Team', on_delete=models.CASCADE, null=True, blank=True, related_name='health_rollups')
+    department = models.ForeignKey('Department', on_delete=models.CASCADE, null=True, blank=True, related_name='health_rollups')
+    team_count = models.PositiveIntegerField(default=0)
+    vote_count = models.PositiveIntegerField(default=0)
+    vote_sum = models.BigIntegerField(default=0)
+    vote_min = models.IntegerField(null=True, blank=True)
+    vote_max = models.IntegerField(null=True, blank=True)
+    vote_sum_squares = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['team'], condition=models.Q(level='team'), name='unique_team_health_rollup'),
+            models.UniqueConstraint(fields=['department'], condition=models.Q(level='department'), name='unique_department_health_rollup'),
+            models.UniqueConstraint(fields=['level'], condition=models.Q(level='organisation'), name='unique_organisation_health_rollup'),
+        ]
+
+    @property
+    def avg_vote(self):
+        if not self.vote_count:
+            return None
+        return self.vote_sum / self.vote_count
+
+    @property
+    def stddev_vote(self):
+        if not self.vote_count:
+            return None
+        average = self.vote_sum / self.vote_count
+        return max(0.0, self.vote_sum_squares / self.vote_count - average * average) ** 0.5
+
+    def __str__(self):
+        return f"{self.level} {self.team_id or self.department_id or ''}: {self.vote_count} votes"
+
+
+
+'''
+SessionSnapshot model is used to store the results of a closed session in one serialized row.
+data holds, per team id ("0" for answers given outside a team), the vote aggregates and the
+green/yellow/red counts and health score of every question. It is written once, when the
+session is closed, so reports on closed sessions read it instead of the responses and votes.
+'''
+class SessionSnapshot(models.Model):
+    session = models.OneToOneField('HealthCheckSession', on_delete=models.CASCADE, related_name='snapshot')
+    response_count = models.PositiveIntegerField(default=0)
+    vote_count = models.PositiveIntegerField(default=0)
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.session_id}: {self.response_count} responses, {self.vote_count} votes"
+
+
+'''
+AnalyticsTask model is used as a database-backed queue of analytics recomputations,
+consumed by the run_healthcheck_worker command. Events for the same kind, team and session
+share one pending row (key), so a burst of votes is recomputed once; events counts them.
+Team and session are kept as plain ids so a task can outlive the rows it refers to.
+'''
+class AnalyticsTask(models.Model):
+    KIND_CHOICES = [
+        ('vote_changed', 'Vote changed'),
+        ('session_closed', 'Session closed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    key = models.CharField(max_length=64, unique=True)
+    team_id = models.BigIntegerField(null=True, blank=True)
+    session_id = models.BigIntegerField(null=True, blank=True)
+    events = models.PositiveIntegerField(default=1)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(null=True, blank=True, default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='analytics_task_available_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.user.username} voted {self.vote_value} for {self.team.name} in {self.session.name}"
\ No newline at end of file
+        return f"{self.kind} team={self.team_id} session={self.session_id} ({self.events} events)"
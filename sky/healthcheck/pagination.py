@@ -0,0 +1,40 @@
+from django.utils.functional import cached_property
+
+
+'''
+KeysetPage is one page of a queryset ordered by a unique field.
+Instead of OFFSET it filters on the last key of the previous page, so every page
+costs the same no matter how deep into the listing it is.
+The page is only read from the database when rows or next_cursor is first used,
+so a cached template fragment can skip the query entirely.
+'''
+class KeysetPage:
+    def __init__(self, queryset, key, after=None, page_size=50):
+        self.queryset = queryset
+        self.key = key
+        self.after = after
+        self.page_size = page_size
+
+    @cached_property
+    def _window(self):
+        queryset = self.queryset.order_by(self.key)
+        if self.after not in (None, ''):
+            queryset = queryset.filter(**{f'{self.key}__gt': self.after})
+        return list(queryset[:self.page_size + 1])
+
+    @property
+    def rows(self):
+        return self._window[:self.page_size]
+
+    @property
+    def next_cursor(self):
+        if len(self._window) <= self.page_size:
+            return None
+        return getattr(self._window[self.page_size - 1], self.key)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+def keyset_page(queryset, key, after=None, page_size=50):
+    return KeysetPage(queryset, key, after, page_size)
@@ -0,0 +1,74 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from .models import Question, QuestionTag
+
+
+QUESTION_FTS_TABLE = 'healthcheck_question_fts'
+SEARCH_TERMS = re.compile(r'\w+')
+
+## database name -> whether its FTS5 table exists, checked once per database
+_fts_tables = {}
+
+
+'''
+search_backend is used to find how the question bank of a database is searched:
+'fts5' when the SQLite full-text table of migration 0012 exists, 'tsvector' on PostgreSQL
+(GIN index on to_tsvector('english', text)) and 'like' otherwise.
+'''
+def search_backend(using='default'):
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        return 'tsvector'
+    if connection.vendor != 'sqlite':
+        return 'like'
+
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        with connection.cursor() as cursor:
+            _fts_tables[name] = QUESTION_FTS_TABLE in connection.introspection.table_names(cursor)
+    return 'fts5' if _fts_tables[name] else 'like'
+
+
+'''
+search_questions is used to filter the question bank by a search text and by tags.
+Every word of the search must match, as a prefix, so the picker finds questions while
+the user types; a question matches the tags when it has any of them.
+The result is a Question queryset, so it can be paged with keyset_page.
+'''
+def search_questions(search='', tags=None, using='default'):
+    questions = Question.objects.using(using)
+    terms = SEARCH_TERMS.findall(search or '')
+    if terms:
+        backend = search_backend(using)
+        if backend == 'fts5':
+            match = ' '.join(f'"{term}"*' for term in terms)
+            questions = questions.filter(id__in=RawSQL(
+                f'SELECT rowid FROM {QUESTION_FTS_TABLE} WHERE {QUESTION_FTS_TABLE} MATCH %s', [match],
+            ))
+        elif backend == 'tsvector':
+            query = ' & '.join(f'{term}:*' for term in terms)
+            questions = questions.alias(matches=RawSQL(
+                f"to_tsvector('english', {Question._meta.db_table}.text) @@ to_tsquery('english', %s)",
+                [query], output_field=BooleanField(),
+            )).filter(matches=True)
+        else:
+            for term in terms:
+                questions = questions.filter(text__icontains=term)
+    if tags:
+        questions = questions.filter(
+            id__in=Question.tags.through.objects.using(using).filter(questiontag_id__in=tags).values('question_id'),
+        )
+    return questions
+
+
+'''
+tags_for_names is used to get the tags of a comma-separated list of names,
+creating the ones that do not exist yet.
+'''
+def tags_for_names(names):
+    names = {name.strip() for name in names.split(',') if name.strip()}
+    return [QuestionTag.objects.get_or_create(name=name)[0] for name in sorted(names)]
@@ -0,0 +1,155 @@
+from array import array
+from dataclasses import dataclass, field
+from itertools import chain
+
+from django.db.models import Count
+
+from .models import Department, HealthCheckSession, Question, Response, Team
+from .snapshots import snapshot_answer_rows
+
+
+## integer codes of the traffic lights, from Response.answer_choices (1 green, 2 yellow, 3 red)
+ANSWER_CODES = {answer: code for code, answer in Response.answer_choices.items()}
+GREEN, YELLOW, RED = ANSWER_CODES['green'], ANSWER_CODES['yellow'], ANSWER_CODES['red']
+
+## health score of a traffic light, on a 0-100 scale
+ANSWER_SCORES = {GREEN: 100, YELLOW: 50, RED: 0}
+
+
+'''
+AnswerColumns holds answer counts as parallel integer arrays, one entry per
+(question, team, session, answer) group. A missing team is stored as 0.
+'''
+@dataclass
+class AnswerColumns:
+    question: array = field(default_factory=lambda: array('q'))
+    team: array = field(default_factory=lambda: array('q'))
+    session: array = field(default_factory=lambda: array('q'))
+    answer: array = field(default_factory=lambda: array('b'))
+    count: array = field(default_factory=lambda: array('q'))
+
+    def __len__(self):
+        return len(self.count)
+
+
+'''
+load_answer_columns is used to read the answer counts of the responses into AnswerColumns.
+The counting is one GROUP BY in the database, covered by response_session_question_idx,
+so only one row per group crosses into Python however many responses there are.
+Closed sessions are read from their snapshots instead of their responses.
+'''
+def load_answer_columns(teams=None, sessions=None, questions=None):
+    closed = HealthCheckSession.objects.filter(status='closed').values('id')
+    responses = Response.objects.filter(session__isnull=False).exclude(session_id__in=closed)
+    if teams is not None:
+        responses = responses.filter(team_id__in=teams)
+    if sessions is not None:
+        responses = responses.filter(session_id__in=sessions)
+    if questions is not None:
+        responses = responses.filter(question_id__in=questions)
+
+    ## grouped in the column order of response_session_question_idx, so the index covers the query
+    grouped = (
+        responses.values('session', 'team', 'question', 'answer')
+        .annotate(responses=Count('id')).order_by()
+        .values_list('session', 'team', 'question', 'answer', 'responses')
+    )
+    columns = AnswerColumns()
+    rows = chain(grouped.iterator(), snapshot_answer_rows(teams=teams, sessions=sessions, questions=questions))
+    for session_id, team_id, question_id, answer, count in rows:
+        columns.question.append(question_id)
+        columns.team.append(team_id or 0)
+        columns.session.append(session_id)
+        columns.answer.append(ANSWER_CODES[answer])
+        columns.count.append(count)
+    return columns
+
+
+def _percent(part, total):
+    return [round(100 * p / t, 1) if t else 0.0 for p, t in zip(part, total)]
+
+
+'''
+traffic_light_report is used to build the traffic-light distribution per question, team and session.
+Every row has the green/yellow/red counts and percentages, a health score (green 100, yellow 50,
+red 0, averaged over the answers) and the change of that score since the previous session
+of the same team for the same question.
+Rows are ordered by team, question and session date.
+'''
+def traffic_light_report(teams=None, sessions=None, questions=None):
+    columns = load_answer_columns(teams=teams, sessions=sessions, questions=questions)
+
+    ## group by (question, team, session): one slot per group, one count array per traffic light
+    slots = {}
+    keys = list(zip(columns.question, columns.team, columns.session))
+    for key in keys:
+        slots.setdefault(key, len(slots))
+    counts = {code: array('q', bytes(8 * len(slots))) for code in ANSWER_SCORES}
+    for key, code, count in zip(keys, columns.answer, columns.count):
+        counts[code][slots[key]] += count
+
+    greens, yellows, reds = counts[GREEN], counts[YELLOW], counts[RED]
+    totals = [g + y + r for g, y, r in zip(greens, yellows, reds)]
+    green_pct, yellow_pct, red_pct = _percent(greens, totals), _percent(yellows, totals), _percent(reds, totals)
+    scores = [
+        round((ANSWER_SCORES[GREEN] * g + ANSWER_SCORES[YELLOW] * y + ANSWER_SCORES[RED] * r) / t, 1) if t else None
+        for g, y, r, t in zip(greens, yellows, reds, totals)
+    ]
+
+    groups = list(slots)
+    session_ids = {session for _, _, session in groups}
+    session_info = {
+        pk: (name, created_at)
+        for pk, name, created_at in HealthCheckSession.objects.filter(id__in=session_ids).values_list('id', 'name', 'created_at')
+    }
+    team_names = dict(Team.objects.filter(id__in={team for _, team, _ in groups}).values_list('id', 'name'))
+    question_texts = dict(Question.objects.filter(id__in={question for question, _, _ in groups}).values_list('id', 'text'))
+
+    ## deltas: walk each (team, question) series in session order
+    order = sorted(
+        range(len(groups)),
+        key=lambda i: (team_names.get(groups[i][1], ''), groups[i][1], groups[i][0], session_info[groups[i][2]][1], groups[i][2]),
+    )
+    rows = []
+    previous = {}
+    for i in order:
+        question_id, team_id, session_id = groups[i]
+        series = (team_id, question_id)
+        last_score = previous.get(series)
+        previous[series] = scores[i]
+        session_name, session_created_at = session_info[session_id]
+        rows.append({
+            'question': question_id,
+            'question_text': question_texts.get(question_id, ''),
+            'team': team_id or None,
+            'team_name': team_names.get(team_id, ''),
+            'session': session_id,
+            'session_name': session_name,
+            'session_created_at': session_created_at,
+            'green': greens[i],
+            'yellow': yellows[i],
+            'red': reds[i],
+            'total': totals[i],
+            'green_pct': green_pct[i],
+            'yellow_pct': yellow_pct[i],
+            'red_pct': red_pct[i],
+            'health_score': scores[i],
+            'delta': round(scores[i] - last_score, 1) if last_score is not None else None,
+        })
+    return rows
+
+
+'''
+report_team_ids is used to limit a report to the teams an AccessContext can see:
+every team for Admins and Senior Managers (None), the teams of their departments
+for Department Leaders and their own teams for Team Leaders.
+'''
+def report_team_ids(access):
+    if access.has_role('Admin', 'Senior Manager'):
+        return None
+    if access.has_role('Department Leader'):
+        return set(
+            Department.teams.through.objects.filter(department_id__in=access.led_department_ids)
+            .values_list('team_id', flat=True)
+        )
+    return set(access.led_team_ids)
@@ -0,0 +1,195 @@
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .models import Department, HealthRollup, Vote, VoteRollup
+
+
+'''
+apply_vote_added is used to fold a newly created vote into its team/session rollup.
+The counters are incremented in the database so concurrent submissions do not lose updates.
+'''
+def apply_vote_added(team_id, session_id, value):
+    with transaction.atomic():
+        rollup, created = VoteRollup.objects.select_for_update().get_or_create(
+            team_id=team_id,
+            session_id=session_id,
+            defaults={
+                'vote_count': 1,
+                'vote_sum': value,
+                'vote_min': value,
+                'vote_max': value,
+                'vote_sum_squares': value * value,
+            },
+        )
+        if created:
+            return
+
+        VoteRollup.objects.filter(pk=rollup.pk).update(
+            vote_count=F('vote_count') + 1,
+            vote_sum=F('vote_sum') + value,
+            vote_min=Least(F('vote_min'), value) if rollup.vote_min is not None else value,
+            vote_max=Greatest(F('vote_max'), value) if rollup.vote_max is not None else value,
+            vote_sum_squares=F('vote_sum_squares') + value * value,
+            updated_at=timezone.now(),
+        )
+
+
+'''
+recompute_rollup is used to rebuild a single team/session rollup from its votes.
+It is used when a vote is changed or removed, since min and max cannot be decremented.
+Empty rollups are deleted.
+'''
+def recompute_rollup(team_id, session_id):
+    totals = Vote.objects.filter(team_id=team_id, session_id=session_id).aggregate(
+        vote_count=Count('id'),
+        vote_sum=Sum('vote_value'),
+        vote_min=Min('vote_value'),
+        vote_max=Max('vote_value'),
+        vote_sum_squares=Sum(F('vote_value') * F('vote_value')),
+    )
+
+    if not totals['vote_count']:
+        VoteRollup.objects.filter(team_id=team_id, session_id=session_id).delete()
+        return None
+
+    rollup, _ = VoteRollup.objects.update_or_create(
+        team_id=team_id,
+        session_id=session_id,
+        defaults=totals,
+    )
+    return rollup
+
+
+'''
+rebuild_all_rollups is used to regenerate every rollup from the raw votes in one pass.
+It is used by the rebuild_vote_rollups management command.
+'''
+def rebuild_all_rollups():
+    rows = (
+        Vote.objects
+        .values('team', 'session')
+        .annotate(
+            vote_count=Count('id'),
+            vote_sum=Sum('vote_value'),
+            vote_min=Min('vote_value'),
+            vote_max=Max('vote_value'),
+            vote_sum_squares=Sum(F('vote_value') * F('vote_value')),
+        )
+        .order_by()
+    )
+
+    rollups = [
+        VoteRollup(
+            team_id=row['team'],
+            session_id=row['session'],
+            vote_count=row['vote_count'],
+            vote_sum=row['vote_sum'],
+            vote_min=row['vote_min'],
+            vote_max=row['vote_max'],
+            vote_sum_squares=row['vote_sum_squares'],
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        VoteRollup.objects.all().delete()
+        VoteRollup.objects.bulk_create(rollups, batch_size=1000)
+
+    return len(rollups)
+
+
+HEALTH_TOTALS = {
+    'vote_count': Sum('vote_count'),
+    'vote_sum': Sum('vote_sum'),
+    'vote_min': Min('vote_min'),
+    'vote_max': Max('vote_max'),
+    'vote_sum_squares': Sum('vote_sum_squares'),
+}
+
+
+def _store_health(level, totals, **scope):
+    if not totals['vote_count']:
+        HealthRollup.objects.filter(level=level, **scope).delete()
+        return None
+    rollup, _ = HealthRollup.objects.update_or_create(level=level, **scope, defaults=totals)
+    return rollup
+
+
+'''
+refresh_team_health, refresh_department_health and refresh_organisation_health are used to
+recompute one level of the HealthRollup hierarchy from the level below it:
+teams from their VoteRollup rows, departments and the organisation from the team rows.
+Each reads only rollup rows, never the votes.
+'''
+def refresh_team_health(team_id):
+    totals = VoteRollup.objects.filter(team_id=team_id).aggregate(**HEALTH_TOTALS)
+    return _store_health('team', {**totals, 'team_count': 1}, team_id=team_id)
+
+
+def refresh_department_health(department_ids):
+    for department_id in department_ids:
+        totals = HealthRollup.objects.filter(level='team', team__department=department_id).aggregate(
+            team_count=Count('id'), **HEALTH_TOTALS,
+        )
+        _store_health('department', totals, department_id=department_id)
+
+
+def refresh_organisation_health():
+    totals = HealthRollup.objects.filter(level='team').aggregate(team_count=Count('id'), **HEALTH_TOTALS)
+    return _store_health('organisation', totals)
+
+
+'''
+refresh_health_branch is used when the votes of a team change: it refreshes that team,
+the departments the team belongs to and the organisation, and nothing else.
+'''
+def refresh_health_branch(team_id):
+    with transaction.atomic():
+        refresh_team_health(team_id)
+        refresh_department_health(
+            Department.teams.through.objects.filter(team_id=team_id).values_list('department_id', flat=True)
+        )
+        refresh_organisation_health()
+
+
+def _add_totals(totals, row):
+    totals['team_count'] += row['team_count']
+    totals['vote_count'] += row['vote_count']
+    totals['vote_sum'] += row['vote_sum']
+    totals['vote_sum_squares'] += row['vote_sum_squares']
+    totals['vote_min'] = row['vote_min'] if totals['vote_min'] is None else min(totals['vote_min'], row['vote_min'])
+    totals['vote_max'] = row['vote_max'] if totals['vote_max'] is None else max(totals['vote_max'], row['vote_max'])
+
+
+'''
+rebuild_health_rollups is used to regenerate the whole HealthRollup hierarchy from the VoteRollup table.
+The team rows come from one grouped query; departments and the organisation are summed from them.
+It returns the number of rows per level.
+'''
+def rebuild_health_rollups():
+    teams = {
+        row.pop('team'): {**row, 'team_count': 1}
+        for row in VoteRollup.objects.filter(vote_count__gt=0).values('team').annotate(**HEALTH_TOTALS).order_by()
+    }
+
+    empty = dict(team_count=0, vote_count=0, vote_sum=0, vote_sum_squares=0, vote_min=None, vote_max=None)
+    departments = {}
+    for department_id, team_id in Department.teams.through.objects.values_list('department_id', 'team_id'):
+        if team_id in teams:
+            _add_totals(departments.setdefault(department_id, dict(empty)), teams[team_id])
+    organisation = dict(empty)
+    for totals in teams.values():
+        _add_totals(organisation, totals)
+
+    rollups = [HealthRollup(level='team', team_id=team_id, **totals) for team_id, totals in teams.items()]
+    rollups += [HealthRollup(level='department', department_id=pk, **totals) for pk, totals in departments.items()]
+    if organisation['vote_count']:
+        rollups.append(HealthRollup(level='organisation', **organisation))
+
+    with transaction.atomic():
+        HealthRollup.objects.all().delete()
+        HealthRollup.objects.bulk_create(rollups, batch_size=1000)
+
+    return {'teams': len(teams), 'departments': len(departments), 'organisation': int(bool(organisation['vote_count']))}
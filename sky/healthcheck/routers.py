@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.db import connections
+
+
+REPLICA_ALIAS = 'replica'
+PRIMARY_ALIAS = 'default'
+## sessions and users stay on the primary, so a login is never missed because of replication lag
+REPLICA_APPS = {'healthcheck'}
+
+_reading_from_replica = ContextVar('healthcheck_reading_from_replica', default=False)
+
+
+def _database(alias):
+    database = connections.settings[alias]
+    return database['ENGINE'], database['HOST'], database['PORT'], str(database['NAME'])
+
+
+'''
+replica_alias is used to find the alias that analytics reads should use: the replica when
+DATABASE_REPLICA_URL configured one, the primary otherwise. A replica naming the primary's
+own database (as it does under tests, where it mirrors the primary) is not a second copy,
+so the primary's connection is used and reads see its uncommitted test data.
+'''
+def replica_alias():
+    if REPLICA_ALIAS not in connections.settings or _database(REPLICA_ALIAS) == _database(PRIMARY_ALIAS):
+        return PRIMARY_ALIAS
+    return REPLICA_ALIAS
+
+
+'''
+reading_from_replica is used to send the reads made inside the block to the replica.
+The flag is a context variable, so it follows the request into sync_to_async threads
+and does not leak into other requests.
+'''
+@contextmanager
+def reading_from_replica():
+    token = _reading_from_replica.set(True)
+    try:
+        yield replica_alias()
+    finally:
+        _reading_from_replica.reset(token)
+
+
+'''
+use_replica decorator is used on read-only views (analytics pages, reports, exports) so their
+queries go to the replica. The replica may lag behind the primary by a few seconds, which is
+acceptable for aggregates but not for pages that read back what the user just wrote.
+Querysets evaluated after the view returns (streamed responses) must be pinned with .using().
+'''
+def use_replica(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with reading_from_replica():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with reading_from_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+'''
+ReplicaRouter sends every write to the primary and the reads of healthcheck models made under
+use_replica to the replica; other reads keep Django's default (the primary, or the database an instance came from).
+Both aliases hold the same data, so relations between their objects are allowed.
+'''
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _reading_from_replica.get() and model._meta.app_label in REPLICA_APPS:
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
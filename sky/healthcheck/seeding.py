@@ -0,0 +1,177 @@
+import random
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .access import invalidate_all_access
+from .fragments import invalidate_fragments
+from .models import Department, HealthCheckSession, Question, Response, Team, UserProfile, Vote
+from .rollups import rebuild_all_rollups, rebuild_health_rollups
+from .trends import rebuild_trends
+
+
+SEED_PASSWORD = 'healthcheck-seed'
+ANSWERS = [value for value, _ in Response.TRAFFIC_LIGHT_CHOICES]
+
+
+def _chunked_create(model, rows, chunk_size):
+    created = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return created
+        model.objects.bulk_create(chunk, batch_size=chunk_size)
+        created += len(chunk)
+
+
+'''
+seed_healthcheck is used to generate a synthetic, production-sized dataset.
+The same seed always produces the same data. Rows are written with bulk_create in
+chunks, so millions of responses and votes can be generated without holding them in memory.
+Every generated user can log in with SEED_PASSWORD.
+It returns the number of rows created per model.
+'''
+def seed_healthcheck(
+    users=200,
+    departments=5,
+    teams=20,
+    questions=30,
+    sessions_per_team=4,
+    questions_per_session=10,
+    seed=0,
+    prefix='seed',
+    chunk_size=5000,
+    session_interval_days=14,
+):
+    rng = random.Random(seed)
+    password = make_password(SEED_PASSWORD)
+    counts = {}
+
+    teams = max(1, teams)
+    departments = max(1, min(departments, teams))
+    senior_managers = max(1, users // 500)
+    engineers = max(1, users - 1 - senior_managers - departments - teams)
+    roles = (
+        [('admin', 'Admin')]
+        + [(f'manager-{i}', 'Senior Manager') for i in range(senior_managers)]
+        + [(f'head-{i}', 'Department Leader') for i in range(departments)]
+        + [(f'lead-{i}', 'Team Leader') for i in range(teams)]
+        + [(f'engineer-{i}', 'Engineer') for i in range(engineers)]
+    )
+
+    with transaction.atomic():
+        created_users = User.objects.bulk_create(
+            (
+                User(
+                    username=f'{prefix}-{name}',
+                    first_name=name.split('-')[0].title(),
+                    last_name=name.split('-')[-1],
+                    email=f'{prefix}-{name}@example.com',
+                    password=password,
+                )
+                for name, _ in roles
+            ),
+            batch_size=chunk_size,
+        )
+        UserProfile.objects.bulk_create(
+            (UserProfile(user=user, role=role) for user, (_, role) in zip(created_users, roles)),
+            batch_size=chunk_size,
+        )
+        counts['users'] = len(created_users)
+
+        by_role = {}
+        for user, (_, role) in zip(created_users, roles):
+            by_role.setdefault(role, []).append(user)
+
+        created_teams = Team.objects.bulk_create(
+            Team(name=f'{prefix} team {i}', leader=leader)
+            for i, leader in enumerate(by_role['Team Leader'])
+        )
+        created_departments = Department.objects.bulk_create(
+            Department(name=f'{prefix} department {i}', leader=leader)
+            for i, leader in enumerate(by_role['Department Leader'])
+        )
+        counts['teams'] = len(created_teams)
+        counts['departments'] = len(created_departments)
+
+        Department.teams.through.objects.bulk_create(
+            Department.teams.through(department_id=created_departments[i % len(created_departments)].id, team_id=team.id)
+            for i, team in enumerate(created_teams)
+        )
+
+        members = {team.id: [] for team in created_teams}
+        for engineer in by_role['Engineer']:
+            members[rng.choice(created_teams).id].append(engineer.id)
+        Team.engineers.through.objects.bulk_create(
+            (
+                Team.engineers.through(team_id=team_id, user_id=user_id)
+                for team_id, user_ids in members.items() for user_id in user_ids
+            ),
+            batch_size=chunk_size,
+        )
+
+        question_bank = Question.objects.bulk_create(
+            Question(text=f'{prefix} question {i}') for i in range(max(1, questions))
+        )
+        counts['questions'] = len(question_bank)
+
+        start = timezone.now() - timedelta(days=session_interval_days * sessions_per_team)
+        session_plan = []
+        for team in created_teams:
+            for i in range(sessions_per_team):
+                session_plan.append((
+                    team,
+                    HealthCheckSession(name=f'{team.name} session {i}', team_leader_id=team.leader_id),
+                    start + timedelta(days=session_interval_days * i),
+                    rng.sample(question_bank, min(questions_per_session, len(question_bank))),
+                ))
+        created_sessions = HealthCheckSession.objects.bulk_create(plan[1] for plan in session_plan)
+        counts['sessions'] = len(created_sessions)
+
+        HealthCheckSession.questions.through.objects.bulk_create(
+            (
+                HealthCheckSession.questions.through(healthchecksession_id=session.id, question_id=question.id)
+                for _, session, _, session_questions in session_plan for question in session_questions
+            ),
+            batch_size=chunk_size,
+        )
+        ## auto_now_add stamps bulk_create with the current time, so the sessions are backdated after it
+        for _, session, created_at, _ in session_plan:
+            session.created_at = created_at
+        HealthCheckSession.objects.bulk_update(created_sessions, ['created_at'], batch_size=chunk_size)
+
+        def responses():
+            for team, session, _, session_questions in session_plan:
+                for user_id in members[team.id]:
+                    for question in session_questions:
+                        yield Response(
+                            user_id=user_id, session_id=session.id, team_id=team.id,
+                            question_id=question.id, answer=rng.choice(ANSWERS),
+                        )
+
+        def votes():
+            for team, session, _, _ in session_plan:
+                for user_id in members[team.id]:
+                    yield Vote(user_id=user_id, session_id=session.id, team_id=team.id, vote_value=rng.randint(1, 10))
+
+        counts['responses'] = _chunked_create(Response, responses(), chunk_size)
+        counts['votes'] = _chunked_create(Vote, votes(), chunk_size)
+
+        session_created_at = Subquery(HealthCheckSession.objects.filter(pk=OuterRef('session')).values('created_at')[:1])
+        Vote.objects.filter(session__in=created_sessions).update(created_at=session_created_at)
+        Response.objects.filter(session__in=created_sessions).update(timestamp=session_created_at)
+
+        ## bulk_create skips the model signals, so refresh everything derived from them
+        rebuild_all_rollups()
+        rebuild_health_rollups()
+        rebuild_trends()
+        transaction.on_commit(invalidate_all_access)
+        transaction.on_commit(invalidate_fragments)
+
+    return counts
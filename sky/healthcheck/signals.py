@@ -0,0 +1,227 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .access import invalidate_all_access, invalidate_user_access
+from .fragments import invalidate_fragments
+from .models import Department, HealthCheckSession, Question, Response, Team, UserProfile, Vote
+from .rollups import apply_vote_added, refresh_department_health, refresh_organisation_health
+from .snapshots import ensure_session_open
+from .tasks import enqueue
+from .trends import apply_response_changes, apply_vote_change
+from .voting import invalidate_session_payload
+
+
+'''
+Closed session signals reject single saves of votes and answers in a closed session, whose
+results are frozen in its snapshot. submit_responses checks the session itself, since bulk
+writes skip the signals.
+'''
+@receiver(pre_save, sender=Vote)
+@receiver(pre_save, sender=Response)
+def reject_writes_to_closed_sessions(sender, instance, raw=False, **kwargs):
+    if not raw and instance.session_id:
+        ensure_session_open(instance.session_id)
+
+
+'''
+Vote signals keep the VoteRollup, HealthRollup and VoteTrendBucket tables current.
+New votes are folded into their rollup incrementally and trend buckets are moved by deltas,
+both in the request. Recomputing the rollups of edited or deleted votes and the health
+rollups of the team's branch is queued as a vote_changed task for run_healthcheck_worker.
+'''
+@receiver(pre_save, sender=Vote)
+def remember_previous_vote(sender, instance, **kwargs):
+    instance._previous_rollup_key = None
+    instance._previous_trend_state = None
+    if instance.pk:
+        previous = Vote.objects.filter(pk=instance.pk).values('team_id', 'session_id', 'created_at', 'vote_value').first()
+        if previous:
+            instance._previous_rollup_key = (previous['team_id'], previous['session_id'])
+            instance._previous_trend_state = (previous['team_id'], previous['created_at'], previous['vote_value'])
+
+
+@receiver(post_save, sender=Vote)
+def update_rollup_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    apply_vote_change(
+        previous=getattr(instance, '_previous_trend_state', None),
+        current=(instance.team_id, instance.created_at, instance.vote_value),
+    )
+
+    previous_key = getattr(instance, '_previous_rollup_key', None)
+    if created and previous_key is None:
+        apply_vote_added(instance.team_id, instance.session_id, instance.vote_value)
+
+    enqueue('vote_changed', instance.team_id, instance.session_id)
+    if previous_key and previous_key != (instance.team_id, instance.session_id):
+        enqueue('vote_changed', *previous_key)
+
+
+@receiver(post_delete, sender=Vote)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    enqueue('vote_changed', instance.team_id, instance.session_id)
+    apply_vote_change(previous=(instance.team_id, instance.created_at, instance.vote_value))
+
+
+'''
+Hierarchy signals refresh the department and organisation health rollups when teams move
+between departments or are deleted. A deleted team's department links are gone by post_delete,
+so they are remembered in pre_delete (and in pre_clear for cleared links).
+'''
+@receiver(m2m_changed, sender=Department.teams.through)
+def refresh_health_on_department_teams(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        instance._cleared_department_ids = (
+            list(instance.department_set.values_list('id', flat=True)) if reverse else [instance.pk]
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_clear':
+        department_ids = getattr(instance, '_cleared_department_ids', [])
+    else:
+        department_ids = pk_set if reverse else [instance.pk]
+    refresh_department_health(department_ids)
+
+
+@receiver(pre_delete, sender=Team)
+def remember_team_departments(sender, instance, **kwargs):
+    instance._health_department_ids = list(instance.department_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Team)
+def refresh_health_on_team_delete(sender, instance, **kwargs):
+    refresh_department_health(getattr(instance, '_health_department_ids', []))
+    refresh_organisation_health()
+
+
+'''
+Response signals keep the ResponseTrendBucket table current for single saves and deletes.
+submit_responses writes in bulk, which skips these signals, and updates the buckets itself.
+'''
+@receiver(pre_save, sender=Response)
+def remember_previous_response(sender, instance, **kwargs):
+    instance._previous_trend_state = None
+    if instance.pk:
+        previous = Response.objects.filter(pk=instance.pk).values('team_id', 'question_id', 'timestamp', 'answer').first()
+        if previous:
+            instance._previous_trend_state = tuple(previous.values())
+
+
+@receiver(post_save, sender=Response)
+def update_response_trend_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.team_id, instance.question_id, instance.timestamp, instance.answer)
+    apply_response_changes([(getattr(instance, '_previous_trend_state', None), current)])
+
+
+@receiver(post_delete, sender=Response)
+def update_response_trend_on_delete(sender, instance, **kwargs):
+    apply_response_changes([((instance.team_id, instance.question_id, instance.timestamp, instance.answer), None)])
+
+
+'''
+Access context signals drop cached AccessContext objects when roles or memberships change.
+They run once the change is committed; otherwise a concurrent request could cache the old roles
+again before the commit, and that stale AccessContext would outlive the invalidation.
+'''
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_access(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_user_access, instance.user_id))
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def invalidate_membership_access(sender, **kwargs):
+    transaction.on_commit(invalidate_all_access)
+
+
+@receiver(m2m_changed, sender=Team.engineers.through)
+@receiver(m2m_changed, sender=Department.teams.through)
+def invalidate_m2m_access(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(invalidate_all_access)
+
+
+'''
+Dashboard fragment signals expire the cached dashboard tables when rosters change,
+once the change is committed so a concurrent request cannot cache the old rosters again.
+'''
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_roster_fragments(sender, update_fields=None, **kwargs):
+    ## logins only touch last_login, which no table shows
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(invalidate_fragments)
+
+
+@receiver(m2m_changed, sender=Team.engineers.through)
+@receiver(m2m_changed, sender=Department.teams.through)
+def invalidate_m2m_fragments(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(invalidate_fragments)
+
+
+'''
+Session payload signals expire the cached voting payload of a session when the session itself,
+its questions or the text of one of its questions change. A question's session links are gone
+by post_delete, so they are remembered in pre_delete (and in pre_clear for cleared links).
+The sessions are read when the signal is sent, and their payloads expire once it is committed.
+'''
+@receiver(post_save, sender=HealthCheckSession)
+@receiver(post_delete, sender=HealthCheckSession)
+def invalidate_session_payload_on_save(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_session_payload, instance.pk))
+
+
+@receiver(m2m_changed, sender=HealthCheckSession.questions.through)
+def invalidate_session_payload_on_questions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        instance._cleared_session_ids = (
+            list(instance.healthchecksession_set.values_list('id', flat=True)) if reverse else [instance.pk]
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_clear':
+        session_ids = getattr(instance, '_cleared_session_ids', [])
+    else:
+        session_ids = pk_set if reverse else [instance.pk]
+    transaction.on_commit(partial(invalidate_session_payload, *session_ids))
+
+
+@receiver(post_save, sender=Question)
+def invalidate_session_payload_on_question(sender, instance, created, raw=False, **kwargs):
+    ## a new question is in no session yet
+    if not created and not raw:
+        session_ids = list(instance.healthchecksession_set.values_list('id', flat=True))
+        transaction.on_commit(partial(invalidate_session_payload, *session_ids))
+
+
+@receiver(pre_delete, sender=Question)
+def remember_question_sessions(sender, instance, **kwargs):
+    instance._payload_session_ids = list(instance.healthchecksession_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Question)
+def invalidate_session_payload_on_question_delete(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_session_payload, *getattr(instance, '_payload_session_ids', [])))
@@ -0,0 +1,138 @@
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.utils import timezone
+
+from .models import HealthCheckSession, Response, SessionSnapshot, Vote
+from .tasks import enqueue
+
+
+TRAFFIC_LIGHTS = ('green', 'yellow', 'red')
+
+
+'''
+SessionClosedError is raised by writes of answers or votes to a closed session.
+'''
+class SessionClosedError(Exception):
+    pass
+
+
+'''
+ensure_session_open is used by the write paths, inside their transaction, to reject a session
+that has been closed. With lock=True the session row is locked until the transaction ends,
+so close_session cannot snapshot the session while the answers are being written.
+'''
+def ensure_session_open(session_id, lock=False):
+    sessions = HealthCheckSession.objects.filter(pk=session_id)
+    if lock:
+        sessions = sessions.select_for_update()
+    if sessions.values_list('status', flat=True).first() == 'closed':
+        raise SessionClosedError(f"Session {session_id} is closed.")
+
+
+'''
+build_snapshot_data is used to compute the results of a session from its responses and votes:
+one GROUP BY per table. Team ids are strings (JSON keys), "0" standing for no team.
+It returns the data with the number of responses and votes.
+'''
+def build_snapshot_data(session_id):
+    teams = {}
+
+    def team_entry(team_id):
+        return teams.setdefault(str(team_id or 0), {'votes': None, 'questions': {}})
+
+    response_count = 0
+    responses = (
+        Response.objects.filter(session_id=session_id)
+        .values('team', 'question', 'answer').annotate(responses=Count('id')).order_by()
+    )
+    for row in responses:
+        questions = team_entry(row['team'])['questions']
+        questions.setdefault(str(row['question']), dict.fromkeys(TRAFFIC_LIGHTS, 0))[row['answer']] = row['responses']
+        response_count += row['responses']
+
+    vote_count = 0
+    votes = (
+        Vote.objects.filter(session_id=session_id).values('team')
+        .annotate(
+            count=Count('id'), sum=Sum('vote_value'), min=Min('vote_value'), max=Max('vote_value'),
+            sum_squares=Sum(F('vote_value') * F('vote_value')),
+        )
+        .order_by()
+    )
+    for row in votes:
+        team = row.pop('team')
+        row['avg'] = round(row['sum'] / row['count'], 4)
+        team_entry(team)['votes'] = row
+        vote_count += row['count']
+
+    for team in teams.values():
+        for counts in team['questions'].values():
+            ## health score as in the reports: green 100, yellow 50, red 0
+            total = counts['total'] = sum(counts[light] for light in TRAFFIC_LIGHTS)
+            counts['health_score'] = round((100 * counts['green'] + 50 * counts['yellow']) / total, 1)
+
+    return {'teams': teams}, response_count, vote_count
+
+
+'''
+close_session is used to close a session and freeze its results into a SessionSnapshot.
+The session row is locked while the snapshot is built, so answers being written either
+commit before it (and are in the snapshot) or are rejected. The rollups of the session are
+then recomputed once by the session_closed task. Closing a closed session returns its snapshot.
+'''
+def close_session(session):
+    with transaction.atomic():
+        locked = HealthCheckSession.objects.select_for_update().get(pk=session.pk)
+        if locked.is_closed:
+            return SessionSnapshot.objects.get(session=locked)
+
+        data, response_count, vote_count = build_snapshot_data(locked.pk)
+        snapshot = SessionSnapshot.objects.create(
+            session=locked, data=data, response_count=response_count, vote_count=vote_count,
+        )
+        locked.status, locked.closed_at = 'closed', timezone.now()
+        locked.save(update_fields=['status', 'closed_at'])
+        enqueue('session_closed', session_id=locked.pk)
+
+    session.status, session.closed_at = locked.status, locked.closed_at
+    return snapshot
+
+
+'''
+snapshot_answer_rows is used to read the traffic-light counts of closed sessions from their
+snapshots, as (session, team, question, answer, count) rows like the GROUP BY of the responses.
+Teams, sessions and questions filter the rows as in load_answer_columns; the snapshots of other
+teams are skipped in the database.
+'''
+def snapshot_answer_rows(teams=None, sessions=None, questions=None):
+    snapshots = SessionSnapshot.objects.all()
+    if sessions is not None:
+        snapshots = snapshots.filter(session_id__in=sessions)
+    if teams is not None:
+        snapshots = snapshots.filter(data__teams__has_any_keys=[str(team or 0) for team in teams])
+    team_keys = None if teams is None else {str(team or 0) for team in teams}
+    question_keys = None if questions is None else {str(question) for question in questions}
+
+    for session_id, data in snapshots.values_list('session_id', 'data').iterator():
+        for team, entry in data['teams'].items():
+            if team_keys is not None and team not in team_keys:
+                continue
+            for question, counts in entry['questions'].items():
+                if question_keys is not None and question not in question_keys:
+                    continue
+                for answer in TRAFFIC_LIGHTS:
+                    if counts[answer]:
+                        yield session_id, int(team), int(question), answer, counts[answer]
+
+
+'''
+snapshot_vote_totals is used to read the vote count and sum of some teams in closed sessions,
+per session: {session_id: (vote_count, vote_sum)}.
+'''
+def snapshot_vote_totals(session_ids, teams):
+    team_keys = {str(team) for team in teams}
+    totals = {}
+    for session_id, data in SessionSnapshot.objects.filter(session_id__in=session_ids).values_list('session_id', 'data'):
+        votes = [entry['votes'] for team, entry in data['teams'].items() if team in team_keys and entry['votes']]
+        totals[session_id] = (sum(vote['count'] for vote in votes), sum(vote['sum'] for vote in votes))
+    return totals
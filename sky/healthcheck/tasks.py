@@ -0,0 +1,184 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Min, Sum, Value, When
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+
+from .models import AnalyticsTask, Vote, VoteRollup
+from .rollups import recompute_rollup, refresh_health_branch
+
+logger = logging.getLogger('healthcheck.tasks')
+
+TASK_BATCH_SIZE = 100
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_SECONDS = 30
+
+HANDLERS = {}
+
+
+def task_handler(kind):
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+'''
+vote_changed is used to recompute the rollup of one team and session, and the health
+rollups of that team's branch, after votes or answers of that team changed.
+'''
+@task_handler('vote_changed')
+def vote_changed(team_id, session_id):
+    if session_id is not None:
+        recompute_rollup(team_id, session_id)
+    refresh_health_branch(team_id)
+
+
+'''
+session_closed is used to recompute every rollup of a session once voting on it has ended,
+and the health rollups of each team that voted in it.
+'''
+@task_handler('session_closed')
+def session_closed(team_id, session_id):
+    team_ids = set(Vote.objects.filter(session_id=session_id).values_list('team_id', flat=True).distinct())
+    team_ids |= set(VoteRollup.objects.filter(session_id=session_id).values_list('team_id', flat=True))
+    for team in sorted(team_ids, key=lambda pk: (pk is None, pk)):
+        recompute_rollup(team, session_id)
+        refresh_health_branch(team)
+
+
+def task_key(kind, team_id=None, session_id=None):
+    return f'{kind}:{team_id or ""}:{session_id or ""}'
+
+
+'''
+enqueue is used to record an analytics event. A pending task for the same kind, team and
+session absorbs the event (its events counter goes up) instead of adding a row, so the
+worker recomputes once per burst. The row is written in the caller's transaction, so a
+rolled-back vote never reaches the worker.
+With HEALTHCHECK_TASKS_EAGER the handler runs immediately instead.
+'''
+def enqueue(kind, team_id=None, session_id=None):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown analytics task: {kind}")
+    if getattr(settings, 'HEALTHCHECK_TASKS_EAGER', False):
+        HANDLERS[kind](team_id, session_id)
+        return
+
+    key = task_key(kind, team_id, session_id)
+    pending = AnalyticsTask.objects.filter(key=key, available_at__isnull=False)
+    if pending.update(events=F('events') + 1):
+        return
+    try:
+        with transaction.atomic():
+            AnalyticsTask.objects.create(kind=kind, key=key, team_id=team_id, session_id=session_id)
+    except IntegrityError:
+        ## another writer created it first, or a task that gave up holds the key and is revived
+        AnalyticsTask.objects.filter(key=key).update(
+            events=F('events') + 1, available_at=Coalesce('available_at', Now()), attempts=Case(
+                When(available_at__isnull=True, then=Value(0)), default=F('attempts'),
+            ),
+        )
+
+
+'''
+WorkerStats holds the counters of the tasks a worker process has run.
+'''
+class WorkerStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.events = 0
+        self.failed = 0
+        self.max_lag_seconds = 0.0
+        self.last_lag_seconds = None
+
+    def record(self, task, lag_seconds, ok):
+        with self.lock:
+            self.processed += ok
+            self.failed += not ok
+            self.events += task.events if ok else 0
+            self.last_lag_seconds = lag_seconds
+            self.max_lag_seconds = max(self.max_lag_seconds, lag_seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'processed': self.processed,
+                'events': self.events,
+                'coalesced': self.events - self.processed,
+                'failed': self.failed,
+                'last_lag_seconds': self.last_lag_seconds,
+                'max_lag_seconds': round(self.max_lag_seconds, 3),
+            }
+
+
+worker_stats = WorkerStats()
+
+
+def _claim(task):
+    ## deleting the row is the claim: only one worker gets a count of 1, and a task that
+    ## absorbed more events since it was read is left for the next batch
+    return AnalyticsTask.objects.filter(pk=task.pk, events=task.events).delete()[0] == 1
+
+
+def _retry(task, error):
+    attempts = task.attempts + 1
+    give_up = attempts >= TASK_MAX_ATTEMPTS
+    available_at = None if give_up else timezone.now() + timedelta(seconds=TASK_RETRY_SECONDS * 2 ** task.attempts)
+    AnalyticsTask.objects.filter(pk=task.pk).update(attempts=attempts, last_error=error, available_at=available_at)
+    if give_up:
+        logger.error("Analytics task %s failed %s times: %s", task.key, attempts, error)
+
+
+'''
+run_pending_tasks is used to run up to `limit` due tasks, oldest first, in batches of batch_size.
+Each task is claimed and handled in one transaction, so a task whose handler fails
+(or whose worker dies) is rolled back into the queue; failures are retried with
+exponential backoff, up to TASK_MAX_ATTEMPTS times. It returns the number of tasks that were handled.
+'''
+def run_pending_tasks(limit=None, batch_size=TASK_BATCH_SIZE, stats=worker_stats):
+    handled = 0
+    while limit is None or handled < limit:
+        size = batch_size if limit is None else min(batch_size, limit - handled)
+        batch = list(AnalyticsTask.objects.filter(available_at__lte=timezone.now()).order_by('available_at', 'id')[:size])
+        if not batch:
+            break
+
+        for task in batch:
+            lag_seconds = (timezone.now() - task.created_at).total_seconds()
+            try:
+                with transaction.atomic():
+                    if not _claim(task):
+                        continue
+                    HANDLERS[task.kind](task.team_id, task.session_id)
+            except Exception as error:
+                logger.exception("Analytics task %s failed", task.key)
+                _retry(task, f'{type(error).__name__}: {error}')
+                stats.record(task, lag_seconds, ok=False)
+            else:
+                stats.record(task, lag_seconds, ok=True)
+            handled += 1
+    return handled
+
+
+'''
+queue_stats is used to report the depth of the queue per kind, the number of pending events,
+the age of the oldest due task (the lag) and the number of tasks that gave up.
+'''
+def queue_stats():
+    now = timezone.now()
+    pending = AnalyticsTask.objects.filter(available_at__isnull=False)
+    totals = pending.aggregate(depth=Count('id'), events=Sum('events'), oldest=Min('created_at'))
+    return {
+        'depth': totals['depth'],
+        'events': totals['events'] or 0,
+        'by_kind': dict(pending.values_list('kind').annotate(Count('id')).order_by()),
+        'due': pending.filter(available_at__lte=now).count(),
+        'lag_seconds': round((now - totals['oldest']).total_seconds(), 3) if totals['oldest'] else 0.0,
+        'failed': AnalyticsTask.objects.filter(available_at__isnull=True).count(),
+    }
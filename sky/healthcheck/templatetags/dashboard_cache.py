@@ -0,0 +1,54 @@
+from django import template
+from django.core.cache import cache
+
+from healthcheck.fragments import fragment_key, fragment_timeout, record_hit, record_miss
+
+register = template.Library()
+
+
+'''
+fragmentcache tag is used to cache a dashboard table for the viewer's role (and the viewer
+itself for leader roles). Extra arguments are added to the key, e.g. search terms.
+
+    {% fragmentcache 'departments' search after %} ... {% endfragmentcache %}
+'''
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary = vary
+
+    def render(self, context):
+        request = context['request']
+        name = self.name.resolve(context)
+        key = fragment_key(
+            name,
+            request.access.role,
+            request.user.pk,
+            [value.resolve(context) for value in self.vary],
+        )
+
+        content = cache.get(key)
+        if content is not None:
+            record_hit(name)
+            return content
+
+        record_miss(name)
+        content = self.nodelist.render(context)
+        cache.set(key, content, fragment_timeout())
+        return content
+
+
+@register.tag('fragmentcache')
+def do_fragmentcache(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name.")
+
+    nodelist = parser.parse(('endfragmentcache',))
+    parser.delete_first_token()
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        [parser.compile_filter(bit) for bit in bits[2:]],
+    )
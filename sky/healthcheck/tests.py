@@ -1,3 +1,1112 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core import mail
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .access import get_access_context
+from .analytics import traffic_light_counts
+from .fragments import fragment_stats
+from .imports import import_directory
+from .live import publish_responses
+from .questionbank import search_backend, search_questions
+from .reports import traffic_light_report
+from .routers import ReplicaRouter, reading_from_replica, use_replica
+from .tasks import enqueue, queue_stats, run_pending_tasks, WorkerStats
+from . import trends
+from .trends import rebuild_trends, vote_trend
+from .voting import submit_responses
+from .metrics import RequestMetricsMiddleware, registry as request_metrics_registry
+from .models import (
+    AnalyticsTask, Department, HealthCheckSession, HealthRollup, Question, QuestionTag, Response, ResponseTrendBucket, Team,
+    SessionSnapshot, UserProfile, Vote, VoteRollup, VoteTrendBucket,
+)
+from .rollups import rebuild_all_rollups, rebuild_health_rollups
+from .seeding import seed_healthcheck
+from .snapshots import SessionClosedError
+
+
+class VoteRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create_user(username='leader', password='pass12345')
+        self.team = Team.objects.create(name='Alpha', leader=self.leader)
+        self.session = HealthCheckSession.objects.create(name='Sprint 1', team_leader=self.leader)
+
+    def vote(self, value):
+        voter = User.objects.create(username=f'voter-{Vote.objects.count()}')
+        return Vote.objects.create(user=voter, session=self.session, team=self.team, vote_value=value)
+
+    def test_rollup_tracks_inserts_updates_and_deletes(self):
+        first = self.vote(4)
+        self.vote(8)
+
+        rollup = VoteRollup.objects.get(team=self.team, session=self.session)
+        self.assertEqual((rollup.vote_count, rollup.vote_sum, rollup.vote_min, rollup.vote_max), (2, 12, 4, 8))
+        self.assertEqual(rollup.vote_sum_squares, 80)
+
+        first.vote_value = 10
+        first.save()
+        run_pending_tasks()
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.vote_count, rollup.vote_sum, rollup.vote_min, rollup.vote_max), (2, 18, 8, 10))
+
+        first.delete()
+        run_pending_tasks()
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.vote_count, rollup.vote_sum, rollup.vote_min, rollup.vote_max), (1, 8, 8, 8))
+
+    def test_rebuild_matches_incremental_rollup(self):
+        for value in (3, 5, 9):
+            self.vote(value)
+        before = VoteRollup.objects.values('vote_count', 'vote_sum', 'vote_min', 'vote_max', 'vote_sum_squares').get()
+
+        self.assertEqual(rebuild_all_rollups(), 1)
+        after = VoteRollup.objects.values('vote_count', 'vote_sum', 'vote_min', 'vote_max', 'vote_sum_squares').get()
+        self.assertEqual(before, after)
+
+
+class UserVotingSubmissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='engineer', password='pass12345')
+        self.client.force_login(self.user)
+
+    def make_session(self, question_count):
+        session = HealthCheckSession.objects.create(name=f'{question_count} questions', team_leader=self.user)
+        questions = Question.objects.bulk_create(Question(text=f'Question {i}') for i in range(question_count))
+        session.questions.set(questions)
+        return session, questions
+
+    def submit(self, session, questions, answer):
+        data = {f'question_{question.id}': answer for question in questions}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('uservoting', args=[session.id]), data)
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_queries_per_submit_do_not_grow_with_question_count(self):
+        small_session, small_questions = self.make_session(3)
+        large_session, large_questions = self.make_session(12)
+        ## both submissions read the cached AccessContext
+        get_access_context(self.user)
+
+        self.assertEqual(self.submit(small_session, small_questions, 'green'), self.submit(large_session, large_questions, 'green'))
+        self.assertEqual(self.submit(small_session, small_questions, 'red'), self.submit(large_session, large_questions, 'red'))
+
+        self.assertEqual(Response.objects.filter(user=self.user).count(), 15)
+        self.assertFalse(Response.objects.exclude(answer='red').exists())
+
+    def test_answers_are_kept_per_session(self):
+        team = Team.objects.create(name='Voters', leader=self.user)
+        team.engineers.add(self.user)
+        first, questions = self.make_session(2)
+        second = HealthCheckSession.objects.create(name='Again', team_leader=self.user)
+        second.questions.set(questions)
+
+        self.submit(first, questions, 'green')
+        self.submit(second, questions, 'red')
+
+        self.assertEqual(
+            sorted(Response.objects.values_list('session', 'team', 'answer').distinct()),
+            sorted([(first.id, team.id, 'green'), (second.id, team.id, 'red')]),
+        )
+        counts = traffic_light_counts(sessions=[second.id])
+        self.assertEqual(list(counts), [{'session': second.id, 'team': team.id, 'answer': 'red', 'responses': 2}])
+
+    def test_invalid_answers_are_ignored(self):
+        session, questions = self.make_session(2)
+        self.client.post(reverse('uservoting', args=[session.id]), {f'question_{questions[0].id}': 'purple'})
+        self.assertFalse(Response.objects.exists())
+
+    def test_first_answers_written_concurrently_are_diffed_again(self):
+        session, questions = self.make_session(2)
+        team = Team.objects.create(name='Racing', leader=self.user)
+        ## another tab inserted an answer just after this submission's locked read
+        Response.objects.create(user=self.user, session=session, team=team, question=questions[0], answer='green')
+        select_for_update = Response.objects.select_for_update
+        stale_reads = [Response.objects.none()]
+        with mock.patch.object(Response.objects, 'select_for_update', side_effect=lambda: stale_reads.pop() if stale_reads else select_for_update()):
+            created, updated = submit_responses(self.user, session, questions, {f'question_{q.id}': 'red' for q in questions}, team_id=team.id)
+
+        self.assertEqual((created, updated), (1, 1))
+        self.assertEqual(sorted(Response.objects.values_list('question', 'answer')), [(questions[0].id, 'red'), (questions[1].id, 'red')])
+        ## the replaced green answer is taken out of the trend buckets instead of counted twice
+        self.assertEqual(
+            set(ResponseTrendBucket.objects.values_list('question', 'green', 'red')),
+            {(questions[0].id, 0, 1), (questions[1].id, 0, 1)},
+        )
+
+    def test_voting_page_reads_the_cached_session(self):
+        session, questions = self.make_session(3)
+        self.submit(session, questions[:1], 'yellow')
+        url = reverse('uservoting', args=[session.id])
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        tables = [query['sql'] for query in queries if 'healthcheck_' in query['sql']]
+        self.assertEqual(len(tables), 1)
+        self.assertIn('healthcheck_response', tables[0])
+        self.assertEqual([question.id for question in response.context['questions']], [question.id for question in questions])
+        self.assertEqual(response.context['answers'], {questions[0].id: 'yellow'})
+
+        self.assertEqual(self.client.get(reverse('uservoting', args=[session.id + 100])).status_code, 404)
+
+    def test_session_payload_follows_question_changes(self):
+        session, questions = self.make_session(2)
+        url = reverse('uservoting', args=[session.id])
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            session.questions.remove(questions[0])
+        self.assertEqual([question.text for question in self.client.get(url).context['questions']], ['Question 1'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            questions[1].text = 'Renamed'
+            questions[1].save()
+            questions[0].healthchecksession_set.add(session)
+        self.assertEqual([question.text for question in self.client.get(url).context['questions']], ['Question 0', 'Renamed'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            session.questions.clear()
+        self.assertEqual(self.client.get(url).context['questions'], ())
+
+
+class DashboardQueryBudgetTests(TestCase):
+    QUERY_BUDGET = 10
+
+    def setUp(self):
+        cache.clear()
+
+    def make_user(self, username, role):
+        user = User.objects.create(username=username)
+        UserProfile.objects.create(user=user, role=role)
+        return user
+
+    def populate(self, prefix, size):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_rows(prefix, size)
+
+    def create_rows(self, prefix, size):
+        for i in range(size):
+            leader = self.make_user(f'{prefix}-leader-{i}', 'Team Leader')
+            team = Team.objects.create(name=f'{prefix}-team-{i}', leader=leader)
+            team.engineers.set(self.make_user(f'{prefix}-engineer-{i}-{j}', 'Engineer') for j in range(3))
+            department = Department.objects.create(name=f'{prefix}-department-{i}', leader=self.make_user(f'{prefix}-head-{i}', 'Department Leader'))
+            department.teams.add(team)
+            HealthCheckSession.objects.create(name=f'{prefix}-session-{i}', team_leader=self.viewer_for('Team Leader')).questions.set(
+                Question.objects.bulk_create(Question(text=f'{prefix} question {i}-{j}') for j in range(2))
+            )
+
+    def viewer_for(self, role):
+        if not hasattr(self, '_viewers'):
+            self._viewers = {}
+        if role not in self._viewers:
+            self._viewers[role] = self.make_user(f'viewer-{role.lower().replace(" ", "-")}', role)
+        return self._viewers[role]
+
+    def dashboard_queries(self, role):
+        self.client.force_login(self.viewer_for(role))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_is_independent_of_row_counts(self):
+        for role, _ in UserProfile.ROLE_CHOICES:
+            self.viewer_for(role)
+        self.populate('small', 1)
+        small = {role: self.dashboard_queries(role) for role, _ in UserProfile.ROLE_CHOICES}
+
+        self.populate('large', 8)
+        large = {role: self.dashboard_queries(role) for role, _ in UserProfile.ROLE_CHOICES}
+
+        self.assertEqual(small, large)
+        for role, count in large.items():
+            self.assertLessEqual(count, self.QUERY_BUDGET, role)
+
+    def test_admin_tables_have_fixed_query_budget(self):
+        self.client.force_login(self.viewer_for('Admin'))
+        tables = ['admin_users_table', 'admin_teams_table', 'admin_departments_table']
+
+        def table_queries():
+            counts = {}
+            for name in tables:
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+                counts[name] = len(queries)
+            return counts
+
+        self.populate('small', 1)
+        small = table_queries()
+        self.populate('large', 8)
+        self.assertEqual(small, table_queries())
+
+
+class AdminTablePaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create(username='admin-user')
+        UserProfile.objects.create(user=admin, role='Admin')
+        self.client.force_login(admin)
+        for i in range(5):
+            user = User.objects.create(username=f'member-{i}', first_name='Sam' if i % 2 else 'Alex')
+            UserProfile.objects.create(user=user, role='Engineer')
+
+    @mock.patch('healthcheck.views.ADMIN_PAGE_SIZE', 2)
+    def test_users_are_paged_by_username_cursor(self):
+        seen = []
+        url = reverse('admin_users_table') + '?role=Engineer'
+        cursor = ''
+        while True:
+            response = self.client.get(url + f'&after={cursor}')
+            seen.extend(user.username for user in response.context['page'].rows)
+            cursor = response.context['page'].next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(seen, [f'member-{i}' for i in range(5)])
+
+    def test_search_filters_users(self):
+        response = self.client.get(reverse('admin_users_table'), {'q': 'sam'})
+        self.assertEqual([user.username for user in response.context['page'].rows], ['member-1', 'member-3'])
+
+    def test_non_admins_are_redirected(self):
+        self.client.force_login(User.objects.get(username='member-0'))
+        self.assertRedirects(self.client.get(reverse('admin_teams_table')), reverse('dashboard'))
+
+
+class AccessContextTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='team-lead')
+        self.profile = UserProfile.objects.create(user=self.user, role='Team Leader')
+
+    def test_context_is_cached_until_membership_changes(self):
+        context = get_access_context(self.user)
+        self.assertEqual(context.role, 'Team Leader')
+        self.assertEqual(context.led_team_ids, frozenset())
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_access_context(self.user), context)
+
+        ## the cached context is dropped once the change is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            team = Team.objects.create(name='Bravo', leader=self.user)
+            self.assertEqual(get_access_context(self.user).led_team_ids, frozenset())
+        self.assertEqual(get_access_context(self.user).led_team_ids, {team.id})
+
+        engineer = User.objects.create(username='engineer-1')
+        get_access_context(engineer)
+        with self.captureOnCommitCallbacks(execute=True):
+            team.engineers.add(engineer)
+        self.assertEqual(get_access_context(engineer).member_team_ids, {team.id})
+
+    def test_role_change_invalidates_context(self):
+        get_access_context(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.role = 'Admin'
+            self.profile.save()
+        self.assertEqual(get_access_context(self.user).role, 'Admin')
+
+    def test_role_required_uses_request_context(self):
+        self.client.force_login(self.user)
+        self.assertRedirects(self.client.get(reverse('admin_users_table')), reverse('dashboard'))
+        self.assertEqual(self.client.get(reverse('team_progress')).status_code, 200)
+
+
+class DashboardFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create(username='fragment-lead')
+        UserProfile.objects.create(user=self.leader, role='Team Leader')
+        self.team = Team.objects.create(name='Charlie', leader=self.leader)
+        self.client.force_login(self.leader)
+
+    def test_cached_table_skips_queries_until_roster_changes(self):
+        first = self.client.get(reverse('dashboard'))
+        with CaptureQueriesContext(connection) as cached:
+            second = self.client.get(reverse('dashboard'))
+        self.assertEqual(first.content, second.content)
+        self.assertFalse(any('healthcheck_team' in query['sql'] for query in cached.captured_queries))
+        self.assertEqual(fragment_stats()['team_leader_teams'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+        engineer = User.objects.create(username='new-engineer')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.engineers.add(engineer)
+            ## the tables expire only once the change is committed
+            self.assertNotContains(self.client.get(reverse('dashboard')), 'new-engineer')
+        self.assertContains(self.client.get(reverse('dashboard')), 'new-engineer')
+        self.assertEqual(fragment_stats()['team_leader_teams']['misses'], 2)
+
+
+class SeedHealthcheckTests(TestCase):
+    def test_same_seed_produces_same_data(self):
+        options = dict(users=40, departments=2, teams=4, questions=8, sessions_per_team=2, questions_per_session=4, seed=7)
+        first = seed_healthcheck(prefix='one', **options)
+        second = seed_healthcheck(prefix='two', **options)
+        self.assertEqual(first, second)
+
+        def answers(prefix):
+            return list(
+                Response.objects.filter(user__username__startswith=f'{prefix}-')
+                .order_by('id').values_list('answer', flat=True)
+            )
+        self.assertEqual(answers('one'), answers('two'))
+        self.assertEqual(VoteRollup.objects.aggregate(total=Sum('vote_count'))['total'], Vote.objects.count())
+
+        ## sessions are backdated, one interval apart per team
+        created = set(HealthCheckSession.objects.filter(team_leader__username__startswith='one-').values_list('created_at', flat=True))
+        self.assertEqual(len(created), 2)
+        self.assertLess(max(created), timezone.now() - timedelta(days=1))
+
+
+@override_settings(HEALTHCHECK_REQUEST_METRICS=True, HEALTHCHECK_QUERY_BUDGET=1)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        request_metrics_registry.reset()
+        self.admin = User.objects.create(username='metrics-admin')
+        UserProfile.objects.create(user=self.admin, role='Admin')
+        self.client.force_login(self.admin)
+
+    def test_requests_are_recorded_per_url_name(self):
+        with self.assertLogs('healthcheck.metrics', 'WARNING'):
+            self.client.get(reverse('admin_users_table'))
+            self.client.get(reverse('admin_users_table'))
+
+        metrics = self.client.get(reverse('request_metrics')).json()['views']
+        users = metrics['admin_users_table']
+        self.assertEqual(users['requests'], 2)
+        self.assertEqual(users['budget_breaches'], 2)
+        self.assertGreater(users['queries']['p50'], 1)
+        self.assertIsNotNone(users['latency_ms']['p99'])
+        self.assertEqual(sum(users['latency_ms']['histogram'].values()), 2)
+        self.assertIn('sql', users['slowest_query'])
+
+    def test_streamed_body_is_measured(self):
+        response = self.client.get(reverse('api_vote_analytics'), {'stream': 'true'})
+        self.assertNotIn('api_vote_analytics', request_metrics_registry.snapshot())
+        with self.assertLogs('healthcheck.metrics', 'WARNING'):
+            self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+        ## the rollup query runs while the body is sent
+        self.assertGreater(request_metrics_registry.snapshot()['api_vote_analytics']['queries']['p50'], 1)
+
+    async def test_async_views_are_recorded(self):
+        await self.async_client.aforce_login(self.admin)
+        with self.assertLogs('healthcheck.metrics', 'WARNING'):
+            response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(request_metrics_registry.snapshot()['dashboard']['queries']['p50'], 1)
+        ## the middleware stays async, so async views are not run through a thread
+        self.assertTrue(iscoroutinefunction(RequestMetricsMiddleware(self.async_client.handler.get_response_async)))
+
+
+class VoteAnalyticsAPITests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create(username='api-lead')
+        UserProfile.objects.create(user=self.leader, role='Team Leader')
+        self.client.force_login(self.leader)
+        self.teams = [Team.objects.create(name=f'API team {i}', leader=self.leader) for i in range(3)]
+        self.session = HealthCheckSession.objects.create(name='API session', team_leader=self.leader)
+        for i, team in enumerate(self.teams):
+            for value in (i + 1, i + 3):
+                voter = User.objects.create(username=f'api-voter-{i}-{value}')
+                Vote.objects.create(user=voter, session=self.session, team=team, vote_value=value)
+        self.url = reverse('api_vote_analytics')
+
+    def test_pages_by_rollup_id(self):
+        first = self.client.get(self.url, {'limit': 2}).json()
+        self.assertEqual([row['team_name'] for row in first['results']], ['API team 0', 'API team 1'])
+        self.assertEqual(first['results'][0]['avg_vote'], 2.0)
+        self.assertEqual(first['results'][0]['stddev_vote'], 1.0)
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['team_name'] for row in second['results']], ['API team 2'])
+        self.assertIsNone(second['next'])
+
+    def test_filters_and_streaming(self):
+        department = Department.objects.create(name='API department', leader=self.leader)
+        department.teams.add(self.teams[1])
+
+        response = self.client.get(self.url, {'department': department.id, 'stream': 'true'})
+        self.assertTrue(response.streaming)
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['team'] for row in rows], [self.teams[1].id])
+
+        response = self.client.get(self.url, {'date_from': '2999-01-01'})
+        self.assertEqual(response.json()['results'], [])
+        self.assertEqual(self.client.get(self.url, {'limit': 0}).status_code, 400)
+
+    def test_conditional_requests_return_304_until_votes_change(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Vote.objects.create(user=self.leader, session=self.session, team=self.teams[0], vote_value=9)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_rollups_are_scoped_to_the_visible_teams(self):
+        other = User.objects.create(username='api-other-lead')
+        UserProfile.objects.create(user=other, role='Team Leader')
+        Team.objects.filter(id=self.teams[2].id).update(leader=other)
+        self.client.force_login(other)
+        self.assertEqual([row['team'] for row in self.client.get(self.url).json()['results']], [self.teams[2].id])
+        self.assertEqual(self.client.get(self.url, {'team': self.teams[0].id}).json()['results'], [])
+
+        engineer = User.objects.create(username='api-engineer')
+        UserProfile.objects.create(user=engineer, role='Engineer')
+        self.client.force_login(engineer)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_question_filter_reads_the_answers(self):
+        asked, other = Question.objects.bulk_create([Question(text='Asked'), Question(text='Other')])
+        self.session.questions.set([asked, other])
+        voter = User.objects.get(username='api-voter-1-2')
+        Response.objects.create(user=voter, session=self.session, team=self.teams[1], question=asked, answer='green')
+        Response.objects.create(user=voter, session=self.session, team=self.teams[0], question=other, answer='red')
+
+        rows = self.client.get(self.url, {'question': asked.id}).json()['results']
+        self.assertEqual([row['team'] for row in rows], [self.teams[1].id])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        manager = User.objects.create(username='export-manager')
+        UserProfile.objects.create(user=manager, role='Senior Manager')
+        self.client.force_login(manager)
+        self.team = Team.objects.create(name='Export team', leader=manager)
+        self.other_team = Team.objects.create(name='Other team', leader=manager)
+        self.session = HealthCheckSession.objects.create(name='Export session', team_leader=manager)
+        for i in range(3):
+            voter = User.objects.create(username=f'export-voter-{i}')
+            Vote.objects.create(user=voter, session=self.session, team=self.team if i else self.other_team, vote_value=i + 5)
+
+    def read(self, response):
+        content = b''.join(response.streaming_content)
+        return gzip.decompress(content) if response['Content-Type'] == 'application/gzip' else content
+
+    def test_csv_export_is_streamed_and_filtered(self):
+        response = self.client.get(reverse('export_data', args=['votes']), {'team': self.team.id})
+        self.assertTrue(response.streaming)
+        lines = self.read(response).decode().splitlines()
+        self.assertEqual(lines[0], 'id,user_id,user_username,session_id,team_id,vote_value,created_at')
+        self.assertEqual(len(lines), 3)
+
+    def test_gzip_ndjson_export(self):
+        response = self.client.get(reverse('export_data', args=['votes']), {'format': 'ndjson', 'gzip': '1'})
+        rows = [json.loads(line) for line in self.read(response).decode().splitlines()]
+        self.assertEqual([row['vote_value'] for row in rows], [5, 6, 7])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(reverse('export_data', args=['teams'])).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_data', args=['votes']), {'date_from': 'soon'}).status_code, 400)
+
+
+class BulkImportTests(TestCase):
+    USERS = (
+        "username,first_name,last_name,email,role\n"
+        "import-lead,Lee,Lead,lead@example.com,Team Leader\n"
+        "import-head,Hana,Head,head@example.com,Department Leader\n"
+        "import-eng-1,Eve,One,eve@example.com,Engineer\n"
+        "import-eng-2,Ed,Two,ed@example.com,\n"
+    )
+    TEAMS = "team,leader,engineer\nImported,import-lead,import-eng-1\nImported,,import-eng-2\n"
+    DEPARTMENTS = "department,leader,team\nImported dept,import-head,Imported\n"
+
+    def setUp(self):
+        cache.clear()
+
+    def run_import(self, users=USERS, teams=TEAMS, departments=DEPARTMENTS, **options):
+        return import_directory(
+            users=io.StringIO(users), teams=io.StringIO(teams), departments=io.StringIO(departments), **options,
+        )
+
+    def test_import_creates_users_teams_and_links(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            report = self.run_import()
+        self.assertTrue(report.ok, report.errors)
+        self.assertEqual(report.created['users'], 4)
+        self.assertEqual(UserProfile.objects.get(user__username='import-eng-2').role, 'Engineer')
+        ## users without a password set theirs with a password reset, nothing is hashed for them
+        self.assertFalse(User.objects.get(username='import-eng-1').has_usable_password())
+
+        team = Team.objects.get(name='Imported')
+        self.assertEqual(team.leader.username, 'import-lead')
+        self.assertEqual(set(team.engineers.values_list('username', flat=True)), {'import-eng-1', 'import-eng-2'})
+        self.assertEqual(list(Department.objects.get(name='Imported dept').teams.all()), [team])
+
+        ## running the same files again only skips
+        report = self.run_import()
+        self.assertEqual(sum(report.created.values()), 0)
+        self.assertEqual(report.skipped['memberships'], 2)
+
+    def test_given_passwords_are_hashed_per_user(self):
+        users = (
+            "username,first_name,last_name,email,role,password\n"
+            "import-pw-1,Pat,One,pat@example.com,Engineer,Welcome-To-Sky-2026\n"
+            "import-pw-2,Pam,Two,pam@example.com,Engineer,Welcome-To-Sky-2026\n"
+            "import-pw-3,Pia,Three,pia@example.com,Engineer,\n"
+        )
+        report = import_directory(users=io.StringIO(users))
+        self.assertTrue(report.ok, report.errors)
+        first, second, third = User.objects.filter(username__startswith='import-pw-').order_by('username')
+        self.assertTrue(first.check_password('Welcome-To-Sky-2026'))
+        ## users sharing a password still get their own salt
+        self.assertNotEqual(first.password, second.password)
+        self.assertFalse(third.has_usable_password())
+
+        ## a bounded import rejects the file at the first password over the limit
+        report = import_directory(users=io.StringIO(users.replace('import-pw-', 'import-new-')), max_passwords=1)
+        self.assertEqual([(source, line) for source, line, _ in report.errors], [('users', 3)])
+        self.assertFalse(User.objects.filter(username__startswith='import-new-').exists())
+
+    def test_imported_user_sets_password_with_reset(self):
+        self.run_import()
+        response = self.client.post(reverse('password_reset'), {'email': 'eve@example.com'})
+        self.assertRedirects(response, reverse('password_reset_done'))
+        self.assertEqual(len(mail.outbox), 1)
+
+        link = next(line for line in mail.outbox[0].body.splitlines() if '/password-reset/' in line).strip()
+        response = self.client.get(link, follow=True)
+        self.assertTrue(response.context['validlink'])
+        response = self.client.post(response.redirect_chain[-1][0], {
+            'new_password1': 'Welcome-To-Sky-2026', 'new_password2': 'Welcome-To-Sky-2026',
+        })
+        self.assertRedirects(response, reverse('password_reset_complete'))
+        self.assertTrue(User.objects.get(username='import-eng-1').check_password('Welcome-To-Sky-2026'))
+
+    def test_dry_run_and_errors_write_nothing(self):
+        report = self.run_import(dry_run=True)
+        self.assertTrue(report.ok)
+        self.assertEqual(report.created['memberships'], 2)
+        self.assertFalse(User.objects.filter(username__startswith='import-').exists())
+
+        report = self.run_import(
+            users=self.USERS + "import-eng-3,Bad,Role,bad@example.com,Boss\n",
+            teams=self.TEAMS + "Imported,,nobody-here\n",
+        )
+        self.assertEqual([(source, line) for source, line, _ in report.errors], [('users', 6), ('teams', 4)])
+        self.assertFalse(User.objects.filter(username__startswith='import-').exists())
+
+    def test_admin_upload(self):
+        admin = User.objects.create(username='import-admin')
+        UserProfile.objects.create(user=admin, role='Admin')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('import_data'), {
+            'users': SimpleUploadedFile('users.csv', self.USERS.encode()),
+            'teams': SimpleUploadedFile('teams.csv', self.TEAMS.encode()),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['report'].ok)
+        self.assertEqual(Team.objects.get(name='Imported').engineers.count(), 2)
+
+
+class TrafficLightReportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create(username='report-lead')
+        UserProfile.objects.create(user=self.leader, role='Team Leader')
+        self.team = Team.objects.create(name='Reported', leader=self.leader)
+        self.question = Question.objects.create(text='Codebase health')
+        self.voters = [User.objects.create(username=f'report-voter-{i}') for i in range(4)]
+
+    def run_session(self, name, answers):
+        session = HealthCheckSession.objects.create(name=name, team_leader=self.leader)
+        session.questions.add(self.question)
+        Response.objects.bulk_create(
+            Response(user=voter, session=session, team=self.team, question=self.question, answer=answer)
+            for voter, answer in zip(self.voters, answers)
+        )
+        return session
+
+    def test_distribution_score_and_delta(self):
+        self.run_session('Sprint 1', ['green', 'red', 'red', 'yellow'])
+        self.run_session('Sprint 2', ['green', 'green', 'yellow', 'red'])
+
+        first, second = traffic_light_report(teams=[self.team.id])
+        self.assertEqual((first['green'], first['yellow'], first['red'], first['total']), (1, 1, 2, 4))
+        self.assertEqual((first['green_pct'], first['red_pct']), (25.0, 50.0))
+        self.assertEqual(first['health_score'], 37.5)
+        self.assertIsNone(first['delta'])
+        self.assertEqual(second['health_score'], 62.5)
+        self.assertEqual(second['delta'], 25.0)
+
+    def test_view_only_offers_visible_teams(self):
+        self.run_session('Sprint 1', ['green'] * 4)
+        other_leader = User.objects.create(username='report-other')
+        hidden = Team.objects.create(name='Hidden', leader=other_leader)
+        self.client.force_login(self.leader)
+
+        response = self.client.get(reverse('traffic_light_report'))
+        self.assertEqual([team['id'] for team in response.context['teams']], [self.team.id])
+        self.assertEqual(len(response.context['rows']), 1)
+
+        response = self.client.get(reverse('traffic_light_report'), {'team': hidden.id})
+        self.assertEqual(response.context['rows'], [])
+
+
+class TrendBucketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create(username='trend-lead')
+        UserProfile.objects.create(user=self.leader, role='Team Leader')
+        self.team = Team.objects.create(name='Trending', leader=self.leader)
+        self.session = HealthCheckSession.objects.create(name='Trend session', team_leader=self.leader)
+        self.questions = Question.objects.bulk_create(Question(text=f'Trend {i}') for i in range(3))
+        self.voters = [User.objects.create(username=f'trend-voter-{i}') for i in range(3)]
+
+    def buckets(self):
+        return {
+            'votes': sorted(VoteTrendBucket.objects.filter(vote_count__gt=0).values_list(
+                'team', 'period', 'period_start', 'vote_count', 'vote_sum', 'vote_sum_squares')),
+            'responses': sorted(
+                row for row in ResponseTrendBucket.objects.values_list(
+                    'team', 'question', 'period', 'period_start', 'green', 'yellow', 'red')
+                if any(row[4:])
+            ),
+        }
+
+    def test_incremental_buckets_match_a_rebuild(self):
+        votes = [Vote.objects.create(user=voter, session=self.session, team=self.team, vote_value=i + 4) for i, voter in enumerate(self.voters)]
+        votes[0].vote_value = 9
+        votes[0].save()
+        votes[1].delete()
+
+        for voter, answer in zip(self.voters, ['green', 'yellow', 'red']):
+            submit_responses(voter, self.session, self.questions, {f'question_{q.id}': answer for q in self.questions}, team_id=self.team.id)
+        submit_responses(self.voters[2], self.session, self.questions[:1], {f'question_{self.questions[0].id}': 'green'}, team_id=self.team.id)
+
+        incremental = self.buckets()
+        self.assertEqual(len(incremental['votes']), 3)
+        rebuild_trends()
+        self.assertEqual(incremental, self.buckets())
+
+    def test_bucket_inserted_concurrently_is_incremented(self):
+        Vote.objects.create(user=self.voters[0], session=self.session, team=self.team, vote_value=4)
+        lock_buckets = trends._lock_buckets
+
+        ## the first read misses the buckets, as if another submission inserted them just after it
+        reads = iter([{}])
+        with mock.patch('healthcheck.trends._lock_buckets', side_effect=lambda *args: next(reads, None) or lock_buckets(*args)):
+            Vote.objects.create(user=self.voters[1], session=self.session, team=self.team, vote_value=6)
+
+        self.assertEqual(
+            set(VoteTrendBucket.objects.values_list('vote_count', 'vote_sum', 'vote_sum_squares')), {(2, 10, 52)},
+        )
+
+    def test_vote_trend_moving_average_and_change(self):
+        today = timezone.now()
+        for weeks_ago, value in ((2, 2), (1, 6), (0, 7)):
+            voter = User.objects.create(username=f'trend-weekly-{weeks_ago}')
+            vote = Vote.objects.create(user=voter, session=self.session, team=self.team, vote_value=value)
+            Vote.objects.filter(pk=vote.pk).update(created_at=today - timedelta(weeks=weeks_ago))
+        rebuild_trends()
+
+        points = vote_trend([self.team.id], period='week', window=2)
+        self.assertEqual([point['avg_vote'] for point in points], [2, 6, 7])
+        self.assertEqual([point['moving_avg'] for point in points], [2, 4, 6.5])
+        self.assertEqual([point['change'] for point in points], [None, 4, 1])
+
+        self.client.force_login(self.leader)
+        with self.assertNumQueries(10):
+            response = self.client.get(reverse('team_progress'), {'period': 'week'})
+        self.assertEqual(len(response.context['vote_points']), 3)
+
+
+class HealthRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create(username='health-lead')
+        UserProfile.objects.create(user=self.leader, role='Team Leader')
+        self.head = User.objects.create(username='health-head')
+        UserProfile.objects.create(user=self.head, role='Department Leader')
+        self.teams = [Team.objects.create(name=f'Health {i}', leader=self.leader) for i in range(3)]
+        self.department = Department.objects.create(name='Health Dept', leader=self.head)
+        self.department.teams.add(*self.teams[:2])
+        self.session = HealthCheckSession.objects.create(name='Health session', team_leader=self.leader)
+        for i, (team, value) in enumerate(zip(self.teams + self.teams, (2, 4, 6, 8, 10, 1))):
+            voter = User.objects.create(username=f'health-voter-{i}')
+            Vote.objects.create(user=voter, session=self.session, team=team, vote_value=value)
+        run_pending_tasks()
+
+    def rollups(self):
+        return sorted(HealthRollup.objects.values_list(
+            'level', 'team', 'department', 'team_count', 'vote_count', 'vote_sum', 'vote_min', 'vote_max', 'vote_sum_squares'))
+
+    def test_branch_is_kept_current_and_matches_a_rebuild(self):
+        department = HealthRollup.objects.get(level='department', department=self.department)
+        self.assertEqual((department.team_count, department.vote_count, department.vote_min, department.vote_max), (2, 4, 2, 10))
+        organisation = HealthRollup.objects.get(level='organisation')
+        self.assertEqual((organisation.team_count, organisation.vote_count, organisation.avg_vote), (3, 6, 31 / 6))
+
+        Vote.objects.filter(team=self.teams[1]).first().delete()
+        self.department.teams.remove(self.teams[0])
+        self.teams[2].department_set.add(self.department)
+        run_pending_tasks()
+        department.refresh_from_db()
+        self.assertEqual((department.team_count, department.vote_count, department.vote_sum), (2, 3, 17))
+
+        incremental = self.rollups()
+        rebuild_health_rollups()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_deleting_a_team_refreshes_its_departments(self):
+        self.teams[0].delete()
+        run_pending_tasks()
+        department = HealthRollup.objects.get(level='department', department=self.department)
+        self.assertEqual((department.team_count, department.vote_count), (1, 2))
+        self.assertEqual(HealthRollup.objects.get(level='organisation').vote_count, 4)
+
+        self.department.teams.clear()
+        self.assertFalse(HealthRollup.objects.filter(level='department').exists())
+
+    def test_department_leader_dashboard_shows_their_branch(self):
+        self.client.force_login(self.head)
+        response = self.client.get(reverse('dashboard'))
+        levels = [(rollup.level, rollup.team_id) for rollup in response.context['health_rollups']]
+        self.assertEqual(levels, [('department', None), ('team', self.teams[0].id), ('team', self.teams[1].id)])
+        self.assertContains(response, 'Health Overview')
+
+
+class AnalyticsTaskQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create(username='queue-lead')
+        self.team = Team.objects.create(name='Queued', leader=self.leader)
+        self.session = HealthCheckSession.objects.create(name='Queue session', team_leader=self.leader)
+
+    def vote(self, value):
+        voter = User.objects.create(username=f'queue-voter-{Vote.objects.count()}')
+        return Vote.objects.create(user=voter, session=self.session, team=self.team, vote_value=value)
+
+    def test_events_are_coalesced_and_processed_off_the_request(self):
+        for value in (3, 5, 7):
+            self.vote(value)
+        self.assertEqual(AnalyticsTask.objects.get().events, 3)
+        self.assertFalse(HealthRollup.objects.exists())
+        self.assertEqual(queue_stats()['depth'], 1)
+
+        stats = WorkerStats()
+        self.assertEqual(run_pending_tasks(stats=stats), 1)
+        self.assertEqual(stats.snapshot()['coalesced'], 2)
+        self.assertEqual(HealthRollup.objects.get(level='team', team=self.team).vote_sum, 15)
+        self.assertEqual(queue_stats()['depth'], 0)
+
+    def test_failed_tasks_are_retried_later(self):
+        enqueue('vote_changed', self.team.id, self.session.id)
+        failing = mock.Mock(side_effect=RuntimeError('boom'))
+        with mock.patch.dict('healthcheck.tasks.HANDLERS', {'vote_changed': failing}), self.assertLogs('healthcheck.tasks'):
+            self.assertEqual(run_pending_tasks(stats=WorkerStats()), 1)
+
+        task = AnalyticsTask.objects.get()
+        self.assertEqual((task.attempts, task.last_error), (1, 'RuntimeError: boom'))
+        self.assertGreater(task.available_at, timezone.now())
+        self.assertEqual(run_pending_tasks(stats=WorkerStats()), 0)
+
+    def test_uservoting_emits_a_vote_changed_event(self):
+        question = Question.objects.create(text='Queued question')
+        voter = User.objects.create(username='queue-engineer')
+        submit_responses(voter, self.session, [question], {f'question_{question.id}': 'green'}, team_id=self.team.id)
+        self.assertEqual(
+            list(AnalyticsTask.objects.values_list('kind', 'team_id', 'session_id')),
+            [('vote_changed', self.team.id, self.session.id)],
+        )
+
+    @override_settings(HEALTHCHECK_TASKS_EAGER=True)
+    def test_eager_mode_runs_tasks_inline(self):
+        self.vote(6)
+        self.assertFalse(AnalyticsTask.objects.exists())
+        self.assertEqual(HealthRollup.objects.get(level='organisation').vote_count, 1)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create(username='async-lead')
+        UserProfile.objects.create(user=self.leader, role='Team Leader')
+        self.engineer = User.objects.create(username='async-engineer')
+        UserProfile.objects.create(user=self.engineer, role='Engineer')
+        self.team = Team.objects.create(name='Async', leader=self.leader)
+        self.team.engineers.add(self.engineer)
+        self.session = HealthCheckSession.objects.create(name='Async session', team_leader=self.leader)
+        self.questions = Question.objects.bulk_create(Question(text=f'Async {i}') for i in range(2))
+        self.session.questions.set(self.questions)
+
+    async def test_uservoting_through_the_asgi_handler(self):
+        await self.async_client.aforce_login(self.engineer)
+        data = {f'question_{question.id}': 'yellow' for question in self.questions}
+        response = await self.async_client.post(reverse('uservoting', args=[self.session.id]), data)
+        self.assertEqual(response.status_code, 302)
+        answers = [row async for row in Response.objects.values_list('team', 'answer')]
+        self.assertEqual(answers, [(self.team.id, 'yellow')] * 2)
+
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertContains(response, 'Async session')
+
+    async def test_role_required_wraps_async_views(self):
+        await self.async_client.aforce_login(self.engineer)
+        response = await self.async_client.get(reverse('team_progress'))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+        await self.async_client.aforce_login(self.leader)
+        response = await self.async_client.get(reverse('team_progress'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([team.name for team in response.context['teams']], ['Async'])
+
+
+class LiveTallyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create(username='live-lead')
+        UserProfile.objects.create(user=self.leader, role='Team Leader')
+        self.engineer = User.objects.create(username='live-engineer')
+        self.session = HealthCheckSession.objects.create(name='Live session', team_leader=self.leader)
+        self.questions = Question.objects.bulk_create(Question(text=f'Live {i}') for i in range(2))
+        self.session.questions.set(self.questions)
+
+    def test_submissions_publish_their_changes_once_committed(self):
+        data = {f'question_{question.id}': 'green' for question in self.questions}
+        with mock.patch('healthcheck.voting.publish_responses') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                submit_responses(self.engineer, self.session, self.questions, data)
+            with self.captureOnCommitCallbacks(execute=True):
+                submit_responses(self.engineer, self.session, self.questions[:1], {f'question_{self.questions[0].id}': 'red'})
+
+        self.assertEqual(publish.call_args_list, [
+            mock.call(self.session.id, self.engineer.id, [(question.id, None, 'green') for question in self.questions]),
+            mock.call(self.session.id, self.engineer.id, [(self.questions[0].id, 'green', 'red')]),
+        ])
+
+    async def test_stream_sends_a_snapshot_then_pushed_changes(self):
+        question = self.questions[0]
+        await Response.objects.acreate(user=self.engineer, session=self.session, question=question, answer='green')
+        await self.async_client.aforce_login(self.leader)
+        response = await self.async_client.get(reverse('session_live_stream', args=[self.session.id]), {'duration': '5'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        events = aiter(response.streaming_content)
+        self.assertEqual(await anext(events), b'retry: 2000\n\n')
+        snapshot = await anext(events)
+        self.assertIn(b'event: snapshot', snapshot)
+        self.assertIn(f'"{question.id}": {{"green": 1, "yellow": 0, "red": 0}}'.encode(), snapshot)
+
+        publish_responses(self.session.id, self.engineer.id, [(question.id, 'green', 'yellow')])
+        tally = json.loads((await anext(events)).decode().split('data: ', 1)[1])
+        self.assertEqual(tally['changes'], [
+            {'question': question.id, 'answer': 'green', 'delta': -1},
+            {'question': question.id, 'answer': 'yellow', 'delta': 1},
+        ])
+        self.assertEqual(tally['voters'], 1)
+        await events.aclose()
+
+    def test_only_the_sessions_leader_can_watch(self):
+        other = User.objects.create(username='live-other')
+        UserProfile.objects.create(user=other, role='Team Leader')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('session_live', args=[self.session.id])).status_code, 404)
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        ## a replica alias as DATABASE_REPLICA_URL would configure it; no query is sent to it
+        replica = {**settings.DATABASES['default'], 'NAME': 'healthcheck-replica'}
+        patcher = mock.patch.dict(settings.DATABASES, {'replica': replica})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_go_to_the_replica_only_inside_the_block(self):
+        self.assertEqual(Vote.objects.all().db, 'default')
+        with reading_from_replica() as alias:
+            self.assertEqual(alias, 'replica')
+            self.assertEqual(Vote.objects.all().db, 'replica')
+            self.assertEqual(ReplicaRouter().db_for_write(Vote), 'default')
+        self.assertEqual(Vote.objects.all().db, 'default')
+
+    def test_use_replica_wraps_sync_and_async_views(self):
+        view = use_replica(lambda request: Vote.objects.all().db)
+
+        async def async_view(request):
+            return await sync_to_async(lambda: Vote.objects.all().db)()
+
+        self.assertEqual(view(None), 'replica')
+        self.assertEqual(async_to_sync(use_replica(async_view))(None), 'replica')
+        self.assertEqual(Vote.objects.all().db, 'default')
+
+    def test_without_a_replica_reads_stay_on_the_primary(self):
+        ## a replica naming the primary's database, as a test mirror does, is not a second database
+        settings.DATABASES['replica']['NAME'] = settings.DATABASES['default']['NAME']
+        with reading_from_replica() as alias:
+            self.assertEqual(alias, 'default')
+        del settings.DATABASES['replica']
+        with reading_from_replica() as alias:
+            self.assertEqual(alias, 'default')
+            self.assertEqual(Vote.objects.all().db, 'default')
+
+
+class SQLiteProfileTests(TestCase):
+    def test_concurrent_profile_sets_the_pragmas_on_each_connection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = {**connection.settings_dict, 'NAME': f'{directory}/profile.sqlite3', 'OPTIONS': settings.SQLITE_CONCURRENT_OPTIONS}
+            wrapper = DatabaseWrapper(database, alias='profile')
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {}
+                    for pragma in ('journal_mode', 'synchronous', 'busy_timeout'):
+                        cursor.execute(f'PRAGMA {pragma}')
+                        pragmas[pragma] = cursor.fetchone()[0]
+                self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000})
+                self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+            finally:
+                wrapper.close()
+
+
+class SessionSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create(username='snapshot-lead')
+        UserProfile.objects.create(user=self.leader, role='Team Leader')
+        self.team = Team.objects.create(name='Frozen', leader=self.leader)
+        self.question = Question.objects.create(text='Snapshot question')
+        self.session = HealthCheckSession.objects.create(name='Closing session', team_leader=self.leader)
+        self.session.questions.add(self.question)
+        self.voters = [User.objects.create(username=f'snapshot-voter-{i}') for i in range(3)]
+        for voter, answer, value in zip(self.voters, ['green', 'green', 'red'], [8, 6, 4]):
+            self.team.engineers.add(voter)
+            Response.objects.create(user=voter, session=self.session, team=self.team, question=self.question, answer=answer)
+            Vote.objects.create(user=voter, session=self.session, team=self.team, vote_value=value)
+        self.client.force_login(self.leader)
+
+    def close(self):
+        response = self.client.post(reverse('close_session', args=[self.session.id]))
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.session.refresh_from_db()
+
+    def test_closing_freezes_the_results_into_one_row(self):
+        self.assertEqual(self.client.get(reverse('close_session', args=[self.session.id])).status_code, 405)
+        self.close()
+
+        self.assertTrue(self.session.is_closed)
+        snapshot = SessionSnapshot.objects.get(session=self.session)
+        self.assertEqual((snapshot.response_count, snapshot.vote_count), (3, 3))
+        team = snapshot.data['teams'][str(self.team.id)]
+        self.assertEqual(team['questions'][str(self.question.id)], {'green': 2, 'yellow': 0, 'red': 1, 'total': 3, 'health_score': 66.7})
+        self.assertEqual((team['votes']['count'], team['votes']['sum'], team['votes']['min'], team['votes']['max']), (3, 18, 4, 8))
+        self.assertEqual(queue_stats()['by_kind'].get('session_closed'), 1)
+
+        ## closing again keeps the first snapshot
+        self.close()
+        self.assertEqual(SessionSnapshot.objects.count(), 1)
+
+    def test_late_writes_are_rejected(self):
+        self.close()
+        late = User.objects.create(username='snapshot-late')
+        with self.assertRaises(SessionClosedError):
+            submit_responses(late, self.session, [self.question], {f'question_{self.question.id}': 'green'})
+        with self.assertRaises(SessionClosedError):
+            Vote.objects.create(user=late, session=self.session, team=self.team, vote_value=10)
+
+        self.client.force_login(self.voters[0])
+        response = self.client.post(reverse('uservoting', args=[self.session.id]), {f'question_{self.question.id}': 'yellow'})
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        self.assertEqual(Response.objects.filter(session=self.session, answer='yellow').count(), 0)
+
+    def test_reports_read_the_snapshot(self):
+        self.close()
+        ## rows changed behind the signals' back do not reach the reports of a closed session
+        Response.objects.filter(session=self.session).update(answer='yellow')
+        VoteRollup.objects.filter(session=self.session).update(vote_sum=0)
+
+        row, = traffic_light_report(teams=[self.team.id])
+        self.assertEqual((row['green'], row['yellow'], row['red'], row['session']), (2, 0, 1, self.session.id))
+
+        response = self.client.get(reverse('team_progress'))
+        summary, = response.context['session_summary']
+        self.assertEqual((summary['session__name'], summary['vote_count'], summary['avg_vote']), ('Closing session', 3, 6.0))
+
+
+class QuestionBankTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.leader = User.objects.create(username='bank-lead')
+        UserProfile.objects.create(user=self.leader, role='Team Leader')
+        self.client.force_login(self.leader)
+        self.delivery = QuestionTag.objects.create(name='Delivery')
+        self.questions = Question.objects.bulk_create([
+            Question(text='We deliver great stuff quickly'),
+            Question(text='Stakeholders are happy with us'),
+            Question(text='We enjoy working together'),
+        ])
+        self.questions[0].tags.add(self.delivery)
+        self.questions[1].tags.add(self.delivery)
+        self.url = reverse('api_question_bank')
+
+    def texts(self, **params):
+        return [question['text'] for question in self.client.get(self.url, params).json()['results']]
+
+    def test_full_text_search_by_word_prefix_and_tag(self):
+        self.assertEqual(search_backend(), 'fts5')
+        self.assertEqual(self.texts(q='deliv'), ['We deliver great stuff quickly'])
+        self.assertEqual(self.texts(q='we together'), ['We enjoy working together'])
+        self.assertEqual(self.texts(tag=self.delivery.id), ['We deliver great stuff quickly', 'Stakeholders are happy with us'])
+        self.assertEqual(self.texts(q='happy', tag=self.delivery.id), ['Stakeholders are happy with us'])
+
+        ## the index follows edits and deletes of the questions
+        self.questions[2].text = 'We have fun together'
+        self.questions[2].save()
+        self.questions[1].delete()
+        self.assertEqual(list(search_questions('fun').values_list('text', flat=True)), ['We have fun together'])
+        self.assertEqual(self.texts(q='happy'), [])
+
+    def test_pages_by_question_id_and_requires_a_team_leader(self):
+        first = self.client.get(self.url, {'limit': 2}).json()
+        self.assertEqual([question['id'] for question in first['results']], [question.id for question in self.questions[:2]])
+        self.assertEqual(first['results'][0]['tags'], ['Delivery'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([question['id'] for question in second['results']], [self.questions[2].id])
+        self.assertIsNone(second['next'])
+
+        engineer = User.objects.create(username='bank-engineer')
+        UserProfile.objects.create(user=engineer, role='Engineer')
+        self.client.force_login(engineer)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_create_session_submits_only_the_picked_ids(self):
+        response = self.client.get(reverse('create_session'))
+        self.assertNotContains(response, 'Stakeholders are happy with us')
+
+        response = self.client.post(reverse('create_session'), {'name': 'Picked', 'questions': [self.questions[2].id]})
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        session = HealthCheckSession.objects.get(name='Picked')
+        self.assertEqual(list(session.questions.all()), [self.questions[2]])
+
+        ## a form with errors keeps the picked questions
+        response = self.client.post(reverse('create_session'), {'name': '', 'questions': [self.questions[1].id]})
+        self.assertContains(response, 'Stakeholders are happy with us')
+
+    def test_add_question_with_tags(self):
+        self.client.post(reverse('add_question'), {'text': 'We learn all the time', 'tags': 'Learning, Delivery'})
+        question = Question.objects.get(text='We learn all the time')
+        self.assertEqual(sorted(question.tags.values_list('name', flat=True)), ['Delivery', 'Learning'])
+        self.assertEqual(QuestionTag.objects.count(), 2)
@@ -0,0 +1,268 @@
+from collections import Counter
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import Response, ResponseTrendBucket, Vote, VoteTrendBucket
+
+
+PERIODS = [value for value, _ in VoteTrendBucket.PERIOD_CHOICES]
+VOTE_KEY = ('team_id', 'period', 'period_start')
+RESPONSE_KEY = ('team_id', 'question_id', 'period', 'period_start')
+TRAFFIC_LIGHTS = ('green', 'yellow', 'red')
+
+
+'''
+period_starts is used to find the first day of the day, week (Monday) and quarter
+that a moment falls in, in the current time zone.
+'''
+def period_starts(moment):
+    return day_period_starts(timezone.localdate(moment))
+
+
+def day_period_starts(day):
+    return {
+        'day': day,
+        'week': day - timedelta(days=day.weekday()),
+        'quarter': date(day.year, 3 * ((day.month - 1) // 3) + 1, 1),
+    }
+
+
+'''
+apply_deltas is used to add signed changes to trend buckets: {key: {field: delta}}.
+Every bucket involved is read and locked in one query. Missing ones are inserted empty with an
+upsert, so a concurrent submission that inserts the same bucket first does not fail on the
+unique constraint, and then locked like the others. Every bucket is then incremented in the
+database with one bulk_update, so the number of queries does not grow with the number of buckets.
+'''
+def _lock_buckets(model, key_fields, keys):
+    lookup = Q()
+    for key in keys:
+        lookup |= Q(**dict(zip(key_fields, key)))
+    return {
+        tuple(getattr(bucket, field) for field in key_fields): bucket
+        for bucket in model.objects.select_for_update().filter(lookup)
+    }
+
+
+def apply_deltas(model, key_fields, deltas):
+    deltas = {key: changes for key, changes in deltas.items() if any(changes.values())}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        buckets = _lock_buckets(model, key_fields, deltas)
+
+        ## a missing bucket has nothing to subtract from, e.g. when its team is being deleted
+        missing = {
+            key: {field: max(0, delta) for field, delta in changes.items()}
+            for key, changes in deltas.items()
+            if key not in buckets and any(delta > 0 for delta in changes.values())
+        }
+        if missing:
+            model.objects.bulk_create(
+                [model(**dict(zip(key_fields, key))) for key in missing],
+                update_conflicts=True,
+                unique_fields=[field.removesuffix('_id') for field in key_fields],
+                update_fields=['updated_at'],
+            )
+            buckets.update(_lock_buckets(model, key_fields, missing))
+        deltas = {key: missing.get(key, changes) for key, changes in deltas.items() if key in buckets}
+
+        to_update = []
+        fields = sorted({field for changes in deltas.values() for field in changes})
+        now = timezone.now()
+        for key, changes in deltas.items():
+            bucket = buckets[key]
+            for field in fields:
+                setattr(bucket, field, F(field) + changes.get(field, 0))
+            bucket.updated_at = now
+            to_update.append(bucket)
+
+        if to_update:
+            model.objects.bulk_update(to_update, fields + ['updated_at'])
+
+
+def vote_deltas(team_id, moment, value, sign=1):
+    return {
+        (team_id, period, start): {'vote_count': sign, 'vote_sum': sign * value, 'vote_sum_squares': sign * value * value}
+        for period, start in period_starts(moment).items()
+    }
+
+
+def response_deltas(team_id, question_id, moment, answer, sign=1):
+    return {
+        (team_id, question_id, period, start): {answer: sign}
+        for period, start in period_starts(moment).items()
+    }
+
+
+def merge_deltas(*deltas):
+    merged = {}
+    for delta in deltas:
+        for key, changes in delta.items():
+            merged.setdefault(key, Counter()).update(changes)
+    return merged
+
+
+'''
+apply_vote_change and apply_response_changes are used to move votes and responses between
+buckets: the previous state (if any) is subtracted and the current state (if any) is added.
+A vote state is (team_id, moment, value) and a response state is (team_id, question_id, moment, answer);
+responses without a team are not bucketed.
+'''
+def apply_vote_change(previous=None, current=None):
+    deltas = []
+    if previous:
+        deltas.append(vote_deltas(*previous, sign=-1))
+    if current:
+        deltas.append(vote_deltas(*current))
+    apply_deltas(VoteTrendBucket, VOTE_KEY, merge_deltas(*deltas))
+
+
+def apply_response_changes(changes):
+    deltas = []
+    for previous, current in changes:
+        if previous and previous[0]:
+            deltas.append(response_deltas(*previous, sign=-1))
+        if current and current[0]:
+            deltas.append(response_deltas(*current))
+    apply_deltas(ResponseTrendBucket, RESPONSE_KEY, merge_deltas(*deltas))
+
+
+def _roll_up(day_rows, key_fields, counters):
+    ## day rows -> {(key..., period, period_start): {counter: total}} for every period
+    buckets = {}
+    for row in day_rows.iterator():
+        key = tuple(row[field] for field in key_fields)
+        for period, start in day_period_starts(row['period_start']).items():
+            totals = buckets.setdefault(key + (period, start), dict.fromkeys(counters, 0))
+            for counter in counters:
+                totals[counter] += row[counter]
+    return buckets
+
+
+'''
+rebuild_trends is used to regenerate every trend bucket from the raw votes and responses.
+The database groups the rows by day (Trunc), and the week and quarter buckets are rolled up
+from the day buckets, so the raw tables are read once.
+It is used by the rebuild_trends management command and returns the number of buckets per model.
+'''
+def rebuild_trends():
+    day = Trunc('created_at', 'day', output_field=DateField())
+    vote_days = (
+        Vote.objects.annotate(period_start=day)
+        .values('team', 'period_start')
+        .annotate(
+            vote_count=Count('id'),
+            vote_sum=Sum('vote_value'),
+            vote_sum_squares=Sum(F('vote_value') * F('vote_value')),
+        )
+        .order_by()
+    )
+    vote_buckets = [
+        VoteTrendBucket(team_id=team_id, period=period, period_start=start, **totals)
+        for (team_id, period, start), totals in _roll_up(
+            vote_days, ('team',), ('vote_count', 'vote_sum', 'vote_sum_squares'),
+        ).items()
+    ]
+
+    day = Trunc('timestamp', 'day', output_field=DateField())
+    response_days = (
+        Response.objects.filter(team__isnull=False).annotate(period_start=day)
+        .values('team', 'question', 'period_start')
+        .annotate(**{light: Count('id', filter=Q(answer=light)) for light in TRAFFIC_LIGHTS})
+        .order_by()
+    )
+    response_buckets = [
+        ResponseTrendBucket(team_id=team_id, question_id=question_id, period=period, period_start=start, **totals)
+        for (team_id, question_id, period, start), totals in _roll_up(
+            response_days, ('team', 'question'), TRAFFIC_LIGHTS,
+        ).items()
+    ]
+
+    with transaction.atomic():
+        VoteTrendBucket.objects.all().delete()
+        ResponseTrendBucket.objects.all().delete()
+        VoteTrendBucket.objects.bulk_create(vote_buckets, batch_size=1000)
+        ResponseTrendBucket.objects.bulk_create(response_buckets, batch_size=1000)
+
+    return {'vote_buckets': len(vote_buckets), 'response_buckets': len(response_buckets)}
+
+
+def _with_moving_average(points, value, weight, window):
+    ## count-weighted moving average and period-over-period change of points[i][value]
+    previous = None
+    for i, point in enumerate(points):
+        recent = points[max(0, i - window + 1):i + 1]
+        total_weight = sum(p[weight] for p in recent)
+        point['moving_avg'] = (
+            round(sum(p[value] * p[weight] for p in recent) / total_weight, 2) if total_weight else None
+        )
+        point['change'] = round(point[value] - previous, 2) if previous is not None else None
+        previous = point[value]
+    return points
+
+
+'''
+vote_trend is used to serve the average vote per period of one or more teams from the buckets,
+with a moving average over the last `window` periods and the change since the previous period.
+The cost depends on the number of periods, not on the number of votes.
+'''
+def vote_trend(team_ids, period='week', window=4, date_from=None, date_to=None):
+    buckets = VoteTrendBucket.objects.filter(team_id__in=team_ids, period=period)
+    if date_from:
+        buckets = buckets.filter(period_start__gte=date_from)
+    if date_to:
+        buckets = buckets.filter(period_start__lte=date_to)
+    rows = (
+        buckets.values('period_start')
+        .annotate(votes=Sum('vote_count'), total=Sum('vote_sum'))
+        .filter(votes__gt=0)
+        .order_by('period_start')
+    )
+    points = [
+        {
+            'period_start': row['period_start'],
+            'vote_count': row['votes'],
+            'avg_vote': round(row['total'] / row['votes'], 2),
+        }
+        for row in rows
+    ]
+    return _with_moving_average(points, 'avg_vote', 'vote_count', window)
+
+
+'''
+response_trend is used to serve the traffic-light counts and health score (green 100, yellow 50,
+red 0) per period of one or more teams, optionally for a single question, from the buckets.
+'''
+def response_trend(team_ids, question=None, period='week', window=4, date_from=None, date_to=None):
+    buckets = ResponseTrendBucket.objects.filter(team_id__in=team_ids, period=period)
+    if question:
+        buckets = buckets.filter(question_id=question)
+    if date_from:
+        buckets = buckets.filter(period_start__gte=date_from)
+    if date_to:
+        buckets = buckets.filter(period_start__lte=date_to)
+    rows = (
+        buckets.values('period_start')
+        .annotate(**{f'{light}_total': Sum(light) for light in TRAFFIC_LIGHTS})
+        .order_by('period_start')
+    )
+    points = []
+    for row in rows:
+        green, yellow, red = (row[f'{light}_total'] for light in TRAFFIC_LIGHTS)
+        total = green + yellow + red
+        if total:
+            points.append({
+                'period_start': row['period_start'],
+                'green': green,
+                'yellow': yellow,
+                'red': red,
+                'total': total,
+                'health_score': round((100 * green + 50 * yellow) / total, 1),
+            })
+    return _with_moving_average(points, 'health_score', 'total', window)
@@ -1,16 +1,32 @@
+from django.contrib.auth import views as auth_views
 from django.urls import path
 from .views import change_password, create_team, delete_team, edit_team, manage_teams
 from .views import register, user_login, dashboard, user_logout, user_settings, user_update, delete_user
+from .views import admin_users_table, admin_teams_table, admin_departments_table, fragment_cache_stats, request_metrics
+from .views import analytics_queue_stats
 from .views import manage_departments, create_department, edit_department, delete_department
-from .views import uservoting, create_health_check_session, add_question, vote_analysis_view, team_progress_view
+from .forms import ResetPasswordForm, SetNewPasswordForm
+from .api import question_bank, vote_analytics
+from .views import uservoting, create_health_check_session, add_question, vote_analysis_view, team_progress_view, export_data, import_data
+from .views import traffic_light_report_view, session_live_view, session_live_stream, close_session_view
 
 urlpatterns = [
     path('register/', register, name='register'),
     path('login/', user_login, name='login'),
     path('dashboard/', dashboard, name='dashboard'),
+    path('dashboard/users/', admin_users_table, name='admin_users_table'),
+    path('dashboard/teams/', admin_teams_table, name='admin_teams_table'),
+    path('dashboard/departments/', admin_departments_table, name='admin_departments_table'),
+    path('dashboard/cache-stats/', fragment_cache_stats, name='fragment_cache_stats'),
+    path('dashboard/request-metrics/', request_metrics, name='request_metrics'),
+    path('dashboard/queue-stats/', analytics_queue_stats, name='analytics_queue_stats'),
     path('settings/', user_settings, name='settings'),
     path('change_password/', change_password, name='change_password'),
     path('logout/', user_logout, name='logout'),
+    path('password-reset/', auth_views.PasswordResetView.as_view(form_class=ResetPasswordForm), name='password_reset'),
+    path('password-reset/sent/', auth_views.PasswordResetDoneView.as_view(), name='password_reset_done'),
+    path('password-reset/<uidb64>/<token>/', auth_views.PasswordResetConfirmView.as_view(form_class=SetNewPasswordForm), name='password_reset_confirm'),
+    path('password-reset/complete/', auth_views.PasswordResetCompleteView.as_view(), name='password_reset_complete'),
     path('user/<str:username>/', user_update, name='user_update'),
     path('delete_user/<str:username>/', delete_user, name='delete_user'),
     path('teams/', manage_teams, name='manage_teams'),
@@ -22,8 +38,16 @@ urlpatterns = [
     path('departments/edit/<int:department_id>/', edit_department, name='edit_department'),
     path('departments/delete/<int:department_id>/', delete_department, name='delete_department'),
     path('uservoting/<int:session_id>/', uservoting, name='uservoting'),
+    path('sessions/<int:session_id>/live/', session_live_view, name='session_live'),
+    path('sessions/<int:session_id>/live/stream/', session_live_stream, name='session_live_stream'),
+    path('sessions/<int:session_id>/close/', close_session_view, name='close_session'),
     path('create-session/',create_health_check_session, name='create_session'),
     path('add_question/', add_question, name='add_question'),
     path('vote-analysis/',vote_analysis_view, name='vote_analysis'),
     path('team-progress/',team_progress_view,name='team_progress'),
+    path('reports/traffic-lights/', traffic_light_report_view, name='traffic_light_report'),
+    path('api/v1/analytics/votes/', vote_analytics, name='api_vote_analytics'),
+    path('api/v1/questions/', question_bank, name='api_question_bank'),
+    path('export/<str:kind>/', export_data, name='export_data'),
+    path('import/', import_data, name='import_data'),
 ]
\ No newline at end of file
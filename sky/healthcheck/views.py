@@ -1,15 +1,35 @@
+import io
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import UserProfile, Team, Department, Question, Response, HealthCheckSession, Vote
+from .models import UserProfile, Team, Department, Question, QuestionTag, Response, HealthCheckSession, Vote, VoteRollup, HealthRollup
 from .forms import HealthCheckSessionForm, QuestionForm
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
 from django.contrib.auth.models import User
-from .forms import UserRegistrationForm, UserSettingsForm, ChangePasswordForm, UserUpdateForm
+from .forms import UserRegistrationForm, UserSettingsForm, ChangePasswordForm, UserUpdateForm, BulkImportForm
+from .voting import aget_session_payload, asession_team, auser_answers, submit_responses
+from .snapshots import SessionClosedError, close_session, snapshot_vote_totals
+from .pagination import keyset_page
+from .questionbank import tags_for_names
+from .access import aresolve_request, role_required
+from .fragments import fragment_stats
+from .metrics import registry as request_metrics_registry
+from .exports import EXPORT_COLUMNS, EXPORT_FORMATS, export_stream
+from .imports import IMPORT_REQUEST_PASSWORD_LIMIT, import_directory
+from .live import LIVE_STREAM_SECONDS, tally_events
+from .reports import report_team_ids, traffic_light_report
+from .routers import replica_alias, use_replica
+from .tasks import queue_stats, worker_stats
+from .trends import PERIODS, response_trend, vote_trend
 from django.contrib.auth import login, logout, authenticate, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 
-from django.db.models import Avg
+from django.db.models import F, FloatField, Prefetch, Q, Sum
+from django.db.models.functions import Cast
 
+ADMIN_PAGE_SIZE = 50
 
 
 '''
@@ -65,42 +85,171 @@ def user_logout(request):
     return redirect('login')
 
 
+'''
+teams_prefetch and engineers_prefetch build the Prefetch objects used by the dashboard,
+so each roster is loaded with a fixed number of queries whatever its size.
+'''
+def teams_prefetch(queryset=None):
+    if queryset is None:
+        queryset = Team.objects.select_related('leader')
+    return Prefetch('teams', queryset=queryset)
+
+
+def engineers_prefetch():
+    return Prefetch('engineers', queryset=User.objects.order_by('id'))
+
+
+'''
+arender is used by async views whose context still holds lazy querysets:
+the template is rendered in a worker thread, where those querysets may run.
+'''
+async def arender(request, template_name, context=None):
+    return await sync_to_async(render)(request, template_name, context)
+
+
 '''
 dashboard view is used to render the dashboard.html template.
 It displays the user's role.
+It is async: the role, sessions and health rollups are read with the async ORM. The roster
+querysets stay lazy so a fragment cache hit never runs them, so the template is rendered with arender.
 '''
 @login_required
-def dashboard(request):
-    if request.user.userprofile.role == 'Admin':
-        teams = Team.objects.all()
-        departments = Department.objects.all()
-        users = User.objects.all()
-        return render(request, 'dashboard.html', {'users' : users, 'teams' : teams, 'departments': departments})
-
-    if request.user.userprofile.role == 'Senior Manager':
-        departments = Department.objects.all()
-        teams = Team.objects.all()
-        return render(request, 'dashboard.html', {'departments' : departments, 'teams': teams})
-
-    if request.user.userprofile.role == 'Team Leader':
-        teams = Team.objects.filter(leader=request.user)
-        sessions = HealthCheckSession.objects.filter(team_leader=request.user)
-        return render(request, 'dashboard.html', {'teams' : teams, 'sessions': sessions})
-    
-    if request.user.userprofile.role == 'Department Leader':
-        departments = Department.objects.filter(leader=request.user)
-        teams = Team.objects.filter(department__in=departments)
-        return render(request, 'dashboard.html', {'departments' : departments, 'teams': teams})
-    
-    if request.user.userprofile.role == 'Engineer':
+async def dashboard(request):
+    access = await aresolve_request(request)
+    role = access.role
+    if role == 'Admin':
+        ## the admin tables are loaded separately from admin_*_table views
+        return render(request, 'dashboard.html')
+
+    if role == 'Senior Manager':
+        departments = Department.objects.select_related('leader').prefetch_related(
+            teams_prefetch(Team.objects.select_related('leader').prefetch_related(engineers_prefetch()))
+        )
+        teams = Team.objects.select_related('leader')
+        ## health rollups are read live, outside the cached tables, since votes do not expire those
+        health = HealthRollup.objects.filter(level__in=('organisation', 'department')).select_related('department')
+        return await arender(request, 'dashboard.html', {
+            'departments' : departments, 'teams': teams,
+            'health_rollups': [rollup async for rollup in health.order_by('-level', 'department__name')],
+        })
+
+    if role == 'Team Leader':
+        teams = Team.objects.filter(leader=request.user).prefetch_related(engineers_prefetch())
+        sessions = HealthCheckSession.objects.filter(team_leader=request.user).prefetch_related('questions')
+        return await arender(request, 'dashboard.html', {'teams' : teams, 'sessions': [session async for session in sessions]})
+
+    if role == 'Department Leader':
+        departments = Department.objects.filter(leader=request.user).prefetch_related(teams_prefetch())
+        teams = Team.objects.filter(department__in=departments).select_related('leader')
+        health = HealthRollup.objects.filter(
+            Q(level='department', department__leader=request.user) |
+            Q(level='team', team__department__leader=request.user)
+        ).select_related('department', 'team').distinct()
+        return await arender(request, 'dashboard.html', {
+            'departments' : departments, 'teams': teams,
+            'health_rollups': [rollup async for rollup in health.order_by('level', 'department__name', 'team__name')],
+        })
+
+    if role == 'Engineer':
         teams = Team.objects.filter(engineers=request.user)
         team_leaders = teams.values_list('leader', flat=True).distinct()
-        sessions = HealthCheckSession.objects.filter(team_leader__in=team_leaders)
-        return render(request, 'dashboard.html', {'teams' : teams, 'sessions': sessions})
+        sessions = HealthCheckSession.objects.filter(team_leader__in=team_leaders, status='open').prefetch_related('questions')
+        return await arender(request, 'dashboard.html', {'teams' : teams, 'sessions': [session async for session in sessions]})
 
     return render(request, 'dashboard.html')
 
 
+'''
+admin_users_table, admin_teams_table and admin_departments_table views render one page
+of the Admin dashboard tables as HTML fragments, so each table loads on its own.
+They use keyset pagination (?after=<cursor>) and accept a search term (?q=).
+'''
+@login_required
+@role_required('Admin')
+def admin_users_table(request):
+    search = request.GET.get('q', '').strip()
+    role = request.GET.get('role', '')
+    users = User.objects.select_related('userprofile')
+    if search:
+        users = users.filter(
+            Q(username__icontains=search) | Q(first_name__icontains=search) |
+            Q(last_name__icontains=search) | Q(email__icontains=search)
+        )
+    if role:
+        users = users.filter(userprofile__role=role)
+
+    page = keyset_page(users, 'username', request.GET.get('after'), ADMIN_PAGE_SIZE)
+    return render(request, 'admin_users_table.html', {
+        'page': page, 'search': search, 'role': role,
+        'roles': UserProfile.ROLE_CHOICES, 'after': request.GET.get('after', ''),
+    })
+
+
+@login_required
+@role_required('Admin')
+def admin_teams_table(request):
+    search = request.GET.get('q', '').strip()
+    teams = Team.objects.select_related('leader').prefetch_related(engineers_prefetch())
+    if search:
+        teams = teams.filter(Q(name__icontains=search) | Q(leader__username__icontains=search))
+
+    page = keyset_page(teams, 'id', parse_id_cursor(request.GET.get('after')), ADMIN_PAGE_SIZE)
+    return render(request, 'admin_teams_table.html', {
+        'page': page, 'search': search, 'after': request.GET.get('after', ''),
+    })
+
+
+@login_required
+@role_required('Admin')
+def admin_departments_table(request):
+    search = request.GET.get('q', '').strip()
+    departments = Department.objects.select_related('leader').prefetch_related(teams_prefetch())
+    if search:
+        departments = departments.filter(Q(name__icontains=search) | Q(leader__username__icontains=search))
+
+    page = keyset_page(departments, 'id', parse_id_cursor(request.GET.get('after')), ADMIN_PAGE_SIZE)
+    return render(request, 'admin_departments_table.html', {
+        'page': page, 'search': search, 'after': request.GET.get('after', ''),
+    })
+
+
+'''
+fragment_cache_stats view is used to report the hit and miss counters of the dashboard fragment cache.
+It is only accessible by the app admin.
+'''
+@login_required
+@role_required('Admin')
+def fragment_cache_stats(request):
+    return JsonResponse({'fragments': fragment_stats()})
+
+
+'''
+request_metrics view is used to report the per view latency and query aggregates
+collected by RequestMetricsMiddleware. It is only accessible by the app admin.
+'''
+@login_required
+@role_required('Admin')
+def request_metrics(request):
+    return JsonResponse({'views': request_metrics_registry.snapshot()})
+
+
+'''
+analytics_queue_stats view is used to report the depth and lag of the analytics task queue,
+and the counters of the worker when it runs in this process. It is only accessible by the app admin.
+'''
+@login_required
+@role_required('Admin')
+def analytics_queue_stats(request):
+    return JsonResponse({'queue': queue_stats(), 'worker': worker_stats.snapshot()})
+
+
+def parse_id_cursor(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
 '''
 user_settings view is used to update the user's first name, last name and email.
 It renders the settings.html template.
@@ -126,11 +275,8 @@ It is only accessible by the app admin.
 It renders the user_update.html template.
 '''
 @login_required
+@role_required('Admin')
 def user_update(request, username):
-    if not request.user.userprofile.role == 'Admin':
-        messages.error(request, 'Access Denied.')
-        return redirect('dashboard')
-    
     if request.method == 'POST':
         user = get_object_or_404(User, username=username)
         form = UserUpdateForm(request.POST, instance=user, role_initial=request.POST.get('role'))
@@ -152,11 +298,8 @@ delete_team view is used to delete a team.
 It redirects the user to the manage_teams page.
 '''
 @login_required
+@role_required('Admin')
 def delete_user(request, username):
-    if not request.user.userprofile.role == 'Admin':
-        messages.error(request, 'Access Denied.')
-        return redirect('dashboard')
-    
     user = get_object_or_404(User, username=username)
     user.delete()
     return redirect('dashboard')
@@ -189,11 +332,8 @@ manage_teams view is used to manage the teams.
 It renders the manage_teams.html template.
 '''
 @login_required
+@role_required('Team Leader', 'Department Leader')
 def manage_teams(request):
-    if not request.user.userprofile.role == 'Team Leader' and not request.user.userprofile.role == 'Department Leader':
-        messages.error(request, 'Access Denied.')
-        return redirect('dashboard')
-    
     teams = Team.objects.filter(leader=request.user)
     return render(request, 'manage_teams.html', {'teams': teams})
 
@@ -203,17 +343,14 @@ create_team view is used to create a team.
 It renders the create_team.html template.
 '''
 @login_required
+@role_required('Team Leader', 'Admin')
 def create_team(request):
-    if not request.user.userprofile.role == 'Team Leader' and not request.user.userprofile.role == 'Admin':
-        messages.error(request, 'Access Denied.')
-        return redirect('dashboard')
-    
     if request.method == 'POST':
         name = request.POST.get('name')
         engineers = request.POST.getlist('engineers')
 
         team_leader = request.user
-        if request.user.userprofile.role == 'Admin':
+        if request.access.role == 'Admin':
             team_leader = User.objects.get(id=request.POST.get('leader'))
         team = Team.objects.create(name=name, leader=team_leader)
         
@@ -221,7 +358,7 @@ def create_team(request):
         return redirect('dashboard')
     
     users = User.objects.all()
-    if request.user.userprofile.role == 'Admin':
+    if request.access.role == 'Admin':
         users = User.objects.filter(userprofile__role='Team Leader')
 
     return render(request, 'create_team.html', {'users': users})
@@ -232,11 +369,8 @@ edit_team view is used to edit a team.
 It renders the edit_team.html template.
 '''
 @login_required
+@role_required('Team Leader', 'Admin')
 def edit_team(request, team_id):
-    if not request.user.userprofile.role == 'Team Leader' and not request.user.userprofile.role == 'Admin':
-        messages.error(request, 'Access Denied.')
-        return redirect('dashboard')
-    
     team = get_object_or_404(Team, id=team_id)
     engineers = User.objects.filter(userprofile__role='Engineer')
 
@@ -256,11 +390,8 @@ delete_team view is used to delete a team.
 It redirects the user to the manage_teams page.
 '''
 @login_required
+@role_required('Team Leader', 'Admin')
 def delete_team(request, team_id):
-    if not request.user.userprofile.role == 'Team Leader' and not request.user.userprofile.role == 'Admin':
-        messages.error(request, 'Access Denied.')
-        return redirect('dashboard')
-    
     team = get_object_or_404(Team, id=team_id)
     team.delete()
     messages.success(request, f"Team {team.name} deleted successfully.")
@@ -272,11 +403,8 @@ manage_departments view is used to manage the departments.
 It renders the manage_departments.html template.
 '''
 @login_required
+@role_required('Department Leader')
 def manage_departments(request):
-    if not request.user.userprofile.role == 'Department Leader':
-        messages.error(request, 'Access Denied.')
-        return redirect('dashboard')
-    
     departments = Department.objects.filter(leader=request.user)
 
     return render(request, 'manage_departments.html', {'departments': departments})
@@ -287,16 +415,13 @@ create_department view is used to create a department.
 It renders the create_department.html template.
 '''
 @login_required
+@role_required('Department Leader', 'Admin')
 def create_department(request):
-    if not request.user.userprofile.role == 'Department Leader' and not request.user.userprofile.role == 'Admin':
-        messages.error(request, 'Access Denied.')
-        return redirect('dashboard')
-    
     if request.method == 'POST':
         name = request.POST.get('name')
 
         department_leader = request.user
-        if request.user.userprofile.role == 'Admin':
+        if request.access.role == 'Admin':
             department_leader = User.objects.get(id=request.POST.get('leader'))
 
         
@@ -307,7 +432,7 @@ def create_department(request):
     
 
     users = User.objects.all()
-    if request.user.userprofile.role == 'Admin':
+    if request.access.role == 'Admin':
         users = User.objects.filter(userprofile__role='Department Leader')
 
     return render(request, 'create_department.html', {'users': users})
@@ -318,11 +443,8 @@ edit_department view is used to edit a department.
 It renders the edit_department.html template.
 '''
 @login_required
+@role_required('Department Leader', 'Admin')
 def edit_department(request, department_id):
-    if not request.user.userprofile.role == 'Department Leader' and not request.user.userprofile.role == 'Admin':
-        messages.error(request, 'Access Denied.')
-        return redirect('dashboard')
-    
     department = get_object_or_404(Department, id=department_id)
     teams = Team.objects.all()
 
@@ -342,11 +464,8 @@ delete_department view is used to delete a department.
 It redirects the user to the manage_departments page.
 '''
 @login_required
+@role_required('Department Leader', 'Admin')
 def delete_department(request, department_id):
-    if not request.user.userprofile.role == 'Department Leader' and not request.user.userprofile.role == 'Admin':
-        messages.error(request, 'Access Denied.')
-        return redirect('dashboard')
-    
     department = get_object_or_404(Department, id=department_id)
     department.delete()
     messages.success(request, f"Department {department.name} deleted successfully.")
@@ -355,36 +474,92 @@ def delete_department(request, department_id):
 
 '''
 Views for creating healthcheck session, adding questions and user voting
+uservoting is async, since it takes the end-of-sprint load: the team is read with the async ORM.
+The session and its ordered questions come from the cached session payload, so a GET only
+queries the user's own answers. The answers are saved by submit_responses in one transaction,
+and transactions only run in sync code, so that call goes through sync_to_async.
 '''
 @login_required
-def uservoting(request, session_id):
-    questions = Question.objects.all()
-    session = HealthCheckSession.objects.get(id=session_id)
-    questions = session.questions.all().order_by('id')
-    for question in questions:
-        print(question.text)
-    
+async def uservoting(request, session_id):
+    await aresolve_request(request)
+    session = await aget_session_payload(session_id)
+    if session is None:
+        raise Http404("No such session.")
+    ## closed sessions keep the results of their snapshot
+    if session.is_closed:
+        messages.error(request, f"{session.name} is closed.")
+        return redirect('dashboard')
+    questions = session.questions
 
     if request.method == 'POST':
-        for question in questions:
-            answer = request.POST.get(f'question_{question.id}')
-            if answer:
-                Response.objects.update_or_create(
-                    user=request.user,
-                    question=question,
-                    defaults={'answer': answer}
-                )
+        team_id = await asession_team(request.user, session)
+        try:
+            await sync_to_async(submit_responses)(request.user, session, questions, request.POST, team_id=team_id)
+        except SessionClosedError:
+            ## closed while the answers were being submitted
+            messages.error(request, f"{session.name} is closed.")
+            return redirect('dashboard')
         return redirect('uservoting',  session_id=session.id)  # or wherever
 
-    return render(request, 'uservoting.html', {'session': session, 'questions': questions})
+    answers = await auser_answers(request.user, session.id)
+    return render(request, 'uservoting.html', {'session': session, 'questions': questions, 'answers': answers})
 
 
 
+'''
+session_live_view and session_live_stream views are used by the team leader running a session
+to watch answers arrive. The page subscribes to the stream, a Server-Sent Events response fed by
+the session's in-process publisher (live.py), so the counts are pushed instead of polled.
+The stream needs the ASGI app; under WSGI it would hold a worker thread for its whole life.
+It lasts LIVE_STREAM_SECONDS, or less with ?duration=, and the browser then reconnects.
+'''
+async def aled_session(request, session_id):
+    session = await HealthCheckSession.objects.filter(id=session_id, team_leader=request.user).afirst()
+    if session is None:
+        raise Http404("No such session.")
+    return session
+
+
 @login_required
-def create_health_check_session(request):
-    if not request.user.userprofile.role == 'Team Leader':
-        return redirect('unauthorized')  # or use PermissionDenied
+@role_required('Team Leader')
+async def session_live_view(request, session_id):
+    session = await aled_session(request, session_id)
+    questions = [question async for question in session.questions.order_by('id')]
+    return render(request, 'session_live.html', {'session': session, 'questions': questions})
+
+
+@login_required
+@role_required('Team Leader')
+async def session_live_stream(request, session_id):
+    session = await aled_session(request, session_id)
+    try:
+        duration = min(float(request.GET.get('duration', LIVE_STREAM_SECONDS)), LIVE_STREAM_SECONDS)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid duration.")
+    response = StreamingHttpResponse(tally_events(session.id, duration=duration), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+'''
+close_session_view is used by the team leader of a session to close it (POST only).
+Its results are frozen into a snapshot and later answers are rejected.
+'''
+@login_required
+@role_required('Team Leader')
+def close_session_view(request, session_id):
+    session = get_object_or_404(HealthCheckSession, id=session_id, team_leader=request.user)
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    close_session(session)
+    messages.success(request, f"{session.name} is closed.")
+    return redirect('dashboard')
+
 
+@login_required
+@role_required('Team Leader')
+def create_health_check_session(request):
     if request.method == 'POST':
         form = HealthCheckSessionForm(request.POST)
         if form.is_valid():
@@ -397,21 +572,24 @@ def create_health_check_session(request):
     else:
         form = HealthCheckSessionForm()
 
-    return render(request, 'create_session.html', {'form': form})
+    ## the picker loads the question bank from the API; only the picked questions are rendered
+    selected = form.cleaned_data.get('questions', []) if form.is_bound else []
+    return render(request, 'create_session.html', {
+        'form': form, 'selected_questions': selected, 'tags': QuestionTag.objects.order_by('name'),
+    })
 
 
 
 @login_required
+@role_required('Team Leader')
 def add_question(request):
-    if not request.user.userprofile.role == 'Team Leader':
-        return redirect('unauthorized')
-
     if request.method == 'POST':
         form = QuestionForm(request.POST)
         if form.is_valid():
             question = form.save(commit=False)
             question.created_by = request.user
             question.save()
+            question.tags.set(tags_for_names(form.cleaned_data['tags']))
             return redirect('create_session')  # or another page
     else:
         form = QuestionForm()
@@ -424,16 +602,12 @@ def add_question(request):
 # View 1 : Visualizing the Vote Analysis
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
 @login_required ## ensuring that only the logged-in user can access this feature
-def vote_analysis_view(request):
-    ## querying the database to get the average vote grouped by team and session 
-    vote_data = (
-        Vote.objects
-        .values('team','session') ## group by team name and seession
-        .annotate(avg_vote=Avg('vote_value')) ## calculatng the average of the vote values
-    )
-
-    #Render the vote_analysis.html page and passing the vote data
-    return render(request,'vote_analysis.html',{'vote_data':vote_data})
+@use_replica ## read-only page, served from the replica when one is configured
+async def vote_analysis_view(request):
+    await aresolve_request(request)
+    ## the chart loads the team and session averages from the analytics API,
+    ## so the page itself no longer embeds the vote data
+    return render(request,'vote_analysis.html')
 
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
@@ -441,34 +615,160 @@ def vote_analysis_view(request):
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
 
 @login_required ## ensuring that only the logged-in user can access this feature
-def team_progress_view(request):
+@role_required('Team Leader') ## only allowing the team leaders to view this page
+@use_replica ## read-only page, served from the replica when one is configured
+async def team_progress_view(request):
     user = request.user # getting the current logged-in user details
 
-    # only allowing the team leaders to view this page
-    if user.userprofile.role != 'Team Leader':
-        return redirect('dashboard') ## redirecting unauthorized users
-    
     ## filtering all teams that lead by th current user
-    teams = Team.objects.filter(leader=user)
+    teams = [team async for team in Team.objects.filter(leader=user)]
 
     ## checking if the user has selected a specific team via GET request
     selected_team = request.GET.get('team')
 
-    ## filtering votes that are only for the selected leader's team
-    #votes = Vote.objects.filter(team_in=teams)
-    votes = Vote.objects.filter(team__in=teams)
+    ## filtering rollups that are only for the selected leader's team
+    rollups = VoteRollup.objects.filter(team__in=teams)
 
     ## if a team is selected further filter by the selected team
     if selected_team:
         selected_team_obj = Team.objects.filter(name=selected_team)
-        votes=votes.filter(team__in=selected_team_obj)
-
-    ## aggregating the votes by session and calculating average votes
-    session_summary = votes.values('session').annotate(avg_vote=Avg('vote_value'))
+        rollups = rollups.filter(team__in=selected_team_obj)
+
+    ## combining the rollups by session and calculating average votes
+    session_summary = [
+        row async for row in rollups
+        .values('session', 'session__name', 'session__status')
+        .annotate(vote_count=Sum('vote_count'), vote_sum=Sum('vote_sum'))
+        .filter(vote_count__gt=0)
+        .annotate(avg_vote=Cast('vote_sum', FloatField()) / F('vote_count'))
+        .order_by('session')
+    ]
+
+    ## closed sessions take their frozen totals from one snapshot row each
+    team_ids = [team.id for team in teams if not selected_team or team.name == selected_team]
+    closed_sessions = [row['session'] for row in session_summary if row['session__status'] == 'closed']
+    if closed_sessions:
+        snapshot_totals = await sync_to_async(snapshot_vote_totals)(closed_sessions, team_ids)
+        for row in session_summary:
+            if row['session'] in snapshot_totals:
+                row['vote_count'], row['vote_sum'] = snapshot_totals[row['session']]
+                row['avg_vote'] = row['vote_sum'] / row['vote_count'] if row['vote_count'] else None
+        session_summary = [row for row in session_summary if row['vote_count']]
+
+    ## reading the trend over time from the period buckets (day, week or quarter)
+    period = request.GET.get('period') if request.GET.get('period') in PERIODS else 'week'
+    vote_points = await sync_to_async(vote_trend)(team_ids, period=period)
+    response_points = await sync_to_async(response_trend)(team_ids, period=period)
 
     ## Rendering the team_porogress.html page with all required context
     return render(request,'team_progress.html', {
         'teams':teams,
         'selected_team':selected_team,
         'session_summary':session_summary,
-    })
\ No newline at end of file
+        'periods':PERIODS,
+        'period':period,
+        'vote_points':vote_points,
+        'response_points':response_points,
+    })
+
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+# View 4: Traffic-light distribution per question, team and session
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+
+@login_required
+@role_required('Admin', 'Senior Manager', 'Department Leader', 'Team Leader')
+@use_replica
+def traffic_light_report_view(request):
+    ## only the teams the user can see are offered
+    visible_team_ids = report_team_ids(request.access)
+    teams = Team.objects.order_by('name')
+    if visible_team_ids is not None:
+        teams = teams.filter(id__in=visible_team_ids)
+    teams = list(teams.values('id', 'name'))
+
+    ## one team at a time keeps the page small; the first one is shown by default
+    try:
+        selected_team = int(request.GET.get('team') or (teams[0]['id'] if teams else 0))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid team.")
+    if selected_team not in {team['id'] for team in teams}:
+        selected_team = None
+
+    rows = traffic_light_report(teams=[selected_team]) if selected_team else []
+
+    return render(request, 'traffic_light_report.html', {
+        'teams': teams,
+        'selected_team': selected_team,
+        'rows': rows,
+    })
+
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+# View 3: Bulk export of responses and votes for analysts
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - 
+@login_required
+@role_required('Admin', 'Senior Manager')
+def export_data(request, kind):
+    if kind not in EXPORT_COLUMNS:
+        return HttpResponseBadRequest("Unknown export.")
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Format must be csv or ndjson.")
+
+    ## reading the optional filters from the query string
+    filters = {}
+    try:
+        for name in ('team', 'department', 'session'):
+            if request.GET.get(name):
+                filters[name] = int(request.GET[name])
+        for name in ('date_from', 'date_to'):
+            if request.GET.get(name):
+                filters[name] = parse_date(request.GET[name])
+                if filters[name] is None:
+                    raise ValueError(name)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid filter value.")
+
+    compress = request.GET.get('gzip') in ('1', 'true')
+    filename = f'{kind}.{export_format}' + ('.gz' if compress else '')
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+
+    ## streaming the rows so the export never sits in memory; they are read from the replica
+    response = StreamingHttpResponse(
+        export_stream(kind, export_format, compress, using=replica_alias(), **filters),
+        content_type='application/gzip' if compress else content_type,
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+'''
+import_data view is used to bulk import users, team memberships and department-team links from CSV files.
+Only a few passwords may be hashed within the request; larger user files leave the password column
+empty (the users set theirs with a password reset) or go through manage.py import_healthcheck.
+It renders the import_data.html template with the import report.
+'''
+@login_required
+@role_required('Admin')
+def import_data(request):
+    report = None
+    if request.method == 'POST':
+        form = BulkImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            ## uploads are bytes, the csv reader needs text
+            files = {
+                name: io.TextIOWrapper(form.cleaned_data[name], encoding='utf-8-sig', newline='')
+                for name in ('users', 'teams', 'departments') if form.cleaned_data[name]
+            }
+            report = import_directory(
+                max_passwords=IMPORT_REQUEST_PASSWORD_LIMIT,
+                dry_run=form.cleaned_data['dry_run'],
+                **files,
+            )
+            if report.ok and not report.dry_run:
+                messages.success(request, "Import completed successfully.")
+    else:
+        form = BulkImportForm()
+    return render(request, 'import_data.html', {'form': form, 'report': report})
@@ -0,0 +1,243 @@
+from dataclasses import dataclass
+from functools import partial
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .live import publish_responses
+from .models import HealthCheckSession, Question, Response, Team
+from .snapshots import ensure_session_open
+from .tasks import enqueue
+from .trends import apply_response_changes
+
+
+VALID_ANSWERS = {value for value, _ in Response.TRAFFIC_LIGHT_CHOICES}
+
+SESSION_PAYLOAD_TIMEOUT = 3600
+SESSION_PAYLOAD_VERSION_KEY = 'healthcheck:session-payload:{session_id}:version'
+
+
+'''
+VotingQuestion holds the id and text of a question on the voting page.
+'''
+@dataclass(frozen=True)
+class VotingQuestion:
+    id: int
+    text: str
+
+
+'''
+SessionPayload holds what the voting page needs of a session: its metadata and its questions
+in order, as VotingQuestion items. It is immutable so it can be cached and shared between requests.
+'''
+@dataclass(frozen=True)
+class SessionPayload:
+    id: int
+    name: str
+    status: str
+    team_leader_id: int
+    questions: tuple = ()
+
+    @property
+    def is_closed(self):
+        return self.status == 'closed'
+
+    def __str__(self):
+        return self.name
+
+
+def _payload_version_key(session_id):
+    return SESSION_PAYLOAD_VERSION_KEY.format(session_id=session_id)
+
+
+def _payload_key(session_id, version):
+    return f'healthcheck:session-payload:{session_id}:{version}'
+
+
+def _build_payload(session, questions):
+    return SessionPayload(questions=tuple(VotingQuestion(*question) for question in questions), **session)
+
+
+def _session_rows(session_id):
+    session = HealthCheckSession.objects.filter(pk=session_id).values('id', 'name', 'status', 'team_leader_id')
+    questions = Question.objects.filter(healthchecksession=session_id).order_by('id').values_list('id', 'text')
+    return session, questions
+
+
+'''
+load_session_payload is used to build the SessionPayload of a session from the database,
+or None when there is no such session. aload_session_payload is the async version.
+'''
+def load_session_payload(session_id):
+    session, questions = _session_rows(session_id)
+    session = session.first()
+    if session is None:
+        return None
+    return _build_payload(session, questions)
+
+
+async def aload_session_payload(session_id):
+    session, questions = _session_rows(session_id)
+    session = await session.afirst()
+    if session is None:
+        return None
+    return _build_payload(session, [question async for question in questions])
+
+
+'''
+get_session_payload is used to get the SessionPayload of a session, reading it from the cache
+when possible. Each session has its own version number in the cache; invalidate_session_payload
+moves it on, so a busy voting page never reads a stale question list. Missing sessions are not
+cached. aget_session_payload is the same for async code.
+'''
+def get_session_payload(session_id):
+    version = cache.get_or_set(_payload_version_key(session_id), 1, None)
+    key = _payload_key(session_id, version)
+    payload = cache.get(key)
+    if payload is None:
+        payload = load_session_payload(session_id)
+        if payload is not None:
+            cache.set(key, payload, SESSION_PAYLOAD_TIMEOUT)
+    return payload
+
+
+async def aget_session_payload(session_id):
+    version = await cache.aget_or_set(_payload_version_key(session_id), 1, None)
+    key = _payload_key(session_id, version)
+    payload = await cache.aget(key)
+    if payload is None:
+        payload = await aload_session_payload(session_id)
+        if payload is not None:
+            await cache.aset(key, payload, SESSION_PAYLOAD_TIMEOUT)
+    return payload
+
+
+'''
+invalidate_session_payload is used when a session, its questions or the text of one of them
+change; it moves the cached payload of each given session to a new version.
+'''
+def invalidate_session_payload(*session_ids):
+    for session_id in session_ids:
+        try:
+            cache.incr(_payload_version_key(session_id))
+        except ValueError:
+            cache.set(_payload_version_key(session_id), 2, None)
+
+
+def _user_answers(user, session_id):
+    return Response.objects.filter(user=user, session_id=session_id).values_list('question_id', 'answer')
+
+
+'''
+user_answers is used to read the answers a user has already given in a session,
+as {question_id: answer}. auser_answers is the async version.
+'''
+def user_answers(user, session_id):
+    return dict(_user_answers(user, session_id))
+
+
+async def auser_answers(user, session_id):
+    return {question_id: answer async for question_id, answer in _user_answers(user, session_id)}
+
+
+'''
+session_team is used to find the team a user answers a session for:
+their first team led by the session's team leader, or None. asession_team is the async version.
+'''
+def _session_teams(user, session):
+    return Team.objects.filter(leader_id=session.team_leader_id, engineers=user).order_by('id').values_list('id', flat=True)
+
+
+def session_team(user, session):
+    return _session_teams(user, session).first()
+
+
+async def asession_team(user, session):
+    return await _session_teams(user, session).afirst()
+
+
+'''
+_diff_answers is used to compare the answers of a submission with the user's responses in the
+session, read and locked in one query. It returns the responses to create, the responses to
+update (already holding the new answer) and the (previous, current) trend changes of the updates.
+'''
+def _diff_answers(user, session_id, team_id, answers):
+    existing = {
+        response.question_id: response
+        for response in Response.objects.select_for_update().filter(
+            user=user, session_id=session_id, question_id__in=answers,
+        )
+    }
+
+    to_create = []
+    to_update = []
+    trend_changes = []
+    for question_id, answer in answers.items():
+        response = existing.get(question_id)
+        if response is None:
+            to_create.append(Response(user=user, session_id=session_id, team_id=team_id, question_id=question_id, answer=answer))
+        elif response.answer != answer:
+            previous = (response.team_id, question_id, response.timestamp, response.answer)
+            response.answer = answer
+            to_update.append(response)
+            trend_changes.append((previous, previous[:3] + (answer,)))
+    return to_create, to_update, trend_changes
+
+
+'''
+submit_responses is used to save a user's answers to the questions of a session in one transaction.
+It loads and locks the user's existing responses in that session in a single query and then
+creates new answers with bulk_create and writes changed answers with bulk_update, so the number
+of queries per submission does not grow with the number of questions. The previous answers
+used for the trend and live deltas come from that locked read; when a concurrent submission of
+the same user inserted some of the answers after it, the insert is rolled back to a savepoint
+and the diff is redone against the rows that submission wrote.
+The trend buckets of the changed answers are updated in the same transaction, and a
+vote_changed task is queued for the team and session so the worker refreshes their analytics.
+Once committed, the changes are pushed to the session's live tally.
+Answers are kept per session, so answering a shared question again in a later session
+does not overwrite the earlier answer. A closed session raises SessionClosedError.
+The session may be a HealthCheckSession or its cached SessionPayload.
+It returns the number of responses that were created and updated.
+'''
+def submit_responses(user, session, questions, data, team_id=None):
+    answers = {}
+    for question in questions:
+        answer = data.get(f'question_{question.id}')
+        if answer in VALID_ANSWERS:
+            answers[question.id] = answer
+
+    if not answers:
+        return 0, 0
+
+    with transaction.atomic():
+        ## the session row stays locked until commit, so closing it waits for these answers
+        ensure_session_open(session.id, lock=True)
+        to_create, to_update, trend_changes = _diff_answers(user, session.id, team_id, answers)
+
+        if to_create:
+            try:
+                with transaction.atomic():
+                    Response.objects.bulk_create(to_create)
+            except IntegrityError:
+                ## a double click or a second tab inserted some of these answers after the locked read;
+                ## they exist now, so their real previous answer is read and locked this time
+                to_create, to_update, trend_changes = _diff_answers(user, session.id, team_id, answers)
+                Response.objects.bulk_create(to_create)
+            trend_changes += [
+                (None, (response.team_id, response.question_id, response.timestamp, response.answer))
+                for response in to_create
+            ]
+        if to_update:
+            Response.objects.bulk_update(to_update, ['answer'])
+
+        ## bulk writes skip the Response signals, so the trend buckets are updated here
+        apply_response_changes(trend_changes)
+        if to_create or to_update:
+            enqueue('vote_changed', team_id, session.id)
+            ## (question, previous answer, answer) of each change, pushed to the live tally once committed
+            live_changes = [(previous[1], previous[3], current[3]) for previous, current in trend_changes if previous]
+            live_changes += [(response.question_id, None, response.answer) for response in to_create]
+            transaction.on_commit(partial(publish_responses, session.id, user.id, live_changes))
+
+    return len(to_create), len(to_update)